@@ -8,6 +8,7 @@ from .models import (
     Media,
     MediaAnalysis,
     MediaTag,
+    MediaStats,
     SmartAlbum,
 )
 
@@ -87,10 +88,19 @@ class SmartAlbumAdmin(admin.ModelAdmin):
     list_filter = ('album_type', 'created_at')
     search_fields = ('name', 'description', 'user__username')
     filter_horizontal = ('media',)
+    readonly_fields = ('media_count',)
 
-    def media_count(self, obj):
-        return obj.media.count()
-    media_count.short_description = 'Nombre de médias'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Le widget M2M écrit directement la table de liaison : recalculer le compteur
+        SmartAlbum.objects.filter(pk=form.instance.pk).update(media_count=form.instance.media.count())
+
+
+@admin.register(MediaStats)
+class MediaStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total', 'images', 'videos', 'analyzed', 'favorites', 'reconciled_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('reconciled_at', 'updated_at')
 
 
 admin.site.register(UserProfile)
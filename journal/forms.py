@@ -913,6 +913,7 @@ class GalleryFilterForm(forms.Form):
         ('-title', 'Titre (Z-A)'),
         ('-file_size', 'Taille (plus grand)'),
         ('file_size', 'Taille (plus petit)'),
+        ('relevance', 'Pertinence (recherche)'),
     ]
     
     search = forms.CharField(
@@ -948,6 +949,12 @@ class GalleryFilterForm(forms.Form):
         initial='-uploaded_at',
         widget=forms.Select(attrs={'class': 'form-control'})
     )
+    color = forms.RegexField(
+        regex=r'^#?[0-9a-fA-F]{6}$',
+        required=False,
+        label='Couleur',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': '🎨 #3366cc'})
+    )
     
     def __init__(self, user=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -957,6 +964,52 @@ class GalleryFilterForm(forms.Form):
 
 
 
+class NoteSearchForm(forms.Form):
+    """Recherche et filtres de la liste des notes"""
+
+    EMOTION_CHOICES = [
+        ('', 'Toutes les émotions'),
+        ('joy', 'Joie'),
+        ('sadness', 'Tristesse'),
+        ('love', 'Amour'),
+        ('anger', 'Colère'),
+        ('fear', 'Peur'),
+        ('surprise', 'Surprise'),
+    ]
+
+    q = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control border-start-0',
+            'placeholder': 'Rechercher des notes...'
+        })
+    )
+    emotion = forms.ChoiceField(
+        choices=EMOTION_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+    date_from = forms.DateField(
+        required=False,
+        label='Du',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        label='Au',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control form-control-sm'})
+    )
+
+    def has_filters(self):
+        """Au moins un critère valide ; un champ invalide est ignoré (erreur affichée), pas les autres"""
+        if not self.is_bound:
+            return False
+        self.is_valid()
+        return any(self.cleaned_data.values())
+
+
+
 from .models import Affirmation
 
 class AffirmationForm(forms.ModelForm):
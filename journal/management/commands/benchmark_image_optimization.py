@@ -0,0 +1,79 @@
+"""
+Mesure du gain de l'optimisation à l'upload sur un échantillon (aucun fichier modifié)
+Exemple : python manage.py benchmark_image_optimization --sample 50
+          python manage.py benchmark_image_optimization photos/*.jpg --max-dimension 2048
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from journal.models import Media
+from journal.services.image_optimizer import OPTIMIZABLE_EXTENSIONS, image_optimizer
+
+
+class Command(BaseCommand):
+    help = 'Compare la taille des images avant et après optimisation sur un échantillon'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Fichiers ou dossiers (défaut: derniers médias importés)')
+        parser.add_argument('--sample', type=int, default=20, help='Nombre de médias lus en base (défaut: 20)')
+        parser.add_argument('--max-dimension', type=int, help='Côté max (défaut: MEDIA_MAX_DIMENSION)')
+
+    def _sources(self, options):
+        """(libellé, callable ouvrant le fichier en binaire)"""
+        if not options['paths']:
+            media = (Media.objects.filter(media_type='image').exclude(file='')
+                     .order_by('-uploaded_at')[:options['sample']])
+            for item in media:
+                yield item.file.name, (lambda item=item: item.file.open('rb'))
+            return
+        for path in options['paths']:
+            if os.path.isdir(path):
+                names = sorted(os.path.join(directory, name)
+                               for directory, _, files in os.walk(path) for name in files)
+            else:
+                names = [path]
+            for name in names:
+                if name.lower().endswith(OPTIMIZABLE_EXTENSIONS):
+                    yield name, (lambda name=name: open(name, 'rb'))
+
+    def handle(self, *args, **options):
+        total_before = total_after = count = 0
+        elapsed = 0.0
+
+        for label, opener in self._sources(options):
+            try:
+                with opener() as handle:
+                    started = time.perf_counter()
+                    result = image_optimizer.optimize(handle, options['max_dimension'])
+                    duration = time.perf_counter() - started
+                    size = handle.size if hasattr(handle, 'size') else os.fstat(handle.fileno()).st_size
+            except OSError as e:
+                self.stdout.write(self.style.WARNING(f'{label}: illisible ({e})'))
+                continue
+
+            after = result['optimized_size'] if result else size
+            count += 1
+            total_before += size
+            total_after += after
+            elapsed += duration
+            detail = 'inchangé'
+            if result:
+                detail = f"{result['width']}x{result['height']}{' réduite' if result['resized'] else ''}"
+                if not result['reencoded']:
+                    detail += ' métadonnées retirées'
+            self.stdout.write(
+                f'{label}: {size / 1024:.0f} Ko → {after / 1024:.0f} Ko '
+                f'(-{100 * (size - after) / size if size else 0:.1f}%, {duration * 1000:.0f} ms, {detail})'
+            )
+
+        if not count:
+            self.stdout.write(self.style.WARNING('Aucune image JPEG/PNG à mesurer'))
+            return
+        saved = total_before - total_after
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {count} image(s) : {total_before / 1048576:.1f} Mo → {total_after / 1048576:.1f} Mo, '
+            f'{saved / 1048576:.1f} Mo économisés (-{100 * saved / total_before:.1f}%), '
+            f'{elapsed * 1000 / count:.0f} ms/image'
+        ))
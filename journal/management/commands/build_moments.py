@@ -0,0 +1,46 @@
+"""
+Reconstruit les albums "moments" à partir de la date de prise de vue et du GPS
+Exemple : python manage.py build_moments --backfill-exif
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from journal.models import Media
+from journal.services.exif_service import extract_exif
+from journal.services.moment_service import moment_service
+
+
+class Command(BaseCommand):
+    help = 'Regroupe les photos existantes en moments (rattrapage des médias importés avant EXIF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (défaut: tous)")
+        parser.add_argument('--backfill-exif', action='store_true',
+                            help='Relire EXIF des photos sans date de prise de vue')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"Utilisateur introuvable: {options['user']}")
+
+        for user in users:
+            if options['backfill_exif']:
+                filled = 0
+                for media in Media.objects.filter(user=user, media_type='image', taken_at__isnull=True):
+                    try:
+                        with Image.open(media.file.path) as img:
+                            exif = extract_exif(img)
+                    except Exception as e:
+                        self.stdout.write(self.style.WARNING(f'EXIF illisible pour {media.file.name}: {e}'))
+                        continue
+                    if exif['taken_at'] or exif['latitude'] is not None:
+                        Media.objects.filter(pk=media.pk).update(**exif)
+                        filled += 1
+                self.stdout.write(f'{user.username}: EXIF relu pour {filled} photo(s)')
+
+            count = moment_service.rebuild(user)
+            self.stdout.write(self.style.SUCCESS(f'✓ {user.username}: {count} moment(s)'))
@@ -0,0 +1,32 @@
+"""
+Indexe les médias (ou les notes, avec --notes) existants pour la recherche plein texte
+Exemple : python manage.py build_search_index --rebuild
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.services.note_search import note_search_service
+from journal.services.search_index import search_index_service
+
+
+class Command(BaseCommand):
+    help = 'Calcule les documents de recherche BM25 des médias (titre, tags, analyse IA) ou des notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (défaut: tous)")
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recalculer tous les documents (changement de pondération ou de normalisation)')
+        parser.add_argument('--notes', action='store_true', help='Indexer les notes (titre, contenu)')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"Utilisateur introuvable: {options['user']}")
+
+        service, kind = (note_search_service, 'note(s)') if options['notes'] else (search_index_service, 'média(s)')
+        for user in users:
+            count = service.backfill(user, rebuild=options['rebuild'])
+            self.stdout.write(self.style.SUCCESS(f'✓ {user.username}: {count} {kind} indexé(s)'))
@@ -0,0 +1,61 @@
+"""
+Crée ou vérifie le bundle hors-ligne des modèles Vision AI
+Exemple (build Docker) : python manage.py bundle_models
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.services.model_bundle import (
+    CLIP_MODEL_NAME,
+    BundleError,
+    active_bundle,
+    create_bundle,
+    verify_bundle,
+)
+
+DEFAULT_MODELS = [CLIP_MODEL_NAME]
+
+
+class Command(BaseCommand):
+    help = 'Résout les modèles une fois dans un répertoire versionné (safetensors + manifeste)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='models',
+                            help='Modèle à empaqueter (répétable, défaut: CLIP ViT-B/32)')
+        parser.add_argument('--model-version', default=None,
+                            help='Nom de version (défaut: date + empreinte des poids)')
+        parser.add_argument('--root', default=None,
+                            help='Répertoire des bundles (défaut: $MODEL_BUNDLE_DIR)')
+        parser.add_argument('--no-activate', action='store_true',
+                            help='Ne pas faire pointer CURRENT sur le nouveau bundle')
+        parser.add_argument('--verify', action='store_true',
+                            help='Vérifier les sommes SHA-256 du bundle actif au lieu de le créer')
+
+    def handle(self, *args, **options):
+        models = options['models'] or DEFAULT_MODELS
+
+        for model_name in models:
+            if options['verify']:
+                bundle = active_bundle(model_name, root=options['root'])
+                if bundle is None:
+                    raise CommandError(f'Aucun bundle actif pour {model_name}')
+                try:
+                    verify_bundle(bundle['path'], checksums=True)
+                except BundleError as e:
+                    raise CommandError(f'{model_name}@{bundle["version"]}: {e}')
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {model_name}@{bundle["version"]} intègre ({len(bundle["files"])} fichiers)'
+                ))
+                continue
+
+            self.stdout.write(f'Empaquetage de {model_name}...')
+            try:
+                bundle = create_bundle(model_name, version=options['model_version'], root=options['root'],
+                                       activate=not options['no_activate'])
+            except Exception as e:
+                raise CommandError(f'Échec du bundle {model_name}: {e}')
+
+            size_mb = sum(f['size'] for f in bundle['files'].values()) / (1024 * 1024)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {model_name}@{bundle["version"]} → {bundle["path"]} ({size_mb:.1f} MB)'
+            ))
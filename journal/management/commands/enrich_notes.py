@@ -0,0 +1,50 @@
+"""
+Enrichit les notes restées en attente (processus redémarré avant que son thread ne les traite)
+Exemple : python manage.py enrich_notes --stuck --failed
+"""
+from django.core.management.base import BaseCommand
+
+from journal.models import Note
+from journal.services.note_enrichment import note_enrichment_service
+
+CHUNK_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = "Enrichit les notes en attente (émotion, ...) que les threads des serveurs n'ont pas traitées"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stuck', action='store_true',
+                            help="Reprendre aussi les notes restées 'enriching' (à lancer sans serveur actif)")
+        parser.add_argument('--failed', action='store_true', help="Réessayer les notes en échec")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        statuses = []
+        if options['stuck']:
+            statuses.append(Note.ENRICHMENT_RUNNING)
+        if options['failed']:
+            statuses.append(Note.ENRICHMENT_FAILED)
+        if statuses:
+            Note.objects.filter(enrichment_status__in=statuses).update(enrichment_status=Note.ENRICHMENT_PENDING)
+
+        pending = Note.objects.filter(enrichment_status=Note.ENRICHMENT_PENDING)
+        total = pending.count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS('✓ Aucune note en attente'))
+            return
+
+        self.stdout.write(f'Enrichissement de {total} notes...')
+        done = 0
+        last_id = 0
+        while True:
+            ids = list(pending.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            done += note_enrichment_service.enrich(ids)
+            last_id = ids[-1]
+            self.stdout.write(f'  {done}/{total}')
+
+        failed = Note.objects.filter(enrichment_status=Note.ENRICHMENT_FAILED).count()
+        self.stdout.write(self.style.SUCCESS(f'✓ {done} notes enrichies') if not failed else
+                          self.style.WARNING(f'⚠️ {done} notes traitées, {failed} en échec'))
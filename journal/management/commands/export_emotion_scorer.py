@@ -0,0 +1,88 @@
+"""
+Exporte le modèle d'émotion en score linéaire creux (scorer.npz), chargé par journal.utils
+à la place du pipeline joblib
+Exemple : python manage.py export_emotion_scorer --verify data/emotions.csv
+"""
+import os
+import time
+
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+
+from journal import utils
+from journal.services import emotion_scorer
+from journal.services.emotion_training import iter_corpus
+from journal.services.model_bundle import (
+    EMOTION_MODEL_FILE, EMOTION_MODEL_NAME, active_bundle, refresh_manifest,
+)
+
+
+class Command(BaseCommand):
+    help = "Exporte le modèle d'émotion (bundle actif ou lr_model.pkl) en score creux et vérifie ses étiquettes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-version', default='', help='Version du bundle (défaut: CURRENT)')
+        parser.add_argument('--root', default=None,
+                            help='Répertoire des bundles (défaut: $MODEL_BUNDLE_DIR)')
+        parser.add_argument('--legacy', action='store_true',
+                            help=f'Exporter {os.path.basename(utils.MODEL_PATH)} au lieu du bundle')
+        parser.add_argument('--verify', nargs='+', metavar='CORPUS',
+                            help='Comparer les étiquettes au pipeline sur ces fichiers CSV/JSONL')
+        parser.add_argument('--sample', type=int, default=5000, help='Textes comparés (défaut: 5000)')
+        parser.add_argument('--text-field', default='text')
+        parser.add_argument('--delimiter', default=',')
+
+    def _source(self, options):
+        """(pipeline joblib, fichier score, version source, répertoire du bundle ou None)"""
+        if options['legacy']:
+            if not os.path.isfile(utils.MODEL_PATH):
+                raise CommandError(f'Modèle introuvable: {utils.MODEL_PATH}')
+            return utils.MODEL_PATH, utils.SCORER_PATH, utils.model_version(), None
+        bundle = active_bundle(EMOTION_MODEL_NAME, root=options['root'], version=options['model_version'])
+        if not bundle:
+            raise CommandError(f"Aucun bundle {EMOTION_MODEL_NAME} installé (train_emotion_model, ou --legacy)")
+        return (os.path.join(bundle['path'], EMOTION_MODEL_FILE),
+                os.path.join(bundle['path'], emotion_scorer.SCORER_FILE), None, bundle['path'])
+
+    def handle(self, *args, **options):
+        model_path, scorer_path, source_version, bundle_path = self._source(options)
+
+        started = time.perf_counter()
+        pipeline = joblib.load(model_path)
+        joblib_ms = (time.perf_counter() - started) * 1000
+        try:
+            emotion_scorer.export_scorer(pipeline, scorer_path, source_version=source_version)
+        except emotion_scorer.ScorerExportError as e:
+            raise CommandError(str(e))
+        if bundle_path:
+            refresh_manifest(bundle_path)
+
+        started = time.perf_counter()
+        scorer = emotion_scorer.SparseLinearScorer.load(scorer_path)
+        scorer_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            f'{scorer_path} : {os.path.getsize(scorer_path) / 1024:.0f} Ko, '
+            f'chargé en {scorer_ms:.1f} ms (pipeline joblib : {joblib_ms:.1f} ms)'
+        )
+
+        if options['verify']:
+            for path in options['verify']:
+                if not os.path.isfile(path):
+                    raise CommandError(f'Corpus introuvable: {path}')
+            texts = []
+            for text, _ in iter_corpus(options['verify'], text_field=options['text_field'],
+                                       delimiter=options['delimiter']):
+                texts.append(text)
+                if len(texts) >= options['sample']:
+                    break
+            report = emotion_scorer.compare(pipeline, scorer, texts)
+            latency = report['latency_ms_p50']
+            self.stdout.write(
+                f"  {report['samples']} textes : {report['label_mismatches']} étiquettes différentes, "
+                f"écart max de probabilité {report['max_probability_delta']:.2e}"
+            )
+            self.stdout.write(f"  latence par note (p50) : {latency['sparse']} ms (sklearn : {latency['sklearn']} ms)")
+            if report['label_mismatches']:
+                raise CommandError("Le score exporté ne reproduit pas les étiquettes du pipeline")
+
+        self.stdout.write(self.style.SUCCESS('✓ Score creux exporté'))
@@ -0,0 +1,49 @@
+"""
+Prépare MongoDB pour l'évaluation des règles d'albums côté serveur
+Exemple : python manage.py index_album_rules --backfill --verify
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.services.album_rule_compiler import album_rule_evaluator
+from journal.services.smart_album_service import smart_album_service
+
+
+class Command(BaseCommand):
+    help = "Crée les index multikey des règles d'albums et calcule les jetons natifs des analyses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help='Calculer les jetons des analyses qui n\'en ont pas')
+        parser.add_argument('--rebuild-tokens', action='store_true',
+                            help='Recalculer les jetons de toutes les analyses')
+        parser.add_argument('--verify', action='store_true',
+                            help="Comparer l'agrégation MongoDB et l'index en mémoire pour chaque utilisateur")
+
+    def handle(self, *args, **options):
+        if album_rule_evaluator.backend != 'mongo':
+            raise CommandError("Backend des règles d'albums non MongoDB (ALBUM_RULES_BACKEND)")
+
+        for name in album_rule_evaluator.ensure_indexes():
+            self.stdout.write(f'Index: {name}')
+
+        if options['backfill'] or options['rebuild_tokens']:
+            count = album_rule_evaluator.backfill_tokens(only_missing=not options['rebuild_tokens'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Jetons calculés pour {count} analyse(s)'))
+
+        if options['verify']:
+            rules = smart_album_service.album_rules
+            mismatches = 0
+            for user in User.objects.all():
+                mongo = album_rule_evaluator.evaluate_mongo(user, rules)
+                orm = album_rule_evaluator.evaluate_orm(user, rules)
+                for key in rules:
+                    if mongo[key] != orm[key]:
+                        mismatches += 1
+                        self.stdout.write(self.style.WARNING(
+                            f'{user.username}/{key}: mongo={len(mongo[key])} orm={len(orm[key])}'
+                        ))
+            if mismatches:
+                raise CommandError(f'{mismatches} règle(s) divergente(s)')
+            self.stdout.write(self.style.SUCCESS('✓ Résultats identiques sur les deux backends'))
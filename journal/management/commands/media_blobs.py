@@ -0,0 +1,57 @@
+"""
+Maintenance du stockage adressé par contenu des médias
+Exemple : python manage.py media_blobs --adopt-legacy --recount --sweep
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from journal.models import Media
+from journal.services.blob_store import blob_store
+from journal.storage import BLOB_PREFIX
+
+
+class Command(BaseCommand):
+    help = 'Migre les anciens fichiers vers les blobs, recalcule les références et supprime les blobs orphelins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt-legacy', action='store_true',
+                            help='Déplacer les fichiers importés avant le stockage par contenu (déduplication)')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recalculer les compteurs de références depuis la table Media')
+        parser.add_argument('--sweep', action='store_true',
+                            help='Supprimer les blobs sans référence depuis plus que le délai de grâce')
+        parser.add_argument('--grace-hours', type=float,
+                            help='Délai de grâce (défaut: MEDIA_BLOB_GRACE_HOURS)')
+        parser.add_argument('--dry-run', action='store_true', help='Afficher sans modifier')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if options['adopt_legacy']:
+            legacy = Media.objects.exclude(file__startswith=BLOB_PREFIX).exclude(file='')
+            adopted = 0
+            for media in legacy.iterator():
+                if dry_run:
+                    self.stdout.write(f'  {media.file.name}')
+                    continue
+                try:
+                    if blob_store.adopt(media):
+                        adopted += 1
+                except OSError as e:
+                    self.stdout.write(self.style.WARNING(f'Fichier illisible {media.file.name}: {e}'))
+            self.stdout.write(self.style.SUCCESS(f'✓ {adopted} fichier(s) déplacé(s) vers le stockage par contenu'))
+
+        if options['recount']:
+            drift = blob_store.recount(dry_run=dry_run)
+            for path, (stored, actual) in sorted(drift.items()):
+                self.stdout.write(self.style.WARNING(f'{path}: {stored} → {actual}'))
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(drift)} compteur(s) divergent(s)'))
+
+        if options['sweep']:
+            grace = timedelta(hours=options['grace_hours']) if options['grace_hours'] is not None else None
+            swept = blob_store.sweep(grace, dry_run=dry_run)
+            for path in swept:
+                self.stdout.write(f'  {path}')
+            verb = 'à supprimer' if dry_run else 'supprimé(s)'
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(swept)} blob(s) {verb}'))
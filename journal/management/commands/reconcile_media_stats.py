@@ -0,0 +1,39 @@
+"""
+Recalcule les compteurs de la galerie (MediaStats) à partir des médias
+Exemple : python manage.py reconcile_media_stats --dry-run
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.services.media_stats import COUNTERS, media_stats_service
+
+
+class Command(BaseCommand):
+    help = 'Corrige la dérive des statistiques médias par utilisateur (une agrégation groupée)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Nom d'utilisateur (défaut: tous)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Afficher les écarts sans les corriger')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError(f"Utilisateur introuvable: {options['user']}")
+
+        drift = media_stats_service.reconcile(user_ids, dry_run=options['dry_run'])
+        usernames = dict(User.objects.filter(id__in=[user_id for user_id, _, _ in drift]).values_list('id', 'username'))
+        for user_id, stored, expected in drift:
+            changes = ', '.join(f'{name} {stored[name]}→{expected[name]}'
+                                for name in COUNTERS if stored[name] != expected[name])
+            self.stdout.write(self.style.WARNING(f'{usernames.get(user_id, user_id)}: {changes}'))
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('✓ Statistiques à jour'))
+        elif options['dry_run']:
+            self.stdout.write(f'{len(drift)} utilisateur(s) divergent(s) (non corrigés)')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(drift)} utilisateur(s) corrigé(s)'))
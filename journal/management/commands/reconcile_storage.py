@@ -0,0 +1,65 @@
+"""
+Réconciliation de MEDIA_ROOT avec la table Media (orphelins et fichiers manquants)
+Exemple : python manage.py reconcile_storage --limit 50000 --quarantine
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.services.storage_gc import cold_storage_reconciler, storage_reconciler
+
+
+class Command(BaseCommand):
+    help = 'Compare MEDIA_ROOT et la base en flux triés ; met en quarantaine ou supprime les fichiers orphelins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quarantine', action='store_true',
+                            help='Déplacer les orphelins sous MEDIA_ROOT/.maintenance/quarantine/')
+        parser.add_argument('--delete', action='store_true', help='Supprimer les orphelins')
+        parser.add_argument('--limit', type=int,
+                            help='Nombre maximal de fichiers lus ; la passe suivante reprend au repère')
+        parser.add_argument('--full', action='store_true',
+                            help='Parcourir tout l\'arbre sans lire ni mettre à jour le repère')
+        parser.add_argument('--cold', action='store_true',
+                            help='Réconcilier le stockage froid des originaux (MEDIA_COLD_ROOT)')
+        parser.add_argument('--min-age-hours', type=float, default=1.0,
+                            help='Ignorer les orphelins plus récents (imports en cours, défaut: 1)')
+
+    def handle(self, *args, **options):
+        if options['quarantine'] and options['delete']:
+            raise CommandError('--quarantine et --delete sont exclusifs')
+        action = 'quarantine' if options['quarantine'] else 'delete' if options['delete'] else None
+        reconciler = storage_reconciler
+        if options['cold']:
+            if cold_storage_reconciler is None:
+                raise CommandError('MEDIA_COLD_ROOT non configuré')
+            reconciler = cold_storage_reconciler
+
+        def report(kind, path, detail):
+            if kind == 'orphan':
+                modified = datetime.fromtimestamp(detail).strftime('%Y-%m-%d %H:%M')
+                self.stdout.write(f'  orphelin   {path} (modifié le {modified})')
+            else:
+                self.stdout.write(self.style.WARNING(f'  manquant   {path} (média #{detail})'))
+
+        if not options['full']:
+            mark = reconciler.load_mark()
+            if mark:
+                self.stdout.write(f'Reprise après {mark}')
+
+        counts = reconciler.run(
+            action=action,
+            limit=options['limit'],
+            min_age_hours=options['min_age_hours'],
+            incremental=not options['full'],
+            report=report,
+        )
+
+        verb = {'quarantine': 'mis en quarantaine', 'delete': 'supprimé(s)'}.get(action)
+        summary = (f"✓ {counts['scanned']} fichier(s) lu(s) : {counts['orphans']} orphelin(s), "
+                   f"{counts['missing']} manquant(s), {counts['skipped_recent']} récent(s) ignoré(s)")
+        if verb:
+            summary += f", {counts['disposed']} {verb}"
+        self.stdout.write(self.style.SUCCESS(summary))
+        if not counts['finished']:
+            self.stdout.write('Arbre non terminé : relancer la commande pour continuer')
@@ -0,0 +1,45 @@
+"""
+Lance le sidecar d'inférence CLIP partagé par tous les workers web
+Exemple : python manage.py run_inference_server --socket /tmp/myjournal-inference.sock
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from journal.services.inference_sidecar import InferenceBatcher, InferenceServer
+
+
+class Command(BaseCommand):
+    help = "Charge CLIP une seule fois et sert les workers web via un socket Unix"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.INFERENCE_SOCKET or '/tmp/myjournal-inference.sock',
+                            help='Chemin du socket Unix (défaut: $INFERENCE_SOCKET)')
+        parser.add_argument('--max-batch', type=int, default=16,
+                            help="Nombre maximum d'images encodées par lot")
+        parser.add_argument('--window-ms', type=float, default=10.0,
+                            help="Fenêtre d'attente pour regrouper les requêtes")
+        parser.add_argument('--threads', type=int, default=0,
+                            help='Threads torch (0 = valeur par défaut de torch)')
+
+    def handle(self, *args, **options):
+        import torch
+        from journal.services.clip_engine import ClipEngine
+
+        if options['threads']:
+            torch.set_num_threads(options['threads'])
+
+        engine = ClipEngine()
+        batcher = InferenceBatcher(engine, max_batch=options['max_batch'], window_ms=options['window_ms'])
+        server = InferenceServer(options['socket'], batcher)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Sidecar d'inférence prêt sur {options['socket']} "
+            f"(lot max {options['max_batch']}, fenêtre {options['window_ms']} ms)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Arrêt du sidecar...')
+        finally:
+            server.server_close()
@@ -0,0 +1,77 @@
+"""
+Entraîne le modèle d'émotion des notes et l'écrit en bundle versionné
+Exemple : python manage.py train_emotion_model data/emotions.csv --epochs 5
+Le bundle actif (CURRENT, ou EMOTION_MODEL_VERSION) est chargé par journal.utils au démarrage
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.services import emotion_training
+
+DEFAULTS = emotion_training.DEFAULT_PARAMS
+
+
+class Command(BaseCommand):
+    help = "Entraîne le modèle d'émotion en flux (HashingVectorizer + SGD partial_fit) et publie un bundle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', nargs='+', help='Fichiers CSV (avec en-tête) ou JSONL étiquetés')
+        parser.add_argument('--text-field', default='text', help='Colonne du texte (défaut: text)')
+        parser.add_argument('--label-field', default='label',
+                            help="Colonne de l'étiquette : nom d'émotion ou identifiant (défaut: label)")
+        parser.add_argument('--delimiter', default=',', help='Séparateur CSV (défaut: ,)')
+        parser.add_argument('--epochs', type=int, default=DEFAULTS['epochs'])
+        parser.add_argument('--batch-size', type=int, default=DEFAULTS['batch_size'])
+        parser.add_argument('--n-features', type=int, default=DEFAULTS['n_features'],
+                            help='Taille de l\'espace haché (défaut: 2^18)')
+        parser.add_argument('--ngram-max', type=int, default=DEFAULTS['ngram_max'])
+        parser.add_argument('--alpha', type=float, default=DEFAULTS['alpha'], help='Régularisation L2 du SGD')
+        parser.add_argument('--holdout', type=float, default=DEFAULTS['holdout'],
+                            help="Part réservée à l'évaluation (défaut: 0.1)")
+        parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+        parser.add_argument('--model-version', help='Nom de version (défaut: date + empreinte corpus/paramètres)')
+        parser.add_argument('--root', default=None,
+                            help='Répertoire des bundles (défaut: $MODEL_BUNDLE_DIR)')
+        parser.add_argument('--no-activate', action='store_true',
+                            help='Ne pas faire pointer CURRENT sur le nouveau modèle')
+
+    def handle(self, *args, **options):
+        for path in options['corpus']:
+            if not os.path.isfile(path):
+                raise CommandError(f'Corpus introuvable: {path}')
+        if not 0 < options['holdout'] < 1:
+            raise CommandError('--holdout doit être compris entre 0 et 1')
+
+        params = {key: options[key] for key in DEFAULTS}
+        corpus_options = {key: options[key] for key in ('text_field', 'label_field', 'delimiter')}
+
+        def progress(epoch, samples):
+            self.stdout.write(f'  époque {epoch}/{params["epochs"]} : {samples} exemples')
+
+        self.stdout.write(f'Entraînement sur {", ".join(options["corpus"])}...')
+        try:
+            pipeline, metrics = emotion_training.train(options['corpus'], params, progress=progress,
+                                                       **corpus_options)
+        except (ValueError, KeyError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"  exactitude {metrics['accuracy']:.2%}, F1 macro {metrics['macro_f1']:.3f} "
+            f"sur {metrics['evaluated_samples']} exemples réservés ({metrics['skipped_rows']} lignes ignorées)"
+            if metrics['evaluated_samples'] else
+            self.style.WARNING('  aucun exemple réservé : pas de métriques')
+        )
+        if metrics['latency_ms_p50'] is not None:
+            self.stdout.write(
+                f"  latence par note : {metrics['latency_ms_p50']:.2f} ms (p50), "
+                f"{metrics['latency_ms_p95']:.2f} ms (p95)"
+            )
+
+        bundle = emotion_training.publish(pipeline, metrics, options['corpus'], params,
+                                          version=options['model_version'], root=options['root'],
+                                          activate=not options['no_activate'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {bundle['model_name']}@{bundle['version']} → {bundle['path']}"
+            f"{'' if options['no_activate'] else ' (actif)'}"
+        ))
@@ -1,44 +1,167 @@
-from django.core.management.base import BaseCommand
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
 from journal.models import Note
-from journal.utils import predict_emotion as predict_func, lr_model
+from journal.services.emotion_cache import content_digest
+from journal import utils
+from journal.utils import predict_emotions
+
+CHUNK_SIZE = 2000
+
+
+def score_chunk(rows):
+    """Predict one chunk of (id, content); runs in the worker processes with --workers"""
+    predictions = predict_emotions([content for _, content in rows], utils.lr_model)
+    return [
+        (note_id, emotion, float(confidence * 100), content_digest(content))
+        for (note_id, content), (emotion, confidence) in zip(rows, predictions)
+    ]
+
 
 class Command(BaseCommand):
-    help = 'Update existing notes with emotion predictions'
+    help = 'Update existing notes with emotion predictions (batched, resumable, optionally parallel)'
 
-    def handle(self, *args, **options):
-        if not lr_model:
-            self.stdout.write(
-                self.style.ERROR('Emotion prediction model not loaded. Check model file.')
-            )
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-score every note, not only those without an emotion')
+        parser.add_argument('--since', help='Only notes updated on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--model-version', nargs='?', const='current',
+                            help='Only notes not scored by this model version '
+                                 '(without a value: the loaded model), e.g. after a model upgrade')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Notes read and predicted per batch (default: {CHUNK_SIZE})')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes predicting chunks in parallel (default: 1)')
+        parser.add_argument('--checkpoint',
+                            help='JSON file recording the last written note id; an interrupted run resumes from it')
+        parser.add_argument('--dry-run', action='store_true', help='Predict without writing')
+
+    def _queryset(self, options):
+        notes = Note.objects.exclude(content='').exclude(content__isnull=True)
+        if not (options['all'] or options['model_version']):
+            notes = notes.filter(emotion__isnull=True)
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since expects YYYY-MM-DD')
+            notes = notes.filter(updated_at__gte=timezone.make_aware(since))
+        if options['model_version']:
+            version = utils.lr_model_version if options['model_version'] == 'current' else options['model_version']
+            notes = notes.exclude(emotion_model_version=version)
+        return notes
+
+    @staticmethod
+    def _chunks(notes, start_id, size):
+        """(id, content) chunks in id order, by keyset: constant memory, no OFFSET"""
+        last_id = start_id
+        while True:
+            rows = list(notes.filter(id__gt=last_id).order_by('id').values_list('id', 'content')[:size])
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def _collection(self):
+        if self._mongo is None:
+            from pymongo import MongoClient
+            client = MongoClient(settings.DATABASES['default']['CLIENT']['host'])
+            self._mongo = client[settings.DATABASES['default']['NAME']][Note._meta.db_table]
+        return self._mongo
+
+    def _write(self, scored):
+        """One bulk write per chunk: Mongo bulk_write under djongo, bulk_update elsewhere"""
+        version = utils.lr_model_version
+        updates = [row for row in scored if row[1]]
+        if not updates:
+            return 0
+        if settings.DATABASES['default']['ENGINE'] == 'djongo':
+            from pymongo import UpdateOne
+            self._collection().bulk_write([
+                UpdateOne({'id': note_id}, {'$set': {
+                    'emotion': emotion, 'emotion_confidence': confidence,
+                    'content_hash': digest, 'emotion_model_version': version,
+                }})
+                for note_id, emotion, confidence, digest in updates
+            ], ordered=False)
+        else:
+            Note.objects.bulk_update([
+                Note(id=note_id, emotion=emotion, emotion_confidence=confidence,
+                     content_hash=digest, emotion_model_version=version)
+                for note_id, emotion, confidence, digest in updates
+            ], ['emotion', 'emotion_confidence', 'content_hash', 'emotion_model_version'])
+        return len(updates)
+
+    @staticmethod
+    def _scored(chunks, workers):
+        """Scored chunks in id order; with workers, at most 2 chunks per worker in flight"""
+        if workers <= 1:
+            for rows in chunks:
+                yield rows, score_chunk(rows)
             return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for rows in chunks:
+                pending.append((rows, pool.submit(score_chunk, rows)))
+                if len(pending) >= workers * 2:
+                    rows, future = pending.popleft()
+                    yield rows, future.result()
+            while pending:
+                rows, future = pending.popleft()
+                yield rows, future.result()
+
+    def handle(self, *args, **options):
+        self._mongo = None
+        if not utils.lr_model:
+            raise CommandError('Emotion prediction model not loaded. Check model file.')
 
-        notes_without_emotion = Note.objects.filter(emotion__isnull=True)
-        total_notes = notes_without_emotion.count()
-        
+        notes = self._queryset(options)
+        signature = {key: options[key] for key in ('all', 'since', 'model_version')}
+        start_id = 0
+        checkpoint = options['checkpoint']
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as handle:
+                state = json.load(handle)
+            if state.get('signature') == signature:
+                start_id = state['last_id']
+                self.stdout.write(f'Resuming after note #{start_id}')
+            else:
+                self.stdout.write(self.style.WARNING('Checkpoint ignored: it was written with other options'))
+
+        total_notes = notes.filter(id__gt=start_id).count()
         if total_notes == 0:
-            self.stdout.write(
-                self.style.SUCCESS('All notes already have emotion predictions.')
-            )
+            self.stdout.write(self.style.SUCCESS('All notes already have emotion predictions.'))
             return
-
         self.stdout.write(f'Updating emotions for {total_notes} notes...')
-        
-        updated_count = 0
-        for note in notes_without_emotion:
-            try:
-                if note.content:
-                    emotion, confidence = predict_func(note.content, lr_model)
-                    if emotion:
-                        note.emotion = emotion
-                        note.emotion_confidence = float(confidence * 100)
-                        note.save()
-                        updated_count += 1
-                        self.stdout.write(f'Updated note "{note.title}" - Emotion: {emotion} ({confidence:.1%})')
-            except Exception as e:
-                self.stdout.write(
-                    self.style.WARNING(f'Error updating note "{note.title}": {e}')
-                )
-
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully updated emotions for {updated_count} notes.')
-        )
\ No newline at end of file
+
+        started = time.perf_counter()
+        processed = updated_count = 0
+        chunks = self._chunks(notes, start_id, options['chunk_size'])
+        for rows, scored in self._scored(chunks, options['workers']):
+            if not options['dry_run']:
+                updated_count += self._write(scored)
+                if checkpoint:
+                    with open(checkpoint + '.tmp', 'w') as handle:
+                        json.dump({'signature': signature, 'last_id': rows[-1][0]}, handle)
+                    os.replace(checkpoint + '.tmp', checkpoint)
+            processed += len(rows)
+            rate = processed / max(time.perf_counter() - started, 1e-6)
+            self.stdout.write(f'  {processed}/{total_notes} notes ({rate:.0f} notes/s)')
+
+        if checkpoint and os.path.exists(checkpoint) and not options['dry_run']:
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Predicted {processed} notes in {elapsed:.1f}s (nothing written).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully updated emotions for {updated_count} notes in {elapsed:.1f}s.'
+            ))
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0010_merge_0009_auto_20251025_1301_0009_auto_20251026_0132'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='taken_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smartalbum',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smartalbum',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='smartalbum',
+            name='album_type',
+            field=models.CharField(choices=[('auto', 'Automatique'), ('manual', 'Manuel'), ('moment', 'Moment')], default='manual', max_length=10),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def fill_media_count(apps, schema_editor):
+    SmartAlbum = apps.get_model('journal', 'SmartAlbum')
+    Through = SmartAlbum.media.through
+    counts = {}
+    for album_id in Through.objects.values_list('smartalbum_id', flat=True):
+        counts[album_id] = counts.get(album_id, 0) + 1
+    for album_id, count in counts.items():
+        SmartAlbum.objects.filter(pk=album_id).update(media_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0011_media_exif_moments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smartalbum',
+            name='media_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_media_count, migrations.RunPython.noop),
+    ]
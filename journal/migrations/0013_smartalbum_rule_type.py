@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0012_smartalbum_media_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='smartalbum',
+            name='album_type',
+            field=models.CharField(choices=[('auto', 'Automatique'), ('manual', 'Manuel'), ('moment', 'Moment'), ('rule', 'Règle')], default='manual', max_length=10),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_media_stats(apps, schema_editor):
+    Media = apps.get_model('journal', 'Media')
+    MediaStats = apps.get_model('journal', 'MediaStats')
+    counters = {}
+    rows = Media.objects.values_list('user_id', 'media_type', 'is_analyzed', 'is_favorite')
+    for user_id, media_type, is_analyzed, is_favorite in rows:
+        stats = counters.setdefault(user_id, {'total': 0, 'images': 0, 'videos': 0, 'analyzed': 0, 'favorites': 0})
+        stats['total'] += 1
+        stats['images'] += media_type == 'image'
+        stats['videos'] += media_type == 'video'
+        stats['analyzed'] += bool(is_analyzed)
+        stats['favorites'] += bool(is_favorite)
+    for user_id, stats in counters.items():
+        MediaStats.objects.create(user_id=user_id, **stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0013_smartalbum_rule_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('images', models.IntegerField(default=0)),
+                ('videos', models.IntegerField(default=0)),
+                ('analyzed', models.IntegerField(default=0)),
+                ('favorites', models.IntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='media_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Statistiques Médias',
+                'verbose_name_plural': 'Statistiques Médias',
+            },
+        ),
+        migrations.RunPython(fill_media_stats, migrations.RunPython.noop),
+    ]
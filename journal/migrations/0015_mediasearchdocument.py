@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0014_mediastats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terms', models.JSONField(blank=True, default=dict)),
+                ('length', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('media', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='journal.media')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+            },
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0015_mediasearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='media_user_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0016_media_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['file', 'user'], name='media_file_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['thumbnail', 'user'], name='media_thumbnail_user_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+import django.core.validators
+from django.db import migrations, models
+import journal.models
+import journal.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0017_media_file_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=100, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('released_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier partagé',
+                'verbose_name_plural': 'Fichiers partagés',
+            },
+        ),
+        migrations.AlterField(
+            model_name='media',
+            name='file',
+            field=models.FileField(storage=journal.storage.get_blob_storage, upload_to=journal.models.media_upload_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'gif', 'webp', 'mp4', 'avi', 'mov', 'mp3', 'wav'])]),
+        ),
+    ]
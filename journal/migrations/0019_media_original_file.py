@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import journal.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0018_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='original_file',
+            field=models.FileField(blank=True, null=True, storage=journal.storage.get_cold_storage, upload_to='originals/'),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='bytes_saved',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0019_media_original_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
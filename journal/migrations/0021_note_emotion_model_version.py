@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0020_note_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='emotion_model_version',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0021_note_emotion_model_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='enrichment_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('enriching', 'Enrichissement en cours'), ('done', 'Enrichie'), ('failed', 'Échec')], db_index=True, default='done', max_length=20),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('journal', '0022_note_enrichment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terms', models.JSONField(blank=True, default=dict)),
+                ('length', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='journal.note')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Document de recherche (note)',
+                'verbose_name_plural': 'Documents de recherche (notes)',
+            },
+        ),
+    ]
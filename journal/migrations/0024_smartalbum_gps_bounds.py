@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+def fill_gps_bounds(apps, schema_editor):
+    SmartAlbum = apps.get_model('journal', 'SmartAlbum')
+    for moment in SmartAlbum.objects.filter(album_type='moment'):
+        points = list(moment.media.filter(latitude__isnull=False, longitude__isnull=False)
+                      .values_list('latitude', 'longitude'))
+        if not points:
+            continue
+        latitudes, longitudes = zip(*points)
+        SmartAlbum.objects.filter(pk=moment.pk).update(
+            min_latitude=min(latitudes), max_latitude=max(latitudes),
+            min_longitude=min(longitudes), max_longitude=max(longitudes),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0023_notesearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smartalbum',
+            name='min_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smartalbum',
+            name='max_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smartalbum',
+            name='min_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smartalbum',
+            name='max_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_gps_bounds, migrations.RunPython.noop),
+    ]
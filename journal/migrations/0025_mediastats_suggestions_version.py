@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0024_smartalbum_gps_bounds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediastats',
+            name='suggestions_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
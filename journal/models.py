@@ -7,6 +7,8 @@ import os
 from PIL import Image
 import uuid
 
+from .storage import get_blob_storage, get_cold_storage
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -46,15 +48,22 @@ class Media(models.Model):
 
     file = models.FileField(
         upload_to=media_upload_path,
+        storage=get_blob_storage,  # Adressé par contenu : blobs/ab/cd/<sha256>.<ext>
         validators=[FileExtensionValidator(
             allowed_extensions=['jpg', 'jpeg', 'png', 'gif', 'webp', 'mp4', 'avi', 'mov', 'mp3', 'wav']
         )]
     )
     thumbnail = models.ImageField(upload_to='gallery/thumbnails/', blank=True, null=True)
+    # Fichier importé tel quel quand l'upload a été optimisé (stockage froid, MEDIA_COLD_ROOT)
+    original_file = models.FileField(upload_to='originals/', storage=get_cold_storage, blank=True, null=True)
     file_size = models.BigIntegerField(default=0)
+    bytes_saved = models.BigIntegerField(default=0)  # Taille importée - taille stockée
     width = models.IntegerField(null=True, blank=True)
     height = models.IntegerField(null=True, blank=True)
     duration = models.FloatField(null=True, blank=True)
+    taken_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='media')
     album = models.CharField(max_length=100, blank=True, null=True)
     is_favorite = models.BooleanField(default=False)
@@ -64,6 +73,13 @@ class Media(models.Model):
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Pagination par curseur de la galerie : (uploaded_at, id) par utilisateur
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='media_user_feed_idx'),
+            # Contrôle d'accès de serve_media : chemin du fichier -> propriétaire
+            models.Index(fields=['file', 'user'], name='media_file_user_idx'),
+            models.Index(fields=['thumbnail', 'user'], name='media_thumbnail_user_idx'),
+        ]
         verbose_name = 'Média'
         verbose_name_plural = 'Médias'
 
@@ -154,10 +170,66 @@ class MediaTag(models.Model):
         return f"{self.name} ({self.source})"
 
 
+class MediaBlob(models.Model):
+    """Fichier adressé par contenu, partagé par les médias de même contenu"""
+    path = models.CharField(max_length=100, unique=True)  # Nom dans le stockage (Media.file)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    released_at = models.DateTimeField(null=True, blank=True, db_index=True)  # Dernière référence libérée
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Fichier partagé'
+        verbose_name_plural = 'Fichiers partagés'
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} réf.)"
+
+
+class MediaStats(models.Model):
+    """Compteurs de la galerie par utilisateur, tenus à jour par media_stats_service"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='media_stats')
+    total = models.IntegerField(default=0)
+    images = models.IntegerField(default=0)
+    videos = models.IntegerField(default=0)
+    analyzed = models.IntegerField(default=0)
+    favorites = models.IntegerField(default=0)
+    # Version des suggestions d'albums, partagée par tous les workers (cache local par processus)
+    suggestions_version = models.IntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Statistiques Médias'
+        verbose_name_plural = 'Statistiques Médias'
+
+    def __str__(self):
+        return f"Statistiques de {self.user.username}"
+
+
+class MediaSearchDocument(models.Model):
+    """Termes pondérés d'un média (titre, tags, analyse IA) pour l'index de recherche BM25"""
+    media = models.OneToOneField(Media, on_delete=models.CASCADE, related_name='search_document')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='media_search_documents')
+    terms = models.JSONField(default=dict, blank=True)  # terme -> fréquence pondérée
+    length = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Document de recherche'
+        verbose_name_plural = 'Documents de recherche'
+
+    def __str__(self):
+        return f"Index de recherche de {self.media}"
+
+
 class SmartAlbum(models.Model):
     ALBUM_TYPES = [
         ('auto', 'Automatique'),
         ('manual', 'Manuel'),
+        ('moment', 'Moment'),
+        ('rule', 'Règle'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='smart_albums')
@@ -167,6 +239,14 @@ class SmartAlbum(models.Model):
     filter_criteria = models.JSONField(default=dict, blank=True)
     media = models.ManyToManyField(Media, related_name='smart_albums', blank=True)
     cover_image = models.ForeignKey(Media, on_delete=models.SET_NULL, null=True, blank=True, related_name='album_covers')
+    media_count = models.IntegerField(default=0)  # Dénormalisé, tenu à jour par album_membership
+    starts_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    ends_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Moments : boîte englobante GPS des photos (None = aucune photo géolocalisée)
+    min_latitude = models.FloatField(null=True, blank=True)
+    max_latitude = models.FloatField(null=True, blank=True)
+    min_longitude = models.FloatField(null=True, blank=True)
+    max_longitude = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -180,6 +260,19 @@ class SmartAlbum(models.Model):
 
 
 class Note(models.Model):
+    # Enrichissement après enregistrement (émotion, ...) : voir services/note_enrichment.py
+    ENRICHMENT_PENDING = 'pending'
+    ENRICHMENT_RUNNING = 'enriching'
+    ENRICHMENT_DONE = 'done'
+    ENRICHMENT_FAILED = 'failed'
+
+    ENRICHMENT_CHOICES = [
+        (ENRICHMENT_PENDING, 'En attente'),
+        (ENRICHMENT_RUNNING, 'Enrichissement en cours'),
+        (ENRICHMENT_DONE, 'Enrichie'),
+        (ENRICHMENT_FAILED, 'Échec'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notes')
     title = models.CharField(max_length=200)
     content = models.CharField(max_length=5000)
@@ -190,10 +283,20 @@ class Note(models.Model):
     is_draft = models.BooleanField(default=False)
     emotion = models.CharField(max_length=50, blank=True, null=True)
     emotion_confidence = models.FloatField(blank=True, null=True)
+    # SHA-256 du contenu nettoyé au moment de la prédiction : inchangé => pas de nouvelle inférence
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    emotion_model_version = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    enrichment_status = models.CharField(max_length=20, choices=ENRICHMENT_CHOICES, default=ENRICHMENT_DONE,
+                                         db_index=True)
 
     def __str__(self):
         return self.title
 
+    @property
+    def is_enriching(self):
+        """Champs dérivés (émotion, ...) pas encore calculés pour le contenu actuel"""
+        return self.enrichment_status in (self.ENRICHMENT_PENDING, self.ENRICHMENT_RUNNING)
+
     def get_emotion_icon(self):
         emotion_icons = {
             'joy': 'fas fa-smile text-warning',
@@ -217,6 +320,22 @@ class Note(models.Model):
         return emotions.get(self.emotion, 'Neutre')
 
 
+class NoteSearchDocument(models.Model):
+    """Termes pondérés d'une note (titre, contenu) pour la recherche BM25 des notes"""
+    note = models.OneToOneField(Note, on_delete=models.CASCADE, related_name='search_document')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='note_search_documents')
+    terms = models.JSONField(default=dict, blank=True)  # racine -> fréquence pondérée
+    length = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Document de recherche (note)'
+        verbose_name_plural = 'Documents de recherche (notes)'
+
+    def __str__(self):
+        return f"Index de recherche de {self.note}"
+
+
 class Goal(models.Model):
     STATUS_ONGOING = 'ongoing'
     STATUS_COMPLETED = 'completed'
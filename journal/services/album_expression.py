@@ -0,0 +1,380 @@
+"""
+Langage d'expressions pour les albums définis par l'utilisateur
+Exemple : objects:beach AND NOT people AND taken:2025-07
+
+Une expression est analysée une fois en arbre de prédicats, puis évaluée par
+opérations d'ensembles sur l'index d'étiquettes (les plus sélectifs d'abord,
+arrêt dès qu'une intersection est vide)
+"""
+import calendar
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from django.utils import timezone
+
+from .color_index import COLOR_CLASS_ALIASES
+from .label_index import UserLabelIndex, label_tokens, normalize_label
+
+# Préfixes acceptés -> champ de l'index
+FIELD_ALIASES = {
+    'objects': 'objects', 'object': 'objects', 'objet': 'objects', 'objets': 'objects',
+    'locations': 'locations', 'location': 'locations', 'lieu': 'locations', 'lieux': 'locations',
+    'emotions': 'emotions', 'emotion': 'emotions',
+    'colors': 'colors', 'color': 'colors', 'couleur': 'colors', 'couleurs': 'colors',
+    'taken': 'taken', 'date': 'taken',
+    'rule': 'rule', 'regle': 'rule',
+}
+KEYWORDS = {
+    'and': 'AND', 'et': 'AND',
+    'or': 'OR', 'ou': 'OR',
+    'not': 'NOT', 'non': 'NOT',
+}
+FAVORITE_WORDS = {'favorite', 'favorites', 'favori', 'favoris'}
+
+_TOKEN = re.compile(r'\s*(?:(?P<lpar>\()|(?P<rpar>\))|(?P<neg>-)(?=[^\s()])|(?P<term>[^\s()":]+:"[^"]*"|"[^"]*"|[^\s()"]+))')
+_DATE = re.compile(r'^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?$')
+
+
+class ExpressionError(ValueError):
+    """Expression invalide ; position = index du caractère fautif"""
+
+    def __init__(self, message: str, position: int = 0):
+        super().__init__(message)
+        self.position = position
+
+
+class Node:
+    def estimate(self, index: UserLabelIndex) -> int:
+        """Cardinalité estimée, pour ordonner les intersections"""
+        return len(index.labels)
+
+    def evaluate(self, index: UserLabelIndex, candidates: Set[int]) -> Set[int]:
+        raise NotImplementedError
+
+    def test(self, index: UserLabelIndex, media_id: int) -> bool:
+        raise NotImplementedError
+
+
+class LabelTerm(Node):
+    """Tous les mots du terme dans un champ (ou dans objets/lieux/émotions si aucun champ)"""
+
+    def __init__(self, fields: List[str], text: str):
+        self.fields = fields
+        self.text = text
+        self.tokens = label_tokens(text)
+
+    def _ids(self, index, field) -> Set[int]:
+        postings = index.postings[field]
+        sets = sorted((postings.get(token, set()) for token in self.tokens), key=len)
+        return set.intersection(*sets) if sets and sets[0] else set()
+
+    def estimate(self, index):
+        return sum(min((len(index.postings[field].get(token, ())) for token in self.tokens), default=0)
+                   for field in self.fields)
+
+    def evaluate(self, index, candidates):
+        result = set()
+        for field in self.fields:
+            result |= self._ids(index, field)
+        return result & candidates
+
+    def test(self, index, media_id):
+        labels = index.labels.get(media_id)
+        return bool(labels) and bool(self.tokens) and any(self.tokens <= labels[field] for field in self.fields)
+
+    def __str__(self):
+        value = f'"{self.text}"' if ' ' in self.text else self.text
+        return value if len(self.fields) > 1 else f'{self.fields[0]}:{value}'
+
+
+class ColorTerm(Node):
+    def __init__(self, text: str):
+        self.text = text
+        self.name = COLOR_CLASS_ALIASES.get(normalize_label(text))
+        if self.name is None:
+            raise ExpressionError(f"Couleur inconnue: {text}")
+
+    def estimate(self, index):
+        return len(index.postings['colors'].get(self.name, ()))
+
+    def evaluate(self, index, candidates):
+        return index.postings['colors'].get(self.name, set()) & candidates
+
+    def test(self, index, media_id):
+        labels = index.labels.get(media_id)
+        return bool(labels) and self.name in labels['colors']
+
+    def __str__(self):
+        return f'colors:{self.name}'
+
+
+class DateTerm(Node):
+    """Date de prise de vue dans un jour, un mois ou une année ; 'a..b' pour une plage"""
+
+    def __init__(self, text: str):
+        self.text = text
+        start, _, end = text.partition('..')
+        self.start = self._bounds(start)[0]
+        self.end = self._bounds(end or start)[1]
+
+    @staticmethod
+    def _bounds(value: str):
+        match = _DATE.match(value)
+        if not match:
+            raise ExpressionError(f"Date invalide: {value} (AAAA, AAAA-MM ou AAAA-MM-JJ)")
+        year, month, day = (int(part) if part else None for part in match.groups())
+        try:
+            if month is None:
+                start, end = datetime(year, 1, 1), datetime(year, 12, 31, 23, 59, 59, 999999)
+            elif day is None:
+                last = calendar.monthrange(year, month)[1]
+                start, end = datetime(year, month, 1), datetime(year, month, last, 23, 59, 59, 999999)
+            else:
+                start, end = datetime(year, month, day), datetime(year, month, day, 23, 59, 59, 999999)
+        except ValueError:
+            raise ExpressionError(f"Date invalide: {value}")
+        return timezone.make_aware(start), timezone.make_aware(end)
+
+    def evaluate(self, index, candidates):
+        # Parcours des seuls candidats : placé en dernier dans les intersections
+        return {mid for mid in candidates if self.start <= index.taken_at[mid] <= self.end}
+
+    def test(self, index, media_id):
+        taken = index.taken_at.get(media_id)
+        return taken is not None and self.start <= taken <= self.end
+
+    def __str__(self):
+        return f'taken:{self.text}'
+
+
+class FavoriteTerm(Node):
+    def estimate(self, index):
+        return len(index.favorites)
+
+    def evaluate(self, index, candidates):
+        return index.favorites & candidates
+
+    def test(self, index, media_id):
+        return media_id in index.favorites
+
+    def __str__(self):
+        return 'favorite'
+
+
+class RuleTerm(Node):
+    """Règle d'album automatique existante (ex: people, beaches)"""
+
+    def __init__(self, key: str, config: Dict):
+        self.key = key
+        self.config = config
+
+    def evaluate(self, index, candidates):
+        return index.match(self.config) & candidates
+
+    def test(self, index, media_id):
+        return index.matches_media(media_id, self.config)
+
+    def __str__(self):
+        return f'rule:{self.key}'
+
+
+class Not(Node):
+    def __init__(self, child: Node):
+        self.child = child
+
+    def estimate(self, index):
+        return max(len(index.labels) - self.child.estimate(index), 0)
+
+    def evaluate(self, index, candidates):
+        return candidates - self.child.evaluate(index, candidates)
+
+    def test(self, index, media_id):
+        return media_id in index.labels and not self.child.test(index, media_id)
+
+    def __str__(self):
+        return f'NOT {self.child}'
+
+
+class And(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+
+    def estimate(self, index):
+        return min(child.estimate(index) for child in self.children)
+
+    def evaluate(self, index, candidates):
+        positives = sorted((c for c in self.children if not isinstance(c, Not)), key=lambda c: c.estimate(index))
+        negatives = [c.child for c in self.children if isinstance(c, Not)]
+        result = candidates
+        for child in positives:
+            if not result:
+                return result
+            result = child.evaluate(index, result)
+        for child in negatives:
+            if not result:
+                break
+            result = result - child.evaluate(index, result)
+        return result
+
+    def test(self, index, media_id):
+        return all(child.test(index, media_id) for child in self.children)
+
+    def __str__(self):
+        return ' AND '.join(f'({c})' if isinstance(c, Or) else str(c) for c in self.children)
+
+
+class Or(Node):
+    def __init__(self, children: List[Node]):
+        self.children = children
+
+    def estimate(self, index):
+        return min(sum(child.estimate(index) for child in self.children), len(index.labels))
+
+    def evaluate(self, index, candidates):
+        result = set()
+        for child in sorted(self.children, key=lambda c: c.estimate(index), reverse=True):
+            result |= child.evaluate(index, candidates - result)
+            if len(result) == len(candidates):
+                break
+        return result
+
+    def test(self, index, media_id):
+        return any(child.test(index, media_id) for child in self.children)
+
+    def __str__(self):
+        return ' OR '.join(str(c) for c in self.children)
+
+
+class _Parser:
+    def __init__(self, text: str, rules: Dict[str, Dict]):
+        self.text = text
+        self.rules = rules
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+
+    @staticmethod
+    def _tokenize(text: str):
+        tokens, offset = [], 0
+        while offset < len(text):
+            match = _TOKEN.match(text, offset)
+            if not match or match.end() == offset:
+                if text[offset:].strip():
+                    raise ExpressionError(f"Caractère inattendu: {text[offset:].strip()[0]}", offset)
+                break
+            kind = match.lastgroup
+            value, start = match.group(kind), match.start(kind)
+            if kind == 'term' and ':' not in value and value.lower() in KEYWORDS:
+                kind, value = KEYWORDS[value.lower()], value
+            elif kind == 'neg':
+                kind = 'NOT'
+            tokens.append((kind, value, start))
+            offset = match.end()
+        return tokens
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _position(self) -> int:
+        return self.tokens[self.pos][2] if self.pos < len(self.tokens) else len(self.text)
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise ExpressionError("Expression vide")
+        node = self._or()
+        if self.pos < len(self.tokens):
+            raise ExpressionError(f"Élément inattendu: {self.tokens[self.pos][1]}", self._position())
+        return node
+
+    def _or(self) -> Node:
+        children = [self._and()]
+        while self._peek() == 'OR':
+            self.pos += 1
+            children.append(self._and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def _and(self) -> Node:
+        children = [self._not()]
+        # ET explicite ou implicite (juxtaposition)
+        while self._peek() in ('AND', 'NOT', 'lpar', 'term'):
+            if self._peek() == 'AND':
+                self.pos += 1
+            children.append(self._not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def _not(self) -> Node:
+        if self._peek() == 'NOT':
+            self.pos += 1
+            return Not(self._not())
+        return self._atom()
+
+    def _atom(self) -> Node:
+        kind = self._peek()
+        position = self._position()
+        if kind == 'lpar':
+            self.pos += 1
+            node = self._or()
+            if self._peek() != 'rpar':
+                raise ExpressionError("Parenthèse fermante manquante", self._position())
+            self.pos += 1
+            return node
+        if kind != 'term':
+            raise ExpressionError("Terme attendu", position)
+        value = self.tokens[self.pos][1]
+        self.pos += 1
+        try:
+            return self._term(value)
+        except ExpressionError as e:
+            e.position = position
+            raise
+
+    def _term(self, value: str) -> Node:
+        prefix, sep, rest = value.partition(':')
+        if not sep:
+            word = value.strip('"')
+            folded = normalize_label(word)
+            if folded in FAVORITE_WORDS:
+                return FavoriteTerm()
+            if folded in self.rules:
+                return RuleTerm(folded, self.rules[folded])
+            return self._label(['objects', 'locations', 'emotions'], word)
+
+        field = FIELD_ALIASES.get(normalize_label(prefix))
+        rest = rest.strip('"')
+        if field is None:
+            raise ExpressionError(f"Champ inconnu: {prefix}")
+        if not rest:
+            raise ExpressionError(f"Valeur manquante après {prefix}:")
+        if field == 'taken':
+            return DateTerm(rest)
+        if field == 'colors':
+            return ColorTerm(rest)
+        if field == 'rule':
+            key = normalize_label(rest).replace(' ', '_')
+            if key not in self.rules:
+                raise ExpressionError(f"Règle inconnue: {rest}")
+            return RuleTerm(key, self.rules[key])
+        return self._label([field], rest)
+
+    @staticmethod
+    def _label(fields: List[str], text: str) -> Node:
+        if not label_tokens(text):
+            raise ExpressionError(f"Terme trop court: {text}")
+        return LabelTerm(fields, text)
+
+
+def _album_rules() -> Dict[str, Dict]:
+    from .smart_album_service import smart_album_service
+    return smart_album_service.album_rules
+
+
+@lru_cache(maxsize=512)
+def compile_expression(text: str) -> Node:
+    """Analyse une expression en arbre de prédicats (mis en cache par texte)"""
+    return _Parser(text.strip(), _album_rules()).parse()
+
+
+def evaluate_expression(index: UserLabelIndex, text: str) -> Set[int]:
+    """Ids des médias analysés satisfaisant l'expression"""
+    return index.select(compile_expression(text))
@@ -0,0 +1,94 @@
+"""
+Écriture des appartenances SmartAlbum <-> Media par différence, en masse sur la table de liaison
+La couverture et le compteur dénormalisé media_count sont mis à jour dans la même transaction
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Media, SmartAlbum
+
+logger = logging.getLogger(__name__)
+
+AlbumMedia = SmartAlbum.media.through
+
+BATCH_SIZE = 1000
+
+
+def _insert(album_id: int, media_ids: Iterable[int]) -> None:
+    AlbumMedia.objects.bulk_create(
+        [AlbumMedia(smartalbum_id=album_id, media_id=media_id) for media_id in media_ids],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def set_members(album: SmartAlbum, media_ids: List[int]) -> Dict[str, int]:
+    """
+    Remplace le contenu de l'album par media_ids (du plus récent au plus ancien)
+
+    Une lecture des ids actuels, puis au plus une suppression et une insertion
+    en masse : l'album n'est jamais vide pendant la mise à jour
+
+    Returns:
+        Dict avec 'added', 'removed' et 'total'
+    """
+    target = set(media_ids)
+    with transaction.atomic():
+        current = set(AlbumMedia.objects.filter(smartalbum_id=album.id).values_list('media_id', flat=True))
+        to_remove = current - target
+        to_add = [media_id for media_id in media_ids if media_id not in current]
+
+        if to_remove:
+            AlbumMedia.objects.filter(smartalbum_id=album.id, media_id__in=to_remove).delete()
+        if to_add:
+            _insert(album.id, to_add)
+
+        album.cover_image_id = media_ids[0] if media_ids else None
+        album.media_count = len(target)
+        album.updated_at = timezone.now()
+        SmartAlbum.objects.filter(pk=album.pk).update(
+            cover_image_id=album.cover_image_id,
+            media_count=album.media_count,
+            updated_at=album.updated_at,
+        )
+    return {'added': len(to_add), 'removed': len(to_remove), 'total': len(target)}
+
+
+def add_members(album: SmartAlbum, media_list: List[Media], cover: Optional[Media] = None) -> int:
+    """Ajoute des médias absents de l'album ; cover remplace la couverture si fournie"""
+    with transaction.atomic():
+        current = set(AlbumMedia.objects.filter(
+            smartalbum_id=album.id, media_id__in=[media.id for media in media_list]
+        ).values_list('media_id', flat=True))
+        to_add = list(dict.fromkeys(media.id for media in media_list if media.id not in current))
+        if to_add:
+            _insert(album.id, to_add)
+        updates = {'media_count': F('media_count') + len(to_add), 'updated_at': timezone.now()}
+        if cover is not None:
+            updates['cover_image_id'] = cover.id
+        SmartAlbum.objects.filter(pk=album.pk).update(**updates)
+    _sync_instance(album)
+    return len(to_add)
+
+
+def remove_members(album: SmartAlbum, media_ids: List[int]) -> int:
+    """Retire des médias ; si la couverture en fait partie, reprend le plus récent restant"""
+    with transaction.atomic():
+        removed = AlbumMedia.objects.filter(smartalbum_id=album.id, media_id__in=media_ids).delete()[0]
+        updates = {'media_count': F('media_count') - removed, 'updated_at': timezone.now()}
+        if album.cover_image_id in media_ids:
+            updates['cover_image_id'] = (
+                Media.objects.filter(smart_albums=album).order_by('-uploaded_at')
+                .values_list('id', flat=True).first()
+            )
+        SmartAlbum.objects.filter(pk=album.pk).update(**updates)
+    _sync_instance(album)
+    return removed
+
+
+def _sync_instance(album: SmartAlbum) -> None:
+    """Recharge les champs dénormalisés après une mise à jour par F()"""
+    album.refresh_from_db(fields=['media_count', 'cover_image', 'updated_at'])
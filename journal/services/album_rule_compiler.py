@@ -0,0 +1,266 @@
+"""
+Compilation des règles d'albums en une agrégation MongoDB ($lookup + $facet)
+précédée d'un filtre indexé (jetons via l'index multikey, date, favori) : seuls les
+médias candidats sont joints à leurs analyses.
+Repli sur l'index d'étiquettes en mémoire hors MongoDB ou en cas d'erreur
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..models import Media, MediaAnalysis
+from .color_index import COLOR_CLASS_ALIASES
+from .label_index import (
+    LABEL_FIELDS,
+    RULE_FIELDS,
+    label_index_service,
+    label_tokens,
+    labels_from_analysis,
+    normalize_label,
+)
+
+logger = logging.getLogger(__name__)
+
+MEDIA_COLLECTION = Media._meta.db_table
+ANALYSIS_COLLECTION = MediaAnalysis._meta.db_table
+
+# Les JSONField sont stockés en chaîne JSON par Djongo : les jetons sont écrits
+# à part, en tableau natif, pour pouvoir être filtrés et indexés côté serveur
+TOKENS_FIELD = 'label_tokens'
+
+INDEXES = {
+    MEDIA_COLLECTION: [
+        [('user_id', 1), ('media_type', 1), ('uploaded_at', -1)],
+    ],
+    ANALYSIS_COLLECTION: [
+        [('media_id', 1)],
+        [(TOKENS_FIELD, 1)],  # Multikey
+    ],
+}
+
+
+def flatten_labels(labels: Dict) -> List[str]:
+    """{'objects': {'plage'}, ...} -> ['objects:plage', ...]"""
+    return sorted(f'{field}:{token}' for field in LABEL_FIELDS for token in labels.get(field, ()))
+
+
+def _term_match(field: str, term: str) -> Optional[Dict]:
+    if field == 'colors':
+        name = COLOR_CLASS_ALIASES.get(normalize_label(term))
+        return {'labels': f'colors:{name}'} if name else None
+    tokens = label_tokens(term)
+    if not tokens:
+        return None
+    return {'labels': {'$all': sorted(f'{field}:{token}' for token in tokens)}}
+
+
+def compile_rule(config: Dict, now: datetime) -> Dict:
+    """Règle -> expression $match (OU dans un critère, ET entre critères)"""
+    clauses = []
+    if 'days_ago' in config:
+        clauses.append({'uploaded_at': {'$gte': now - timedelta(days=config['days_ago'])}})
+    if config.get('is_favorite'):
+        clauses.append({'is_favorite': True})
+    for rule_key, field in RULE_FIELDS.items():
+        if rule_key not in config:
+            continue
+        terms = [match for match in (_term_match(field, term) for term in config[rule_key]) if match]
+        if not terms:
+            clauses.append({'id': {'$in': []}})
+        else:
+            clauses.append(terms[0] if len(terms) == 1 else {'$or': terms})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def required_tokens(config: Dict) -> Optional[List[str]]:
+    """
+    Jetons dont un média doit porter au moins un pour satisfaire la règle (condition
+    nécessaire, filtrable par l'index multikey) ; None si la règle ne porte sur aucune étiquette
+    """
+    tokens = set()
+    labelled = False
+    for rule_key, field in RULE_FIELDS.items():
+        if rule_key not in config:
+            continue
+        labelled = True
+        for term in config[rule_key]:
+            if field == 'colors':
+                name = COLOR_CLASS_ALIASES.get(normalize_label(term))
+                if name:
+                    tokens.add(f'colors:{name}')
+            else:
+                tokens.update(f'{field}:{token}' for token in label_tokens(term))
+    return sorted(tokens) if labelled else None
+
+
+def compile_prefilter(rules: Dict[str, Dict], now: datetime, candidate_ids: List[int]) -> Dict:
+    """
+    Filtre des médias à joindre, appliqué avant le $lookup (donc indexable) : union, par règle,
+    des candidats par jetons (règles d'étiquettes) ou de ses critères date/favori ; {} si une
+    règle retient tous les médias analysés
+    """
+    branches = []
+    for config in rules.values():
+        if required_tokens(config) is not None:
+            branch = {'id': {'$in': candidate_ids}}
+        else:
+            branch = compile_rule(config, now)
+            if not branch:
+                return {}
+        if branch not in branches:
+            branches.append(branch)
+    if not branches:
+        return {}
+    return branches[0] if len(branches) == 1 else {'$or': branches}
+
+
+def compile_threshold(config: Dict) -> List[Dict]:
+    """
+    min_media -> étapes de seuil : les ids triés sont regroupés en un document
+    {'ids': [...], 'count': n}, écarté si n < min_media (facette vide)
+    """
+    return [
+        {'$group': {'_id': None, 'ids': {'$push': '$id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gte': config.get('min_media', 1)}}},
+    ]
+
+
+def apply_threshold(config: Dict, media_ids: List[int]) -> List[int]:
+    """Équivalent de compile_threshold pour le repli sur l'index"""
+    return media_ids if len(media_ids) >= config.get('min_media', 1) else []
+
+
+def build_pipeline(user_id: int, rules: Dict[str, Dict], now: datetime,
+                   candidate_ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Une seule agrégation : médias analysés candidats de l'utilisateur, puis une facette par
+    règle (un document {'ids': [...]} du plus récent au plus ancien, absent sous min_media)
+
+    candidate_ids : médias dont une analyse porte un jeton requis (voir candidate_media)
+    """
+    return [
+        {'$match': {
+            'user_id': user_id, 'media_type': 'image', 'is_analyzed': True,
+            **compile_prefilter(rules, now, candidate_ids or []),
+        }},
+        {'$lookup': {
+            'from': ANALYSIS_COLLECTION,
+            'localField': 'id',
+            'foreignField': 'media_id',
+            'as': 'analysis',
+        }},
+        # Analyses en double : union des jetons ; sans analyse : écarté
+        {'$unwind': '$analysis'},
+        {'$unwind': {'path': f'$analysis.{TOKENS_FIELD}', 'preserveNullAndEmptyArrays': True}},
+        {'$group': {
+            '_id': '$id',
+            'is_favorite': {'$first': '$is_favorite'},
+            'uploaded_at': {'$first': '$uploaded_at'},
+            'labels': {'$addToSet': f'$analysis.{TOKENS_FIELD}'},
+        }},
+        {'$project': {'id': '$_id', 'is_favorite': 1, 'uploaded_at': 1, 'labels': 1}},
+        {'$facet': {
+            key: [
+                {'$match': compile_rule(config, now)},
+                {'$sort': {'uploaded_at': -1, 'id': -1}},
+                *compile_threshold(config),
+            ]
+            for key, config in rules.items()
+        }},
+    ]
+
+
+class AlbumRuleEvaluator:
+    """Évalue toutes les règles d'un utilisateur, côté MongoDB si disponible"""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> str:
+        backend = getattr(settings, 'ALBUM_RULES_BACKEND', 'auto')
+        if backend == 'auto':
+            return 'mongo' if settings.DATABASES['default']['ENGINE'] == 'djongo' else 'orm'
+        return backend
+
+    def _db(self):
+        with self._lock:
+            if self._client is None:
+                from pymongo import MongoClient
+                self._client = MongoClient(settings.DATABASES['default']['CLIENT']['host'])
+        return self._client[settings.DATABASES['default']['NAME']]
+
+    def evaluate(self, user: User, rules: Dict[str, Dict]) -> Dict[str, List[int]]:
+        """Ids par règle, du plus récent au plus ancien ; liste vide sous le seuil min_media"""
+        if self.backend == 'mongo':
+            try:
+                return self.evaluate_mongo(user, rules)
+            except Exception as e:
+                logger.error(f"❌ Agrégation MongoDB impossible, repli sur l'index: {e}")
+        return self.evaluate_orm(user, rules)
+
+    def candidate_media(self, rules: Dict[str, Dict]) -> List[int]:
+        """Ids des médias dont une analyse porte un jeton requis (index multikey label_tokens)"""
+        tokens = sorted({token for config in rules.values() for token in required_tokens(config) or ()})
+        if not tokens:
+            return []
+        return self._db()[ANALYSIS_COLLECTION].distinct('media_id', {TOKENS_FIELD: {'$in': tokens}})
+
+    def evaluate_mongo(self, user: User, rules: Dict[str, Dict]) -> Dict[str, List[int]]:
+        pipeline = build_pipeline(user.id, rules, timezone.now(), self.candidate_media(rules))
+        facets = next(self._db()[MEDIA_COLLECTION].aggregate(pipeline), {})
+        return {key: facets[key][0]['ids'] if facets.get(key) else [] for key in rules}
+
+    @staticmethod
+    def evaluate_orm(user: User, rules: Dict[str, Dict]) -> Dict[str, List[int]]:
+        matches = label_index_service.get_index(user).evaluate(rules)
+        return {key: apply_threshold(rules[key], media_ids) for key, media_ids in matches.items()}
+
+    def sync_tokens(self, media: Media) -> None:
+        """Réécrit les jetons natifs des analyses d'un média (après analyse)"""
+        if self.backend != 'mongo':
+            return
+        rows = MediaAnalysis.objects.filter(media=media).values_list(
+            'id', 'detected_objects', 'detected_locations', 'detected_emotions', 'color_palette', 'dominant_colors'
+        )
+        collection = self._db()[ANALYSIS_COLLECTION]
+        for analysis_id, *fields in rows:
+            collection.update_one(
+                {'id': analysis_id},
+                {'$set': {TOKENS_FIELD: flatten_labels(labels_from_analysis(*fields))}},
+            )
+
+    def backfill_tokens(self, only_missing: bool = True) -> int:
+        """Calcule les jetons natifs de toutes les analyses (migration, changement de normalisation)"""
+        collection = self._db()[ANALYSIS_COLLECTION]
+        query = {TOKENS_FIELD: {'$exists': False}} if only_missing else {}
+        ids = [doc['id'] for doc in collection.find(query, {'id': 1}) if 'id' in doc]
+        count = 0
+        for start in range(0, len(ids), 500):
+            rows = MediaAnalysis.objects.filter(id__in=ids[start:start + 500]).values_list(
+                'id', 'detected_objects', 'detected_locations', 'detected_emotions',
+                'color_palette', 'dominant_colors'
+            )
+            for analysis_id, *fields in rows:
+                collection.update_one(
+                    {'id': analysis_id},
+                    {'$set': {TOKENS_FIELD: flatten_labels(labels_from_analysis(*fields))}},
+                )
+                count += 1
+        return count
+
+    def ensure_indexes(self) -> List[str]:
+        db = self._db()
+        return [db[name].create_index(keys) for name, specs in INDEXES.items() for keys in specs]
+
+
+# Instance globale du service
+album_rule_evaluator = AlbumRuleEvaluator()
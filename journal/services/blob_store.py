@@ -0,0 +1,179 @@
+"""
+Compteurs de références des fichiers adressés par contenu (MediaBlob)
+Un média qui quitte un blob décrémente son compteur ; le fichier n'est supprimé
+que par sweep(), hors requête, après un délai de grâce
+"""
+import logging
+import os
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Count, F
+from django.utils import timezone
+
+from ..models import Media, MediaBlob
+from ..storage import BLOB_PREFIX, blob_name, blob_storage, content_digest, is_blob
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """Appelé par les signaux de Media (journal/signals.py) et par la commande media_blobs"""
+
+    @staticmethod
+    def _digest(name: str) -> str:
+        return os.path.splitext(os.path.basename(name))[0]
+
+    @staticmethod
+    def track(media: Media) -> None:
+        """Mémorise le fichier enregistré en base (post_init, après chaque écriture)"""
+        if 'file' not in media.get_deferred_fields():
+            media._blob_name = media.file.name
+
+    def media_saved(self, media: Media, created: bool) -> None:
+        """Nouveau média ou fichier remplacé : référence prise sur le nouveau, rendue sur l'ancien"""
+        if created:
+            self.acquire(media.file.name)
+        elif hasattr(media, '_blob_name') and media.file.name != media._blob_name:
+            self.acquire(media.file.name)
+            self.release(media._blob_name)
+        self.track(media)
+
+    def media_deleted(self, media: Media) -> None:
+        self.release(getattr(media, '_blob_name', None) or media.file.name)
+
+    def acquire(self, name: str) -> None:
+        """Une référence de plus sur le blob (création de la ligne au premier média)"""
+        if not is_blob(name):
+            return
+        if MediaBlob.objects.filter(path=name).update(ref_count=F('ref_count') + 1, released_at=None):
+            return
+        try:
+            size = blob_storage.size(name) if blob_storage.exists(name) else 0
+            MediaBlob.objects.create(path=name, sha256=self._digest(name), size=size, ref_count=1)
+        except IntegrityError:
+            # Créée en parallèle par un autre import du même contenu
+            MediaBlob.objects.filter(path=name).update(ref_count=F('ref_count') + 1, released_at=None)
+
+    def claim(self, name: str, size: int = 0) -> bool:
+        """
+        Appelé par le stockage avant d'écrire ou de réutiliser un blob : la ligne sans
+        référence repart pour un délai de grâce complet, le balayage ne peut plus la
+        supprimer d'ici l'enregistrement du média. False si le fichier doit être (ré)écrit :
+        aucune ligne, ou ligne supprimée par un balayage en cours
+        """
+        if MediaBlob.objects.filter(path=name, ref_count__lte=0).update(released_at=timezone.now()):
+            return True
+        if MediaBlob.objects.filter(path=name).exists():
+            return True
+        try:
+            MediaBlob.objects.create(path=name, sha256=self._digest(name), size=size,
+                                     ref_count=0, released_at=timezone.now())
+        except IntegrityError:
+            pass  # Créée en parallèle par un autre import du même contenu
+        return False
+
+    def release(self, name: str) -> None:
+        """Une référence de moins ; à zéro, le blob devient candidat au balayage"""
+        if not is_blob(name):
+            return
+        MediaBlob.objects.filter(path=name).update(ref_count=F('ref_count') - 1)
+        MediaBlob.objects.filter(path=name, ref_count__lte=0, released_at__isnull=True).update(
+            released_at=timezone.now()
+        )
+
+    def sweep(self, grace: Optional[timedelta] = None, dry_run: bool = False) -> List[str]:
+        """Supprime les blobs sans référence depuis plus de grace ; retourne leurs chemins"""
+        if grace is None:
+            grace = timedelta(hours=settings.MEDIA_BLOB_GRACE_HOURS)
+        cutoff = timezone.now() - grace
+        candidates = MediaBlob.objects.filter(ref_count__lte=0, released_at__lte=cutoff)
+        swept = []
+        for blob_id, path in candidates.values_list('id', 'path'):
+            # Garde-fou : un média pointe encore sur ce fichier (compteur faussé)
+            references = Media.objects.filter(file=path).count()
+            if references:
+                logger.warning(f"⚠️ Blob {path} encore référencé {references} fois, compteur corrigé")
+                if not dry_run:
+                    MediaBlob.objects.filter(pk=blob_id).update(ref_count=references, released_at=None)
+                continue
+            swept.append(path)
+            if dry_run:
+                continue
+            # La ligne d'abord, et seulement si personne ne l'a reprise ni réclamée entre-temps
+            if MediaBlob.objects.filter(pk=blob_id, ref_count__lte=0, released_at__lte=cutoff).delete()[0]:
+                self._remove_file(path)
+        if swept and not dry_run:
+            logger.info(f"🧹 {len(swept)} fichier(s) sans référence supprimé(s)")
+        return swept
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        """
+        Suppression en deux temps : mise à l'écart, puis vérification qu'aucun import
+        n'a réclamé le blob (claim recrée la ligne avant d'écrire) ; sinon il est remis en place
+        """
+        full_path = blob_storage.path(path)
+        swept_path = f'{full_path}.sweep'
+        try:
+            os.replace(full_path, swept_path)
+        except FileNotFoundError:
+            return
+        if MediaBlob.objects.filter(path=path).exists() and not os.path.exists(full_path):
+            os.replace(swept_path, full_path)
+            logger.info(f"♻️ Blob {path} réclamé pendant le balayage, conservé")
+        else:
+            os.remove(swept_path)
+
+    def recount(self, dry_run: bool = False) -> Dict[str, tuple]:
+        """
+        Recalcule les compteurs depuis la table Media (une agrégation groupée par fichier)
+
+        Returns:
+            chemin -> (compteur enregistré, compteur réel) des blobs divergents
+        """
+        actual = {
+            row['file']: row['n']
+            for row in Media.objects.filter(file__startswith=BLOB_PREFIX).values('file').annotate(n=Count('id')).order_by()
+        }
+        stored = dict(MediaBlob.objects.values_list('path', 'ref_count'))
+        drift = {}
+        now = timezone.now()
+        for path in set(actual) | set(stored):
+            expected = actual.get(path, 0)
+            if stored.get(path) == expected:
+                continue
+            drift[path] = (stored.get(path), expected)
+            if dry_run:
+                continue
+            if path not in stored:
+                self.acquire(path)
+                MediaBlob.objects.filter(path=path).update(ref_count=expected)
+            else:
+                MediaBlob.objects.filter(path=path).update(
+                    ref_count=expected, released_at=None if expected else now
+                )
+        return drift
+
+    def adopt(self, media: Media) -> Optional[str]:
+        """Déplace le fichier d'un média importé avant le stockage par contenu vers son blob"""
+        old_name = media.file.name
+        if not old_name or is_blob(old_name) or not blob_storage.exists(old_name):
+            return None
+        with blob_storage.open(old_name, 'rb') as handle:
+            target = blob_name(content_digest(handle), os.path.splitext(old_name)[1].lstrip('.'))
+            if not blob_storage.exists(target):
+                blob_storage.save(target, handle)
+        # update() : pas de signal post_save, la référence est prise ici
+        Media.objects.filter(pk=media.pk).update(file=target)
+        self.acquire(target)
+        media.file.name = target
+        self.track(media)
+        blob_storage.delete(old_name)
+        return target
+
+
+# Instance globale du service
+blob_store = BlobStore()
@@ -0,0 +1,102 @@
+"""
+Moteur CLIP partagé : chargement du modèle et scoring par groupes de prompts
+Utilisé en mode in-process par VisionAIService et par le sidecar d'inférence
+"""
+
+import importlib.util
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import CLIPModel, CLIPProcessor
+
+from .model_bundle import CLIP_MODEL_NAME, active_bundle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = CLIP_MODEL_NAME
+
+
+class ClipEngine:
+    """Encode les images une seule fois et les compare à des prompts mis en cache"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, device: str = None,
+                 bundle: Optional[Dict] = None):
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model_name = model_name
+        self.bundle = bundle or active_bundle(model_name)
+
+        if self.bundle:
+            # Bundle local : aucune requête au Hub, poids safetensors chargés sans copie intermédiaire
+            source = self.bundle['path']
+            load_kwargs = {'local_files_only': True}
+            model_kwargs = {'use_safetensors': True}
+            if importlib.util.find_spec('accelerate') is not None:
+                model_kwargs['low_cpu_mem_usage'] = True
+            logger.info(f"📥 Chargement du bundle CLIP {self.bundle['version']} sur {self.device}...")
+        else:
+            source, load_kwargs, model_kwargs = model_name, {}, {}
+            logger.warning(f"⚠️ Aucun bundle local pour {model_name}, résolution via le Hub")
+            logger.info(f"📥 Chargement du modèle CLIP ({model_name}) sur {self.device}...")
+
+        self.processor = CLIPProcessor.from_pretrained(source, **load_kwargs)
+        self.model = CLIPModel.from_pretrained(source, **load_kwargs, **model_kwargs)
+        self.model.to(self.device)
+        self.model.eval()
+        self.logit_scale = float(self.model.logit_scale.exp().item())
+        self._text_cache: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        logger.info("✅ Modèle CLIP chargé avec succès")
+
+    @property
+    def bundle_version(self) -> Optional[str]:
+        return self.bundle['version'] if self.bundle else None
+
+    def describe(self) -> Dict:
+        """Modèle effectivement chargé en mémoire (pour /health/)"""
+        return {
+            'model': self.model_name,
+            'version': self.bundle_version,
+            'revision': self.bundle.get('revision') if self.bundle else None,
+        }
+
+    def image_features(self, images: Sequence[Image.Image]) -> np.ndarray:
+        """Embeddings normalisés d'un lot d'images (une ligne par image)"""
+        inputs = self.processor(images=list(images), return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            features = self.model.get_image_features(**inputs)
+        features = features / features.norm(dim=-1, keepdim=True)
+        return features.cpu().numpy().astype(np.float32)
+
+    def text_features(self, prompts: Sequence[str]) -> np.ndarray:
+        """Embeddings normalisés des prompts, calculés une seule fois par prompt"""
+        with self._lock:
+            missing = [p for p in dict.fromkeys(prompts) if p not in self._text_cache]
+            if missing:
+                inputs = self.processor(text=missing, return_tensors="pt", padding=True).to(self.device)
+                with torch.no_grad():
+                    features = self.model.get_text_features(**inputs)
+                features = features / features.norm(dim=-1, keepdim=True)
+                for prompt, row in zip(missing, features.cpu().numpy().astype(np.float32)):
+                    self._text_cache[prompt] = row
+            return np.stack([self._text_cache[p] for p in prompts])
+
+    def group_probs(self, image_embedding: np.ndarray, groups: Sequence[Sequence[str]]) -> List[List[float]]:
+        """Softmax par groupe de prompts, équivalent à logits_per_image.softmax(dim=1)"""
+        results = []
+        for prompts in groups:
+            if not prompts:
+                results.append([])
+                continue
+            logits = self.logit_scale * (self.text_features(prompts) @ image_embedding)
+            logits = logits - logits.max()
+            exp = np.exp(logits)
+            results.append((exp / exp.sum()).tolist())
+        return results
+
+    def score(self, image: Image.Image, groups: Sequence[Sequence[str]]) -> List[List[float]]:
+        """Encode une image et renvoie les probabilités de chaque groupe"""
+        return self.group_probs(self.image_features([image])[0], groups)
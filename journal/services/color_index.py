@@ -0,0 +1,273 @@
+"""
+Index de similarité de couleurs dans l'espace perceptuel CIE Lab
+Recherche "photos proches de cette couleur" et "palettes comme cette photo"
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from scipy.spatial import cKDTree
+
+from ..models import MediaAnalysis
+
+logger = logging.getLogger(__name__)
+
+# Rayon (ΔE76) au-delà duquel deux couleurs ne sont plus considérées proches
+COLOR_MATCH_RADIUS = 25.0
+
+# Classes de couleurs pour les règles d'albums : bornes supérieures de teinte Lab (degrés)
+_HUE_CLASSES = [
+    (55, 'red'), (85, 'orange'), (115, 'yellow'), (170, 'green'),
+    (225, 'cyan'), (315, 'blue'), (345, 'purple'), (360, 'red'),
+]
+ACHROMATIC_CHROMA = 12.0
+# Part minimale de l'image pour qu'une classe soit considérée dominante
+DOMINANT_CLASS_SHARE = 0.25
+
+COLOR_CLASS_ALIASES = {
+    'rouge': 'red', 'red': 'red',
+    'orange': 'orange',
+    'jaune': 'yellow', 'yellow': 'yellow',
+    'vert': 'green', 'green': 'green',
+    'cyan': 'cyan', 'turquoise': 'cyan',
+    'bleu': 'blue', 'blue': 'blue',
+    'violet': 'purple', 'purple': 'purple',
+    'rose': 'pink', 'pink': 'pink',
+    'marron': 'brown', 'brown': 'brown',
+    'blanc': 'white', 'white': 'white',
+    'gris': 'gray', 'gray': 'gray', 'grey': 'gray',
+    'noir': 'black', 'black': 'black',
+}
+
+# Blanc de référence D65
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+
+
+def rgb_to_lab(rgb) -> np.ndarray:
+    """Convertit des couleurs sRGB 0-255 (shape (..., 3)) en CIE Lab"""
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb > 0.04045, ((srgb + 0.055) / 1.055) ** 2.4, srgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
+    value = hex_color.strip().lstrip('#')
+    if len(value) == 3:
+        value = ''.join(c * 2 for c in value)
+    if len(value) != 6:
+        raise ValueError(f"Couleur hexadécimale invalide: {hex_color}")
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def build_lab_palette(dominant_colors: Sequence[Dict]) -> List[Dict]:
+    """Palette Lab + pourcentages à partir des couleurs dominantes de Vision AI"""
+    colors = [c for c in dominant_colors if c.get('rgb')]
+    if not colors:
+        return []
+    labs = rgb_to_lab([c['rgb'] for c in colors])
+    return [
+        {
+            'lab': [round(float(v), 2) for v in lab],
+            'percentage': c.get('percentage', 0),
+            'hex': c.get('hex'),
+        }
+        for c, lab in zip(colors, labs)
+    ]
+
+
+def lab_color_class(lab) -> str:
+    """Classe de couleur nommée d'une couleur Lab (achromatique, puis angle de teinte)"""
+    lightness, a, b = (float(v) for v in lab)
+    if np.hypot(a, b) < ACHROMATIC_CHROMA:
+        if lightness > 85:
+            return 'white'
+        return 'black' if lightness < 20 else 'gray'
+    hue = float(np.degrees(np.arctan2(b, a))) % 360
+    if 40 <= hue < 100 and lightness < 45:
+        return 'brown'
+    if (hue >= 330 or hue < 20) and lightness > 70:
+        return 'pink'
+    for upper, name in _HUE_CLASSES:
+        if hue < upper:
+            return name
+    return 'red'
+
+
+def dominant_color_classes(color_palette, dominant_colors,
+                           min_share: float = DOMINANT_CLASS_SHARE) -> Dict[str, float]:
+    """Classes couvrant au moins min_share de l'image (part cumulée des couleurs de la palette)"""
+    labs, weights = _palette_arrays(color_palette, dominant_colors)
+    shares: Dict[str, float] = {}
+    for lab, weight in zip(labs, weights):
+        name = lab_color_class(lab)
+        shares[name] = shares.get(name, 0.0) + float(weight)
+    return {name: round(share, 3) for name, share in shares.items() if share >= min_share}
+
+
+def _palette_arrays(color_palette, dominant_colors) -> Tuple[np.ndarray, np.ndarray]:
+    """(Lab (n, 3), poids normalisés (n,)) ; repli sur les anciens hex sans pourcentage"""
+    if color_palette:
+        labs = np.array([entry['lab'] for entry in color_palette], dtype=np.float64)
+        weights = np.array([entry.get('percentage', 0) or 0 for entry in color_palette], dtype=np.float64)
+    else:
+        rgbs = []
+        for value in dominant_colors or []:
+            try:
+                rgbs.append(hex_to_rgb(value if isinstance(value, str) else value.get('hex', '')))
+            except (ValueError, AttributeError):
+                continue
+        if not rgbs:
+            return np.empty((0, 3)), np.empty(0)
+        labs = rgb_to_lab(rgbs)
+        weights = np.ones(len(rgbs))
+    total = weights.sum()
+    weights = weights / total if total > 0 else np.full(len(weights), 1.0 / len(weights))
+    return labs, weights
+
+
+class UserColorIndex:
+    """Nuanciers d'un utilisateur, contigus par média, avec un KD-tree sur les couleurs Lab"""
+
+    def __init__(self, media_ids: np.ndarray, offsets: np.ndarray, labs: np.ndarray, weights: np.ndarray):
+        self.media_ids = media_ids          # (M,) id du média de chaque palette
+        self.offsets = offsets              # (M,) début de la palette dans labs
+        self.labs = labs                    # (N, 3) toutes les couleurs
+        self.weights = weights              # (N,) poids dans leur palette
+        self.owner = np.repeat(np.arange(len(media_ids)), np.diff(np.append(offsets, len(labs))))
+        self.tree = cKDTree(labs) if len(labs) else None
+        self.position = {int(mid): i for i, mid in enumerate(media_ids)}
+
+    @classmethod
+    def build(cls, user: User) -> 'UserColorIndex':
+        rows = MediaAnalysis.objects.filter(media__user=user).values_list(
+            'media_id', 'color_palette', 'dominant_colors'
+        )
+        media_ids, offsets, labs, weights = [], [], [], []
+        count = 0
+        for media_id, color_palette, dominant_colors in rows:
+            palette_labs, palette_weights = _palette_arrays(color_palette, dominant_colors)
+            if not len(palette_labs):
+                continue
+            media_ids.append(media_id)
+            offsets.append(count)
+            labs.append(palette_labs)
+            weights.append(palette_weights)
+            count += len(palette_labs)
+        return cls(
+            np.array(media_ids, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            np.vstack(labs) if labs else np.empty((0, 3)),
+            np.concatenate(weights) if weights else np.empty(0),
+        )
+
+    def search_color(self, lab: np.ndarray, limit: int = 50,
+                     radius: float = COLOR_MATCH_RADIUS) -> List[Tuple[int, float]]:
+        """Médias contenant une couleur proche, pondérés par sa part dans la palette"""
+        if self.tree is None:
+            return []
+        hits = np.asarray(self.tree.query_ball_point(lab, r=radius), dtype=np.int64)
+        if not hits.size:
+            return []
+        distances = np.linalg.norm(self.labs[hits] - lab, axis=1)
+        contributions = self.weights[hits] * (1.0 - distances / radius)
+        scores = np.bincount(self.owner[hits], weights=contributions, minlength=len(self.media_ids))
+        return self._top(scores, limit, descending=True)
+
+    def search_palette(self, labs: np.ndarray, weights: np.ndarray, limit: int = 50,
+                       exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Palettes les plus proches selon une distance pondérée symétrique :
+        moyenne des distances de chaque couleur à la couleur la plus proche de l'autre palette
+        """
+        if self.tree is None or not len(labs):
+            return []
+
+        # Pré-filtre KD-tree : palettes ayant au moins une couleur proche
+        hits = self.tree.query_ball_point(labs, r=2 * COLOR_MATCH_RADIUS)
+        candidates = np.unique(self.owner[np.concatenate([np.asarray(h, dtype=np.int64) for h in hits])])
+        if exclude is not None and exclude in self.position:
+            candidates = candidates[candidates != self.position[exclude]]
+        if not candidates.size:
+            return []
+
+        # Couleurs des palettes candidates, regroupées par palette
+        ends = np.append(self.offsets, len(self.labs))
+        lengths = ends[candidates + 1] - self.offsets[candidates]
+        rows = np.concatenate([np.arange(self.offsets[c], ends[c + 1]) for c in candidates])
+        group_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        distances = np.linalg.norm(labs[:, None, :] - self.labs[rows][None, :, :], axis=2)  # (m, n)
+        # Requête → candidate : pour chaque couleur requête, la plus proche dans chaque palette
+        forward = weights @ np.minimum.reduceat(distances, group_starts, axis=1)
+        # Candidate → requête : chaque couleur candidate vers la plus proche de la requête
+        backward = np.add.reduceat(self.weights[rows] * distances.min(axis=0), group_starts)
+        scores = np.full(len(self.media_ids), np.inf)
+        scores[candidates] = 0.5 * (forward + backward)
+        return self._top(scores, limit, descending=False)
+
+    def palette_of(self, media_id: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        position = self.position.get(int(media_id))
+        if position is None:
+            return None
+        start = self.offsets[position]
+        end = self.offsets[position + 1] if position + 1 < len(self.offsets) else len(self.labs)
+        return self.labs[start:end], self.weights[start:end]
+
+    def _top(self, scores: np.ndarray, limit: int, descending: bool) -> List[Tuple[int, float]]:
+        valid = np.flatnonzero(scores > 0) if descending else np.flatnonzero(np.isfinite(scores))
+        if not valid.size:
+            return []
+        order = valid[np.argsort(-scores[valid] if descending else scores[valid], kind='stable')][:limit]
+        return [(int(self.media_ids[i]), round(float(scores[i]), 3)) for i in order]
+
+
+class ColorIndexService:
+    """Cache par utilisateur des index de couleurs, reconstruits quand les analyses changent"""
+
+    def __init__(self):
+        self._indexes: Dict[int, Tuple[tuple, UserColorIndex]] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, user: User) -> UserColorIndex:
+        stamp = MediaAnalysis.objects.filter(media__user=user).aggregate(
+            n=Count('id'), last=Max('updated_at')
+        )
+        stamp = (stamp['n'], stamp['last'])
+        with self._lock:
+            cached = self._indexes.get(user.id)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        index = UserColorIndex.build(user)
+        with self._lock:
+            self._indexes[user.id] = (stamp, index)
+        logger.info(f"🎨 Index couleurs reconstruit pour {user.username} ({len(index.media_ids)} palettes)")
+        return index
+
+    def search_by_color(self, user: User, hex_color: str, limit: int = 50) -> List[Tuple[int, float]]:
+        lab = rgb_to_lab(hex_to_rgb(hex_color))
+        return self.get_index(user).search_color(lab, limit=limit)
+
+    def search_like_media(self, user: User, media_id: int, limit: int = 50) -> List[Tuple[int, float]]:
+        index = self.get_index(user)
+        palette = index.palette_of(media_id)
+        if palette is None:
+            return []
+        return index.search_palette(*palette, limit=limit, exclude=int(media_id))
+
+
+# Instance globale du service
+color_index_service = ColorIndexService()
@@ -0,0 +1,127 @@
+"""
+Cache des prédictions d'émotion des notes
+Clé : SHA-256 du texte nettoyé (clean_text) et version du modèle. Un LRU en mémoire
+est placé devant le cache Django ; des requêtes identiques simultanées partagent
+un seul calcul
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .. import utils
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'emotion:{version}:{digest}'
+
+Prediction = Tuple[Optional[str], float]
+
+
+def content_digest(text) -> str:
+    """Empreinte du texte tel que le voit le modèle (stockée dans Note.content_hash)"""
+    return hashlib.sha256(utils.clean_text(text).encode('utf-8')).hexdigest()
+
+
+class EmotionCache:
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(digest: str) -> str:
+        return CACHE_KEY.format(version=utils.lr_model_version or 'none', digest=digest)
+
+    def _remember(self, key: str, prediction: Prediction) -> None:
+        with self._lock:
+            self._entries[key] = prediction
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.EMOTION_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[Prediction]:
+        """Lecture du LRU ; à appeler sous self._lock"""
+        prediction = self._entries.get(key)
+        if prediction is not None:
+            self._entries.move_to_end(key)
+        return prediction
+
+    def predict(self, text: str) -> Prediction:
+        """(émotion, confiance) de text, calculée au plus une fois par contenu et par modèle"""
+        if not utils.lr_model:
+            return None, 0.0
+        key = self._key(content_digest(text))
+        with self._lock:
+            prediction = self._recall(key)
+            if prediction is not None:
+                return prediction
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            # Même texte en cours de calcul (aperçu en direct de l'éditeur) : on attend son résultat
+            return future.result()
+
+        try:
+            stored = cache.get(key)
+            if stored is not None:
+                prediction = tuple(stored)
+            else:
+                prediction = utils.predict_emotions([text], utils.lr_model)[0]
+                cache.set(key, prediction, settings.EMOTION_CACHE_TIMEOUT)
+            self._remember(key, prediction)
+            future.set_result(prediction)
+            return prediction
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def predict_many(self, texts: List[str]) -> List[Prediction]:
+        """Comme predict pour une liste : les textes absents des deux caches en un seul appel au modèle"""
+        if not utils.lr_model:
+            return [(None, 0.0) for _ in texts]
+        keys = [self._key(content_digest(text)) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                prediction = self._recall(key)
+                if prediction is not None:
+                    found[key] = prediction
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            for key, stored in cache.get_many(missing).items():
+                found[key] = tuple(stored)
+                self._remember(key, found[key])
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                pending.setdefault(key, text)
+        if pending:
+            predictions = utils.predict_emotions(list(pending.values()), utils.lr_model)
+            computed = dict(zip(pending, predictions))
+            cache.set_many(computed, settings.EMOTION_CACHE_TIMEOUT)
+            for key, prediction in computed.items():
+                found[key] = prediction
+                self._remember(key, prediction)
+        return [found[key] for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Instance globale du service
+emotion_cache = EmotionCache()
@@ -0,0 +1,321 @@
+"""
+Score linéaire creux du modèle d'émotion, sans scikit-learn dans le chemin de requête
+L'exporteur aplatit le vectoriseur (vocabulaire + idf, ou espace haché) et les poids
+du classifieur dans un .npz ; le score reproduit les mêmes opérations flottantes, dans
+le même ordre, que Pipeline.predict_proba : mêmes étiquettes que le chemin sklearn
+"""
+import json
+import logging
+import math
+import os
+import re
+import struct
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SCORER_FILE = 'scorer.npz'
+# 2 : seules les lignes de poids non nulles sont stockées (indices dans 'rows') ;
+# 1 : matrice complète, encore lue
+SCORER_FORMAT = 2
+READABLE_FORMATS = (1, 2)
+
+_MASK = 0xFFFFFFFF
+
+
+class ScorerExportError(Exception):
+    """Pipeline non reproductible par le score creux (vectoriseur ou classifieur non pris en charge)"""
+
+
+def murmurhash3_32(key: str, seed: int = 0) -> int:
+    """MurmurHash3 x86 32 bits signé de la chaîne UTF-8 (comme sklearn.utils.murmurhash3_32)"""
+    data = key.encode('utf-8')
+    length = len(data)
+    nblocks = length // 4
+    h = seed & _MASK
+    for k in struct.unpack_from(f'<{nblocks}I', data):
+        k = (k * 0xCC9E2D51) & _MASK
+        k = ((k << 15) | (k >> 17)) & _MASK
+        h ^= (k * 0x1B873593) & _MASK
+        h = ((h << 13) | (h >> 19)) & _MASK
+        h = (h * 5 + 0xE6546B64) & _MASK
+    tail = data[nblocks * 4:]
+    if tail:
+        k = 0
+        for position, byte in enumerate(tail):
+            k |= byte << (8 * position)
+        k = (k * 0xCC9E2D51) & _MASK
+        k = ((k << 15) | (k >> 17)) & _MASK
+        h ^= (k * 0x1B873593) & _MASK
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & _MASK
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & _MASK
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+
+def _probability_mode(classifier) -> str:
+    """'softmax' (régression logistique multinomiale) ou 'ovr' (sigmoïdes normalisées)"""
+    name = type(classifier).__name__
+    if name == 'SGDClassifier':
+        if getattr(classifier, 'loss', None) not in ('log_loss', 'log'):
+            raise ScorerExportError(f"SGDClassifier(loss={classifier.loss!r}) sans predict_proba")
+        return 'ovr'
+    if name == 'LogisticRegression':
+        multi_class = getattr(classifier, 'multi_class', 'auto')
+        if multi_class == 'ovr' or (multi_class == 'auto' and classifier.solver == 'liblinear'):
+            return 'ovr'
+        return 'softmax'
+    raise ScorerExportError(f"Classifieur non pris en charge: {name}")
+
+
+def _vectorizer_meta(vectorizer) -> Dict:
+    name = type(vectorizer).__name__
+    if name not in ('TfidfVectorizer', 'CountVectorizer', 'HashingVectorizer'):
+        raise ScorerExportError(f"Vectoriseur non pris en charge: {name}")
+    if vectorizer.analyzer != 'word' or vectorizer.preprocessor or vectorizer.tokenizer or vectorizer.strip_accents:
+        raise ScorerExportError("Seul l'analyseur 'word' par défaut (sans preprocessor/tokenizer/accents) est exporté")
+    stop_words = vectorizer.get_stop_words()
+    meta = {
+        'format': SCORER_FORMAT,
+        'kind': 'hashing' if name == 'HashingVectorizer' else 'vocabulary',
+        'lowercase': bool(vectorizer.lowercase),
+        'token_pattern': vectorizer.token_pattern,
+        'ngram_range': list(vectorizer.ngram_range),
+        'stop_words': sorted(stop_words) if stop_words else [],
+        'binary': bool(vectorizer.binary),
+        'norm': getattr(vectorizer, 'norm', None),
+        'sublinear_tf': bool(getattr(vectorizer, 'sublinear_tf', False)),
+    }
+    if name == 'HashingVectorizer':
+        meta.update(n_features=int(vectorizer.n_features), alternate_sign=bool(vectorizer.alternate_sign))
+    return meta
+
+
+class SparseLinearScorer:
+    """
+    Même interface que le pipeline pour utils.predict_emotions : classes_ et predict_proba
+    """
+
+    def __init__(self, meta: Dict, weights: np.ndarray, intercept: np.ndarray, classes: np.ndarray,
+                 idf: Optional[np.ndarray] = None, terms: Optional[np.ndarray] = None,
+                 rows: Optional[np.ndarray] = None):
+        self.meta = meta
+        # (lignes, classes) : une ligne par terme ou indice haché de poids non nul ;
+        # rows = indice de chaque ligne dans l'espace du vectoriseur (None : toutes)
+        self.weights = weights
+        self.rows = rows
+        self._row_of = {index: row for row, index in enumerate(rows.tolist())} if rows is not None else None
+        self.intercept = intercept
+        self.classes_ = classes
+        self.idf = idf
+        self.terms = terms
+        self._token = re.compile(meta['token_pattern'])
+        self._stop_words = frozenset(meta['stop_words'])
+        self._vocabulary = {term: index for index, term in enumerate(terms.tolist())} if terms is not None else None
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> 'SparseLinearScorer':
+        """Aplatit un Pipeline(vectoriseur, classifieur linéaire) entraîné"""
+        steps = getattr(pipeline, 'steps', None)
+        if not steps or len(steps) != 2:
+            raise ScorerExportError("Pipeline à deux étapes (vectoriseur, classifieur) attendu")
+        vectorizer, classifier = steps[0][1], steps[1][1]
+        meta = _vectorizer_meta(vectorizer)
+        meta['probability'] = _probability_mode(classifier)
+        if classifier.coef_.shape[0] != len(classifier.classes_):
+            raise ScorerExportError("Classifieur binaire non pris en charge (une ligne de poids)")
+
+        weights = np.ascontiguousarray(classifier.coef_.T, dtype=np.float64)
+        # Espace haché (2^18 lignes par défaut) presque vide : lignes nulles retirées,
+        # un terme absent contribuerait 0 au score de toute façon
+        rows = np.flatnonzero(np.any(weights != 0.0, axis=1))
+        if len(rows) == weights.shape[0]:
+            rows = None
+        else:
+            weights = np.ascontiguousarray(weights[rows])
+        intercept = np.asarray(classifier.intercept_, dtype=np.float64)
+        terms = idf = None
+        if meta['kind'] == 'vocabulary':
+            vocabulary = vectorizer.vocabulary_
+            terms = np.empty(len(vocabulary), dtype=object)
+            for term, index in vocabulary.items():
+                terms[index] = term
+            terms = terms.astype(str)
+            if getattr(vectorizer, 'use_idf', False):
+                idf = np.asarray(vectorizer.idf_, dtype=np.float64)
+        return cls(meta, weights, intercept, np.asarray(classifier.classes_), idf=idf, terms=terms, rows=rows)
+
+    def save(self, path) -> None:
+        arrays = {
+            'meta': np.array(json.dumps(self.meta)),
+            'weights': self.weights,
+            'intercept': self.intercept,
+            'classes': self.classes_,
+        }
+        if self.idf is not None:
+            arrays['idf'] = self.idf
+        if self.terms is not None:
+            arrays['terms'] = self.terms
+        if self.rows is not None:
+            arrays['rows'] = self.rows
+        with open(path, 'wb') as handle:
+            np.savez(handle, **arrays)
+
+    @classmethod
+    def load(cls, path) -> 'SparseLinearScorer':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('format') not in READABLE_FORMATS:
+                raise ScorerExportError(f"Format de score inconnu: {meta.get('format')}")
+            return cls(meta, data['weights'], data['intercept'], data['classes'],
+                       idf=data['idf'] if 'idf' in data.files else None,
+                       terms=data['terms'] if 'terms' in data.files else None,
+                       rows=data['rows'] if 'rows' in data.files else None)
+
+    def _tokens(self, text: str) -> List[str]:
+        """Analyseur 'word' de scikit-learn : minuscules, token_pattern, mots vides, n-grammes"""
+        if self.meta['lowercase']:
+            text = text.lower()
+        tokens = self._token.findall(text)
+        if self._stop_words:
+            tokens = [token for token in tokens if token not in self._stop_words]
+        min_n, max_n = self.meta['ngram_range']
+        if max_n == 1:
+            return tokens
+        grams = list(tokens) if min_n == 1 else []
+        count = len(tokens)
+        for n in range(max(min_n, 2), min(max_n + 1, count + 1)):
+            grams.extend(' '.join(tokens[i:i + n]) for i in range(count - n + 1))
+        return grams
+
+    def _features(self, text: str) -> Tuple[List[int], np.ndarray]:
+        """(indices croissants, valeurs) de la ligne creuse du vectoriseur"""
+        counts = defaultdict(float)
+        if self._vocabulary is not None:
+            for token in self._tokens(text):
+                index = self._vocabulary.get(token)
+                if index is not None:
+                    counts[index] += 1.0
+        else:
+            n_features = self.meta['n_features']
+            alternate = self.meta['alternate_sign']
+            for token in self._tokens(text):
+                h = murmurhash3_32(token)
+                index = (2147483647 - (n_features - 1)) % n_features if h == -2147483648 else abs(h) % n_features
+                counts[index] += (1.0 if h >= 0 else -1.0) if alternate else 1.0
+
+        indices = sorted(counts)
+        values = np.array([counts[index] for index in indices], dtype=np.float64)
+        if self.meta['binary']:
+            values.fill(1.0)
+        if self.meta['sublinear_tf']:
+            np.log(values, values)
+            values += 1
+        if self.idf is not None:
+            values *= self.idf[indices]
+        norm = self.meta['norm']
+        if norm == 'l2':
+            total = 0.0
+            for value in values.tolist():
+                total += value * value
+            if total != 0.0:
+                values /= math.sqrt(total)
+        elif norm == 'l1':
+            total = 0.0
+            for value in values.tolist():
+                total += abs(value)
+            if total != 0.0:
+                values /= total
+        return indices, values
+
+    def decision_function(self, texts: List[str]) -> np.ndarray:
+        scores = np.zeros((len(texts), len(self.classes_)), dtype=np.float64)
+        for row, text in enumerate(texts):
+            indices, values = self._features(text)
+            accumulator = scores[row]
+            for index, value in zip(indices, values.tolist()):
+                if self._row_of is None:
+                    accumulator += value * self.weights[index]
+                else:
+                    weight_row = self._row_of.get(index)
+                    if weight_row is not None:
+                        accumulator += value * self.weights[weight_row]
+        scores += self.intercept
+        return scores
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        scores = self.decision_function(texts)
+        if self.meta['probability'] == 'softmax':
+            scores -= np.max(scores, axis=1).reshape((-1, 1))
+            np.exp(scores, scores)
+            scores /= np.sum(scores, axis=1).reshape((-1, 1))
+        else:
+            scores = 1.0 / (1.0 + np.exp(-scores))
+            scores /= scores.sum(axis=1).reshape((scores.shape[0], -1))
+        return scores
+
+    def predict(self, texts: List[str]) -> np.ndarray:
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+
+def export_scorer(pipeline, path, source_version: Optional[str] = None) -> SparseLinearScorer:
+    """Écrit le score creux de pipeline dans path ; source_version lie le fichier au modèle exporté"""
+    scorer = SparseLinearScorer.from_pipeline(pipeline)
+    if source_version:
+        scorer.meta['source_version'] = source_version
+    scorer.save(path)
+    return scorer
+
+
+def load_scorer(path, source_version: Optional[str] = None) -> Optional[SparseLinearScorer]:
+    """
+    Score exporté, ou None : EMOTION_SCORER != 'sparse', fichier absent, illisible ou
+    exporté d'un autre modèle que source_version (on retombe alors sur le pipeline)
+    """
+    if settings.EMOTION_SCORER != 'sparse' or not os.path.isfile(path):
+        return None
+    try:
+        started = time.perf_counter()
+        scorer = SparseLinearScorer.load(path)
+    except Exception as e:
+        logger.error(f"❌ Score d'émotion illisible ({path}): {e}")
+        return None
+    if source_version and scorer.meta.get('source_version') != source_version:
+        logger.warning(f"⚠️ Score d'émotion périmé ({path}) : réexporter avec export_emotion_scorer")
+        return None
+    logger.info(f"✅ Score d'émotion chargé en {(time.perf_counter() - started) * 1000:.1f} ms")
+    return scorer
+
+
+def compare(pipeline, scorer: SparseLinearScorer, texts: List[str]) -> Dict:
+    """Étiquettes et probabilités du score face au pipeline, par le chemin des vues (utils.predict_emotions)"""
+    from .. import utils
+
+    expected = utils.predict_emotions(texts, pipeline)
+    actual = utils.predict_emotions(texts, scorer)
+    cleaned = [utils.clean_text(text) for text in texts]
+    delta = np.abs(pipeline.predict_proba(cleaned) - scorer.predict_proba(cleaned)) if texts else np.zeros(1)
+
+    timings = {}
+    for name, model in (('sklearn', pipeline), ('sparse', scorer)):
+        latencies = []
+        for text in texts[:500]:
+            tick = time.perf_counter()
+            utils.predict_emotions([text], model)
+            latencies.append((time.perf_counter() - tick) * 1000)
+        timings[name] = round(float(np.percentile(latencies, 50)), 3) if latencies else None
+
+    return {
+        'samples': len(texts),
+        'label_mismatches': sum(a[0] != b[0] for a, b in zip(expected, actual)),
+        'max_probability_delta': float(delta.max()),
+        'latency_ms_p50': timings,
+    }
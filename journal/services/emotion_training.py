@@ -0,0 +1,199 @@
+"""
+Entraînement du modèle d'émotion des notes en flux : corpus CSV/JSONL lu ligne à ligne,
+clean_text, HashingVectorizer (sans vocabulaire à garder en mémoire) et
+SGDClassifier.partial_fit par lots. Même corpus et mêmes paramètres => même modèle
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from .. import utils
+from .emotion_scorer import SCORER_FILE, export_scorer
+from .model_bundle import EMOTION_MODEL_FILE, EMOTION_MODEL_NAME, publish_bundle
+
+logger = logging.getLogger(__name__)
+
+LABEL_IDS = {name: label_id for label_id, name in utils.emotion_labels.items()}
+CLASSES = sorted(utils.emotion_labels)
+LATENCY_SAMPLES = 500
+
+DEFAULT_PARAMS = {
+    'n_features': 2 ** 18,
+    'ngram_max': 2,
+    'alpha': 1e-6,
+    'epochs': 3,
+    'batch_size': 5000,
+    'holdout': 0.1,
+    'seed': 42,
+}
+
+
+def _label_id(value) -> Optional[int]:
+    """Étiquette du corpus (nom d'émotion ou identifiant) -> identifiant de utils.emotion_labels"""
+    value = str(value).strip().lower()
+    if value in LABEL_IDS:
+        return LABEL_IDS[value]
+    if value.isdigit() and int(value) in utils.emotion_labels:
+        return int(value)
+    return None
+
+
+def iter_corpus(paths: List[str], text_field: str = 'text', label_field: str = 'label',
+                delimiter: str = ',', stats: Optional[Dict] = None) -> Iterator[Tuple[str, int]]:
+    """
+    (texte nettoyé, étiquette) de chaque ligne des fichiers, sans les charger en entier
+
+    .jsonl : un objet JSON par ligne ; autre extension : CSV avec en-tête (delimiter)
+    """
+    for path in paths:
+        with open(path, encoding='utf-8', newline='') as handle:
+            if path.endswith('.jsonl'):
+                rows = (json.loads(line) for line in handle if line.strip())
+            else:
+                rows = csv.DictReader(handle, delimiter=delimiter)
+            for row in rows:
+                label = _label_id(row.get(label_field, ''))
+                text = utils.clean_text(row.get(text_field) or '')
+                if label is None or not text:
+                    if stats is not None:
+                        stats['skipped'] = stats.get('skipped', 0) + 1
+                    continue
+                yield text, label
+
+
+def is_holdout(text: str, holdout: float) -> bool:
+    """Répartition stable (CRC32 du texte) : indépendante de l'ordre, doublons du même côté"""
+    return zlib.crc32(text.encode('utf-8')) % 10000 < holdout * 10000
+
+
+def _batches(rows: Iterator[Tuple[str, int]], size: int) -> Iterator[Tuple[List[str], List[int]]]:
+    texts, labels = [], []
+    for text, label in rows:
+        texts.append(text)
+        labels.append(label)
+        if len(texts) >= size:
+            yield texts, labels
+            texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+
+def build_pipeline(params: Dict):
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline([
+        ('hashing', HashingVectorizer(n_features=params['n_features'], ngram_range=(1, params['ngram_max']),
+                                      alternate_sign=False, norm='l2')),
+        ('clf', SGDClassifier(loss='log_loss', alpha=params['alpha'], random_state=params['seed'])),
+    ])
+
+
+def corpus_fingerprint(paths: List[str], params: Dict) -> str:
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode())
+    for path in paths:
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def train(paths: List[str], params: Optional[Dict] = None, progress=None, **corpus_options) -> Tuple[object, Dict]:
+    """
+    Entraîne en params['epochs'] passes sur le corpus, puis évalue sur la part réservée
+
+    Returns:
+        (pipeline, métriques : échantillons, exactitude, F1 macro, latence par note)
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    pipeline = build_pipeline(params)
+    vectorizer, classifier = pipeline.named_steps['hashing'], pipeline.named_steps['clf']
+    stats = {}
+    trained = 0
+    started = time.perf_counter()
+
+    for epoch in range(params['epochs']):
+        stats.clear()
+        trained = 0
+        rows = ((text, label) for text, label in iter_corpus(paths, stats=stats, **corpus_options)
+                if not is_holdout(text, params['holdout']))
+        for texts, labels in _batches(rows, params['batch_size']):
+            classifier.partial_fit(vectorizer.transform(texts), labels, classes=CLASSES)
+            trained += len(texts)
+        if progress:
+            progress(epoch + 1, trained)
+    if not trained:
+        raise ValueError("Aucun exemple d'entraînement exploitable dans le corpus")
+    training_seconds = time.perf_counter() - started
+
+    # Évaluation en flux sur la part réservée
+    confusion = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+    latency_texts = []
+    rows = ((text, label) for text, label in iter_corpus(paths, **corpus_options)
+            if is_holdout(text, params['holdout']))
+    for texts, labels in _batches(rows, params['batch_size']):
+        predicted = classifier.predict(vectorizer.transform(texts))
+        np.add.at(confusion, (np.searchsorted(CLASSES, labels), np.searchsorted(CLASSES, predicted)), 1)
+        latency_texts.extend(texts[:LATENCY_SAMPLES - len(latency_texts)])
+
+    evaluated = int(confusion.sum())
+    true_positive = np.diag(confusion)
+    precision = true_positive / np.maximum(confusion.sum(axis=0), 1)
+    recall = true_positive / np.maximum(confusion.sum(axis=1), 1)
+    f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-12)
+
+    # Latence d'une note seule, par le même chemin que les vues (utils.predict_emotions)
+    latencies = []
+    for text in latency_texts:
+        tick = time.perf_counter()
+        utils.predict_emotions([text], pipeline)
+        latencies.append((time.perf_counter() - tick) * 1000)
+
+    metrics = {
+        'trained_samples': trained,
+        'evaluated_samples': evaluated,
+        'skipped_rows': stats.get('skipped', 0),
+        'accuracy': round(float(true_positive.sum() / evaluated), 4) if evaluated else None,
+        'macro_f1': round(float(f1.mean()), 4) if evaluated else None,
+        'training_seconds': round(training_seconds, 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+    }
+    return pipeline, metrics
+
+
+def publish(pipeline, metrics: Dict, paths: List[str], params: Optional[Dict] = None,
+            version: Optional[str] = None, root=None, activate: bool = True) -> Dict:
+    """Écrit le bundle versionné (modèle, score creux exporté, manifeste : corpus, paramètres, métriques)"""
+    import sklearn
+    from datetime import datetime, timezone
+
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    fingerprint = corpus_fingerprint(paths, params)
+    if not version:
+        version = f"{datetime.now(timezone.utc):%Y%m%d}-{fingerprint[:12]}"
+
+    def write(staging):
+        joblib.dump(pipeline, staging / EMOTION_MODEL_FILE)
+        export_scorer(pipeline, staging / SCORER_FILE)
+        return {
+            'training': {
+                'corpus': [os.path.basename(path) for path in paths],
+                'fingerprint': fingerprint,
+                'params': params,
+                'labels': utils.emotion_labels,
+                'sklearn_version': sklearn.__version__,
+            },
+            'metrics': metrics,
+        }
+
+    return publish_bundle(EMOTION_MODEL_NAME, write, version=version, root=root, activate=activate)
@@ -0,0 +1,73 @@
+"""
+Extraction des métadonnées EXIF utiles à l'ingestion : date de prise de vue et GPS
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional
+
+from django.utils import timezone
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+
+
+def _parse_datetime(value: str, offset: Optional[str]) -> Optional[datetime]:
+    try:
+        taken = datetime.strptime(value.strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except (ValueError, AttributeError):
+        return None
+    if offset:
+        try:
+            sign = -1 if offset.startswith('-') else 1
+            hours, minutes = offset.strip('+-\x00 ').split(':')
+            tz = dt_timezone(sign * timedelta(hours=int(hours), minutes=int(minutes)))
+            return taken.replace(tzinfo=tz)
+        except ValueError:
+            pass
+    return timezone.make_aware(taken) if timezone.is_naive(taken) else taken
+
+
+def _to_degrees(value, ref) -> Optional[float]:
+    try:
+        degrees, minutes, seconds = (float(v) for v in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    result = degrees + minutes / 60.0 + seconds / 3600.0
+    return -result if ref in ('S', 'W') else result
+
+
+def extract_exif(image: Image.Image) -> Dict:
+    """
+    Retourne {'taken_at', 'latitude', 'longitude'} (None si absent)
+
+    Args:
+        image: Image PIL déjà ouverte
+    """
+    result = {'taken_at': None, 'latitude': None, 'longitude': None}
+    try:
+        exif = image.getexif()
+    except Exception as e:
+        logger.warning(f"⚠️ EXIF illisible: {e}")
+        return result
+    if not exif:
+        return result
+
+    exif_ifd = exif.get_ifd(EXIF_IFD)
+    raw_date = exif_ifd.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+    if raw_date:
+        result['taken_at'] = _parse_datetime(raw_date, exif_ifd.get(TAG_OFFSET_TIME_ORIGINAL))
+
+    gps = exif.get_ifd(GPS_IFD)
+    if gps:
+        latitude = _to_degrees(gps.get(2), gps.get(1))
+        longitude = _to_degrees(gps.get(4), gps.get(3))
+        if latitude is not None and longitude is not None and -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            result['latitude'] = round(latitude, 6)
+            result['longitude'] = round(longitude, 6)
+    return result
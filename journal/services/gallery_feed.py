@@ -0,0 +1,155 @@
+"""
+Pagination par curseur (keyset) de la galerie et sérialisation compacte des pages
+Le curseur porte la dernière clé de tri vue ((uploaded_at, id) par défaut) :
+la page N coûte une requête bornée comme la page 1, sans COUNT ni OFFSET
+"""
+import base64
+import binascii
+import json
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from ..models import Media, MediaAnalysis, MediaTag
+
+PAGE_SIZE = 12
+MAX_PAGE_SIZE = 60
+DEFAULT_SORT = '-uploaded_at'
+KEYSET_FIELDS = ('uploaded_at', 'file_size', 'title')
+RANKED = 'rank'  # Ordre imposé par une liste d'ids (pertinence, couleur)
+
+
+class CursorError(ValueError):
+    """Curseur illisible ou obtenu avec un autre tri"""
+
+
+def encode_cursor(payload: Dict) -> str:
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise CursorError('Curseur invalide')
+    if not isinstance(payload, dict) or 's' not in payload:
+        raise CursorError('Curseur invalide')
+    return payload
+
+
+def _after(field: str, descending: bool, value, last_id: int) -> Q:
+    """
+    Lignes strictement après (value, last_id) dans l'ordre (field, id)
+
+    NULL est la plus petite valeur (ordre de MongoDB et SQLite) : en tête en
+    tri croissant, en fin en tri décroissant
+    """
+    if value is None:
+        if descending:
+            return Q(**{f'{field}__isnull': True, 'id__lt': last_id})
+        return Q(**{f'{field}__isnull': True, 'id__gt': last_id}) | Q(**{f'{field}__isnull': False})
+    if descending:
+        return (Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id})
+                | Q(**{f'{field}__isnull': True}))
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': last_id})
+
+
+def keyset_page(queryset: QuerySet, sort_by: str, cursor: Optional[Dict],
+                limit: int) -> Tuple[List[Media], Optional[str]]:
+    """Une page triée par (sort_by, id) ; limit + 1 lignes lues pour savoir s'il en reste"""
+    field = sort_by.lstrip('-')
+    if field not in KEYSET_FIELDS:
+        sort_by, field = DEFAULT_SORT, DEFAULT_SORT.lstrip('-')
+    descending = sort_by.startswith('-')
+    queryset = queryset.order_by(sort_by, '-id' if descending else 'id')
+
+    if cursor is not None:
+        if cursor['s'] != sort_by or 'id' not in cursor:
+            raise CursorError('Curseur obtenu avec un autre tri')
+        value = cursor.get('v')
+        if field == 'uploaded_at' and value is not None:
+            value = parse_datetime(value)
+            if value is None:
+                raise CursorError('Curseur invalide')
+        queryset = queryset.filter(_after(field, descending, value, cursor['id']))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    value = getattr(last, field)
+    return rows[:limit], encode_cursor({
+        's': sort_by,
+        'v': value.isoformat() if field == 'uploaded_at' else value,
+        'id': last.id,
+    })
+
+
+def ranked_page(queryset: QuerySet, ranked_ids: List[int], cursor: Optional[Dict],
+                limit: int) -> Tuple[List[Media], Optional[str]]:
+    """Une page d'une liste d'ids classée, restreinte aux médias du queryset (filtres)"""
+    if cursor is not None and cursor['s'] != RANKED:
+        raise CursorError('Curseur obtenu avec un autre tri')
+    position = int(cursor.get('p', 0)) if cursor else 0
+    items = []
+    while position < len(ranked_ids):
+        chunk = ranked_ids[position:position + max(limit * 2, 50)]
+        found = {media.id: media for media in queryset.filter(id__in=chunk)}
+        for offset, media_id in enumerate(chunk):
+            media = found.get(media_id)
+            if media is None:
+                continue
+            if len(items) == limit:
+                return items, encode_cursor({'s': RANKED, 'p': position + offset})
+            items.append(media)
+        position += len(chunk)
+    return items, None
+
+
+def feed_page(queryset: QuerySet, sort_by: str, ranked_ids: Optional[List[int]] = None,
+              cursor: Optional[str] = None, limit: int = PAGE_SIZE) -> Tuple[List[Media], Optional[str]]:
+    """Page suivante de la galerie ; ranked_ids impose l'ordre (recherche, couleur)"""
+    payload = decode_cursor(cursor) if cursor else None
+    if ranked_ids is not None:
+        return ranked_page(queryset, ranked_ids, payload, limit)
+    return keyset_page(queryset, sort_by, payload, limit)
+
+
+def serialize_page(media_list: List[Media]) -> List[Dict]:
+    """Éléments JSON d'une page : tags et résumé d'analyse en une requête chacun"""
+    media_ids = [media.id for media in media_list]
+    tags: Dict[int, List[str]] = {}
+    for media_id, name in MediaTag.objects.filter(media_id__in=media_ids).values_list('media_id', 'name'):
+        tags.setdefault(media_id, []).append(name)
+
+    analyses: Dict[int, Dict] = {}
+    for media_id, ai_title, mood, objects in MediaAnalysis.objects.filter(media_id__in=media_ids).values_list(
+        'media_id', 'ai_title', 'mood', 'detected_objects'
+    ):
+        analyses[media_id] = {
+            'title': ai_title or '',
+            'mood': mood or '',
+            'objects': objects[:3] if isinstance(objects, list) else [],
+        }
+
+    items = []
+    for media in media_list:
+        file_url = media.file.url if media.file else None
+        items.append({
+            'id': media.id,
+            'title': media.title or '',
+            'media_type': media.media_type,
+            'url': file_url,
+            'thumbnail': media.thumbnail.url if media.thumbnail else (file_url if media.media_type == 'image' else None),
+            'detail_url': reverse('media_detail', args=[media.id]),
+            'uploaded_at': media.uploaded_at.isoformat() if media.uploaded_at else None,
+            'is_favorite': media.is_favorite,
+            'is_analyzed': media.is_analyzed,
+            'tags': tags.get(media.id, []),
+            'analysis': analyses.get(media.id),
+        })
+    return items
@@ -0,0 +1,219 @@
+"""
+Optimisation des images à l'upload (activée par MEDIA_OPTIMIZE_UPLOADS)
+Réduction au côté max (seul cas de réencodage avec perte), sinon optimisation sans perte
+(JPEG : retrait des segments de métadonnées ; PNG : recompression) ; l'EXIF utile est extrait
+avant par exif_service et l'original part dans le stockage froid
+"""
+import io
+import logging
+import struct
+import zlib
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+TAG_ORIENTATION = 0x0112
+# MPO : JPEG de smartphone avec images secondaires (aperçus), réécrit en JPEG simple
+OPTIMIZABLE_FORMATS = {'JPEG': 'JPEG', 'MPO': 'JPEG', 'PNG': 'PNG'}
+OPTIMIZABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Segments JPEG conservés par strip_jpeg_metadata : APP0 (JFIF), APP14 (Adobe, transformée
+# de couleurs) et tout ce qui n'est pas APPn/COM ; APP2 seulement pour le profil ICC
+JPEG_APP0, JPEG_APP2, JPEG_APP14, JPEG_COM = 0xE0, 0xE2, 0xEE, 0xFE
+JPEG_SOS, JPEG_EOI = 0xDA, 0xD9
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'eXIf', b'tIME'}
+
+
+def _orientation_exif(orientation: int) -> Optional[bytes]:
+    """Bloc EXIF ne contenant que l'orientation ('Exif\\0\\0' + TIFF), None si normale"""
+    if orientation == 1:
+        return None
+    exif = Image.Exif()
+    exif[TAG_ORIENTATION] = orientation
+    return exif.tobytes()
+
+
+def strip_jpeg_metadata(data: bytes, orientation: int = 1) -> bytes:
+    """
+    Retire EXIF, XMP, IPTC, commentaires et images secondaires (MPO) d'un JPEG sans
+    toucher aux données compressées ; le profil ICC et l'orientation sont conservés
+    """
+    out = [data[:2]]
+    exif = _orientation_exif(orientation)
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            raise ValueError("Segment JPEG invalide")
+        marker = data[position + 1]
+        if marker == 0xFF:  # Octets de remplissage
+            position += 1
+            continue
+        length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        end = position + 2 + length
+        segment = data[position:end]
+        if marker == JPEG_SOS:
+            # Données compressées jusqu'au prochain marqueur (hors FF00 et RSTn)
+            scan = end
+            while True:
+                scan = data.find(b'\xff', scan)
+                if scan < 0 or scan + 1 >= len(data):
+                    raise ValueError("JPEG tronqué")
+                following = data[scan + 1]
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    scan += 2
+                    continue
+                break
+            out.append(data[position:scan])
+            if following == JPEG_EOI:
+                out.append(data[scan:scan + 2])  # Fin de l'image principale : le reste est ignoré
+                return b''.join(out)
+            position = scan
+            continue
+        keep = (not (0xE0 <= marker <= 0xEF or marker == JPEG_COM)
+                or marker in (JPEG_APP0, JPEG_APP14)
+                or (marker == JPEG_APP2 and segment[4:16] == b'ICC_PROFILE\x00'))
+        if keep:
+            out.append(segment)
+        if exif is not None and (marker != JPEG_APP0 or not keep):
+            # Orientation juste après SOI/JFIF
+            out.insert(len(out) - (1 if keep else 0), b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif)
+            exif = None
+        position = end
+    raise ValueError("JPEG sans image")
+
+
+def strip_png_metadata(data: bytes, orientation: int = 1) -> bytes:
+    """Retire les blocs texte, EXIF et date d'un PNG sans le réencoder (orientation conservée)"""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Signature PNG invalide")
+    out = [PNG_SIGNATURE]
+    exif = _orientation_exif(orientation)
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        end = position + 12 + length
+        if chunk_type == b'IDAT' and exif is not None:
+            tiff = exif[6:]  # eXIf : TIFF sans l'en-tête 'Exif\0\0'
+            out.append(struct.pack('>I4s', len(tiff), b'eXIf') + tiff
+                       + struct.pack('>I', zlib.crc32(b'eXIf' + tiff)))
+            exif = None
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            out.append(data[position:end])
+        position = end
+        if chunk_type == b'IEND':
+            return b''.join(out)
+    raise ValueError("PNG tronqué")
+
+
+class ImageOptimizer:
+
+    def optimize(self, source, max_dimension: Optional[int] = None) -> Optional[Dict]:
+        """
+        Version optimisée d'une image, sans rien écrire
+
+        Seule la réduction réencode avec perte. Sans réduction, un JPEG garde ses données
+        compressées telles quelles (segments de métadonnées retirés) et un PNG est recompressé
+        sans perte, ou gardé sans ses métadonnées si c'est plus petit. Dans tous les cas seuls
+        l'orientation EXIF et le profil ICC restent.
+
+        Args:
+            source: fichier ouvert en binaire (UploadedFile, FieldFile, open(...))
+            max_dimension: côté max (défaut: MEDIA_MAX_DIMENSION)
+
+        Returns:
+            {'content', 'format', 'width', 'height', 'resized', 'reencoded', 'original_size',
+            'optimized_size'} ou None (format non concerné, image illisible, aucune métadonnée
+            à retirer ni gain)
+        """
+        max_dimension = max_dimension or settings.MEDIA_MAX_DIMENSION
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        try:
+            image = Image.open(io.BytesIO(data))
+            image_format = OPTIMIZABLE_FORMATS.get(image.format)
+            if image_format is None or (image_format == 'PNG' and getattr(image, 'is_animated', False)):
+                return None
+
+            # Rien n'est repris implicitement de image.info (Pillow recopie commentaire, XMP, EXIF)
+            options = {'optimize': True, 'exif': b'', 'comment': b'', 'xmp': b''}
+            if image.info.get('icc_profile'):
+                options['icc_profile'] = image.info['icc_profile']
+            resized = max(image.size) > max_dimension
+
+            if resized:
+                # Orientation appliquée aux pixels : l'EXIF peut disparaître entièrement
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+                if image_format == 'JPEG':
+                    options.update(quality=settings.MEDIA_RESIZE_QUALITY, progressive=True)
+                output = io.BytesIO()
+                image.save(output, image_format, **options)
+                content, reencoded = output.getvalue(), True
+            elif image_format == 'JPEG':
+                # Sans perte : données compressées recopiées, seules les métadonnées partent
+                content, reencoded = strip_jpeg_metadata(data, image.getexif().get(TAG_ORIENTATION, 1)), False
+            else:
+                orientation = image.getexif().get(TAG_ORIENTATION, 1)
+                exif = _orientation_exif(orientation)
+                if exif is not None:
+                    options['exif'] = exif
+                # Recompression PNG sans perte ; sans gain, l'original sans ses métadonnées
+                output = io.BytesIO()
+                image.save(output, image_format, **options)
+                content, reencoded = output.getvalue(), True
+                stripped = strip_png_metadata(data, orientation)
+                if len(stripped) <= len(content):
+                    content, reencoded = stripped, False
+        except (UnidentifiedImageError, OSError, ValueError, struct.error) as e:
+            logger.warning(f"⚠️ Optimisation impossible: {e}")
+            return None
+
+        if content == data:
+            return None
+        return {
+            'content': content,
+            'format': image_format,
+            'width': image.width,
+            'height': image.height,
+            'resized': resized,
+            'reencoded': reencoded,
+            'original_size': len(data),
+            'optimized_size': len(content),
+        }
+
+    def apply(self, media, uploaded) -> bool:
+        """
+        Remplace le fichier d'un média (avant save) par sa version optimisée
+
+        Returns:
+            True si le fichier a été remplacé
+        """
+        media.original_file = None
+        media.bytes_saved = 0
+        if not settings.MEDIA_OPTIMIZE_UPLOADS or not uploaded.name.lower().endswith(OPTIMIZABLE_EXTENSIONS):
+            return False
+        result = self.optimize(uploaded)
+        if result is None:
+            return False
+
+        if settings.MEDIA_COLD_ROOT:
+            uploaded.seek(0)
+            media.original_file = uploaded
+        media.file = ContentFile(result['content'], name=uploaded.name)
+        media.width, media.height = result['width'], result['height']
+        media.bytes_saved = result['original_size'] - result['optimized_size']
+        logger.info(
+            f"🗜️ {uploaded.name}: {result['original_size']} → {result['optimized_size']} octets"
+            f"{' (réduite)' if result['resized'] else ''}{'' if result['reencoded'] else ' (métadonnées retirées)'}"
+        )
+        return True
+
+
+# Instance globale du service
+image_optimizer = ImageOptimizer()
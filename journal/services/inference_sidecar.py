@@ -0,0 +1,329 @@
+"""
+Sidecar d'inférence : un seul processus charge CLIP, les workers web l'interrogent
+via un socket Unix local avec un protocole binaire compact
+
+Trame : en-tête '!4sBI' (magic, opcode/statut, longueur) suivi du payload.
+Requête SCORE : '!H' nb de groupes, puis pour chaque groupe '!H' nb de prompts
+et chaque prompt '!H' + UTF-8 ; le reste du payload = octets de l'image (JPEG).
+Réponse SCORE : '!H' nb de groupes, puis pour chaque groupe '!H' n + n float32.
+Réponse EMBED : '!H' dimension + float32.
+Réponse PING : JSON UTF-8 décrivant le modèle chargé (vide pour un ancien sidecar).
+"""
+
+import io
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MJIS'
+HEADER = struct.Struct('!4sBI')
+
+OP_PING = 0
+OP_EMBED = 1
+OP_SCORE = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Images envoyées réduites : CLIP redimensionne de toute façon en 224px
+WIRE_IMAGE_SIZE = 448
+WIRE_JPEG_QUALITY = 90
+
+
+class SidecarError(Exception):
+    """Erreur renvoyée par le sidecar ou problème de transport"""
+
+
+# ---------------------------------------------------------------------------
+# Protocole
+# ---------------------------------------------------------------------------
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise SidecarError("Connexion fermée par le pair")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_frame(sock: socket.socket, code: int, payload: bytes = b'') -> None:
+    sock.sendall(HEADER.pack(MAGIC, code, len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[int, bytes]:
+    magic, code, length = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC:
+        raise SidecarError("Trame invalide")
+    return code, _recv_exact(sock, length) if length else b''
+
+
+def encode_image(image: Image.Image) -> bytes:
+    small = image.convert('RGB')
+    small.thumbnail((WIRE_IMAGE_SIZE, WIRE_IMAGE_SIZE))
+    buffer = io.BytesIO()
+    small.save(buffer, format='JPEG', quality=WIRE_JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def encode_score_request(image_bytes: bytes, groups: Sequence[Sequence[str]]) -> bytes:
+    parts = [struct.pack('!H', len(groups))]
+    for prompts in groups:
+        parts.append(struct.pack('!H', len(prompts)))
+        for prompt in prompts:
+            data = prompt.encode('utf-8')
+            parts.append(struct.pack('!H', len(data)) + data)
+    parts.append(image_bytes)
+    return b''.join(parts)
+
+
+def decode_score_request(payload: bytes) -> Tuple[bytes, List[List[str]]]:
+    offset = 0
+    (n_groups,) = struct.unpack_from('!H', payload, offset)
+    offset += 2
+    groups = []
+    for _ in range(n_groups):
+        (n_prompts,) = struct.unpack_from('!H', payload, offset)
+        offset += 2
+        prompts = []
+        for _ in range(n_prompts):
+            (size,) = struct.unpack_from('!H', payload, offset)
+            offset += 2
+            prompts.append(payload[offset:offset + size].decode('utf-8'))
+            offset += size
+        groups.append(prompts)
+    return payload[offset:], groups
+
+
+def encode_vector(values) -> bytes:
+    values = np.asarray(values, dtype='>f4')
+    return struct.pack('!H', values.size) + values.tobytes()
+
+
+def decode_vector(payload: bytes, offset: int = 0) -> Tuple[np.ndarray, int]:
+    (size,) = struct.unpack_from('!H', payload, offset)
+    offset += 2
+    values = np.frombuffer(payload, dtype='>f4', count=size, offset=offset).astype(np.float32)
+    return values, offset + 4 * size
+
+
+def encode_score_response(probs: Sequence[Sequence[float]]) -> bytes:
+    return struct.pack('!H', len(probs)) + b''.join(encode_vector(p) for p in probs)
+
+
+def decode_score_response(payload: bytes) -> List[List[float]]:
+    (n_groups,) = struct.unpack_from('!H', payload, 0)
+    offset = 2
+    probs = []
+    for _ in range(n_groups):
+        values, offset = decode_vector(payload, offset)
+        probs.append(values.tolist())
+    return probs
+
+
+# ---------------------------------------------------------------------------
+# Serveur
+# ---------------------------------------------------------------------------
+
+class _PendingRequest:
+    """Requête en attente dans le lot du batcher"""
+
+    def __init__(self, image_bytes: bytes, groups: Optional[List[List[str]]]):
+        self.image_bytes = image_bytes
+        self.groups = groups
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceBatcher:
+    """Regroupe les requêtes des différents workers et encode les images par lots"""
+
+    def __init__(self, engine, max_batch: int = 16, window_ms: float = 10.0):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image_bytes: bytes, groups: Optional[List[List[str]]] = None, timeout: float = 30.0):
+        request = _PendingRequest(image_bytes, groups)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise SidecarError("Délai d'inférence dépassé")
+        if request.error:
+            raise SidecarError(request.error)
+        return request.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: List[_PendingRequest]):
+        images, valid = [], []
+        for request in batch:
+            try:
+                images.append(Image.open(io.BytesIO(request.image_bytes)).convert('RGB'))
+                valid.append(request)
+            except Exception as e:
+                request.error = f"Image illisible: {e}"
+                request.done.set()
+        if not valid:
+            return
+        try:
+            embeddings = self.engine.image_features(images)
+            for request, embedding in zip(valid, embeddings):
+                if request.groups is None:
+                    request.result = embedding
+                else:
+                    request.result = self.engine.group_probs(embedding, request.groups)
+        except Exception as e:
+            logger.exception("❌ Erreur d'inférence sur un lot de %d images", len(valid))
+            for request in valid:
+                request.error = str(e)
+        finally:
+            for request in valid:
+                request.done.set()
+
+
+class _SidecarHandler(socketserver.BaseRequestHandler):
+    """Une connexion = une suite de trames requête/réponse"""
+
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                code, payload = recv_frame(self.request)
+            except (SidecarError, ConnectionError, struct.error):
+                return
+            try:
+                if code == OP_PING:
+                    send_frame(self.request, STATUS_OK, json.dumps(batcher.engine.describe()).encode('utf-8'))
+                elif code == OP_EMBED:
+                    embedding = batcher.submit(payload)
+                    send_frame(self.request, STATUS_OK, encode_vector(embedding))
+                elif code == OP_SCORE:
+                    image_bytes, groups = decode_score_request(payload)
+                    probs = batcher.submit(image_bytes, groups)
+                    send_frame(self.request, STATUS_OK, encode_score_response(probs))
+                else:
+                    send_frame(self.request, STATUS_ERROR, f"Opcode inconnu: {code}".encode('utf-8'))
+            except Exception as e:
+                try:
+                    send_frame(self.request, STATUS_ERROR, str(e).encode('utf-8'))
+                except OSError:
+                    return  # Client parti (broken pipe) : rien à répondre
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, batcher: InferenceBatcher):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.batcher = batcher
+        super().__init__(socket_path, _SidecarHandler)
+        os.chmod(socket_path, 0o660)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class InferenceClient:
+    """Client léger utilisé par les workers web ; renvoie None si le sidecar est absent"""
+
+    def __init__(self, socket_path: str, timeout: float = 30.0, retry_after: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._local = threading.local()
+        # Dernière réponse de describe() ; oubliée à chaque échec (le sidecar peut revenir avec un autre modèle)
+        self.model_info: Optional[Dict] = None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+            self._local.sock = None
+
+    def _call(self, code: int, payload: bytes = b'') -> Optional[bytes]:
+        if self.is_down():
+            return None
+        try:
+            sock = self._connection()
+            send_frame(sock, code, payload)
+            status, response = recv_frame(sock)
+        except (OSError, SidecarError) as e:
+            self._close()
+            self._down_until = time.monotonic() + self.retry_after
+            self.model_info = None
+            logger.warning(f"⚠️ Sidecar d'inférence indisponible ({e}), nouvel essai dans {self.retry_after:.0f} s")
+            return None
+        if status != STATUS_OK:
+            raise SidecarError(response.decode('utf-8', errors='replace'))
+        return response
+
+    def is_available(self) -> bool:
+        return self._call(OP_PING) is not None
+
+    def describe(self) -> Optional[Dict]:
+        """
+        Modèle chargé par le sidecar ({} s'il ne le communique pas), None s'il est injoignable ;
+        mémorisé dans model_info
+        """
+        response = self._call(OP_PING)
+        if response is None:
+            return None
+        self.model_info = json.loads(response.decode('utf-8')) if response else {}
+        return self.model_info
+
+    def is_down(self) -> bool:
+        """Dernier appel en échec il y a moins de retry_after secondes (sans aller-retour réseau)"""
+        return time.monotonic() < self._down_until
+
+    def embed(self, image: Image.Image) -> Optional[np.ndarray]:
+        response = self._call(OP_EMBED, encode_image(image))
+        return None if response is None else decode_vector(response)[0]
+
+    def score(self, image: Image.Image, groups: Sequence[Sequence[str]]) -> Optional[List[List[float]]]:
+        response = self._call(OP_SCORE, encode_score_request(encode_image(image), groups))
+        return None if response is None else decode_score_response(response)
@@ -0,0 +1,267 @@
+"""
+Index inversé des étiquettes d'analyse (objets, lieux, émotions, classes de couleurs)
+Chaque règle d'album devient quelques unions/intersections d'ensembles d'ids
+"""
+import logging
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from ..models import Media, MediaAnalysis
+from .color_index import COLOR_CLASS_ALIASES, dominant_color_classes
+
+logger = logging.getLogger(__name__)
+
+LABEL_FIELDS = ('objects', 'locations', 'emotions', 'colors')
+
+# Clé de règle -> champ de l'index
+RULE_FIELDS = {
+    'objects': 'objects',
+    'locations': 'locations',
+    'emotions': 'emotions',
+    'color_keywords': 'colors',
+}
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_label(text) -> str:
+    """Minuscules, sans accents, ponctuation remplacée par des espaces"""
+    folded = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return _NON_WORD.sub(' ', folded.lower()).strip()
+
+
+def label_tokens(text) -> Set[str]:
+    return {token for token in normalize_label(text).split() if len(token) > 1}
+
+
+def labels_from_analysis(detected_objects, detected_locations, detected_emotions,
+                         color_palette, dominant_colors) -> Dict[str, Set[str]]:
+    """Jetons indexés d'une analyse, par champ"""
+    labels = {field: set() for field in LABEL_FIELDS}
+    for field, values in (('objects', detected_objects),
+                          ('locations', detected_locations),
+                          ('emotions', detected_emotions)):
+        if isinstance(values, list):
+            for value in values:
+                labels[field] |= label_tokens(value)
+    labels['colors'] = set(dominant_color_classes(color_palette, dominant_colors))
+    return labels
+
+
+class UserLabelIndex:
+    """
+    Listes de postings jeton -> ids des médias analysés d'un utilisateur.
+    Les threads d'analyse le modifient pendant que les requêtes l'évaluent : lectures et
+    écritures se font sous self.lock
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings: Dict[str, Dict[str, Set[int]]] = {field: {} for field in LABEL_FIELDS}
+        self.labels: Dict[int, Dict[str, Set[str]]] = {}
+        self.favorites: Set[int] = set()
+        self.uploaded_at: Dict[int, datetime] = {}
+        self.taken_at: Dict[int, datetime] = {}  # Prise de vue EXIF, sinon upload
+
+    @classmethod
+    def build(cls, user: User) -> 'UserLabelIndex':
+        index = cls()
+        # Djongo : filtres booléens appliqués en Python
+        media_rows = Media.objects.filter(user=user, media_type='image').values_list(
+            'id', 'is_analyzed', 'is_favorite', 'uploaded_at', 'taken_at'
+        )
+        analyzed = {}
+        for media_id, is_analyzed, is_favorite, uploaded_at, taken_at in media_rows:
+            if is_analyzed:
+                analyzed[media_id] = (bool(is_favorite), uploaded_at, taken_at)
+
+        rows = MediaAnalysis.objects.filter(media__user=user).values_list(
+            'media_id', 'detected_objects', 'detected_locations', 'detected_emotions',
+            'color_palette', 'dominant_colors'
+        )
+        for media_id, *fields in rows:
+            if media_id not in analyzed:
+                continue
+            is_favorite, uploaded_at, taken_at = analyzed[media_id]
+            # Analyses en double (données Djongo) : union des étiquettes
+            labels = labels_from_analysis(*fields)
+            for field, tokens in index.labels.get(media_id, {}).items():
+                labels[field] |= tokens
+            index.put(media_id, labels, is_favorite, uploaded_at, taken_at)
+        return index
+
+    def put(self, media_id: int, labels: Dict[str, Set[str]], is_favorite: bool, uploaded_at: datetime,
+            taken_at: Optional[datetime] = None) -> None:
+        with self.lock:
+            self.remove(media_id)
+            self.labels[media_id] = labels
+            for field, tokens in labels.items():
+                postings = self.postings[field]
+                for token in tokens:
+                    postings.setdefault(token, set()).add(media_id)
+            if is_favorite:
+                self.favorites.add(media_id)
+            self.uploaded_at[media_id] = uploaded_at
+            self.taken_at[media_id] = taken_at or uploaded_at
+
+    def remove(self, media_id: int) -> None:
+        with self.lock:
+            labels = self.labels.pop(media_id, None)
+            if labels is None:
+                return
+            for field, tokens in labels.items():
+                postings = self.postings[field]
+                for token in tokens:
+                    ids = postings.get(token)
+                    if ids is not None:
+                        ids.discard(media_id)
+                        if not ids:
+                            del postings[token]
+            self.favorites.discard(media_id)
+            self.uploaded_at.pop(media_id, None)
+            self.taken_at.pop(media_id, None)
+
+    def _term_ids(self, field: str, term: str) -> Set[int]:
+        """Médias portant tous les mots du terme (ex: 'Tour Eiffel')"""
+        if field == 'colors':
+            name = COLOR_CLASS_ALIASES.get(normalize_label(term))
+            return self.postings['colors'].get(name, set()) if name else set()
+        tokens = label_tokens(term)
+        if not tokens:
+            return set()
+        postings = self.postings[field]
+        sets = sorted((postings.get(token, set()) for token in tokens), key=len)
+        return set.intersection(*sets) if sets[0] else set()
+
+    def match(self, config: Dict, now: Optional[datetime] = None) -> Set[int]:
+        """Ids satisfaisant une règle : OU à l'intérieur d'un critère, ET entre critères"""
+        with self.lock:
+            result = set(self.labels)
+            if 'days_ago' in config:
+                limit = (now or timezone.now()) - timedelta(days=config['days_ago'])
+                result = {mid for mid in result if self.uploaded_at[mid] >= limit}
+            if config.get('is_favorite'):
+                result &= self.favorites
+            for rule_key, field in RULE_FIELDS.items():
+                if rule_key not in config or not result:
+                    continue
+                matched = set()
+                for term in config[rule_key]:
+                    matched |= self._term_ids(field, term)
+                result &= matched
+            return result
+
+    def matches_media(self, media_id: int, config: Dict, now: Optional[datetime] = None) -> bool:
+        """Même sémantique que match(), pour un seul média (sans parcourir les postings)"""
+        with self.lock:
+            labels = self.labels.get(media_id)
+            if labels is None:
+                return False
+            if 'days_ago' in config:
+                limit = (now or timezone.now()) - timedelta(days=config['days_ago'])
+                if self.uploaded_at[media_id] < limit:
+                    return False
+            if config.get('is_favorite') and media_id not in self.favorites:
+                return False
+            for rule_key, field in RULE_FIELDS.items():
+                if rule_key not in config:
+                    continue
+                if field == 'colors':
+                    names = {COLOR_CLASS_ALIASES.get(normalize_label(term)) for term in config[rule_key]}
+                    if not names & labels['colors']:
+                        return False
+                elif not any(tokens and tokens <= labels[field]
+                             for tokens in (label_tokens(term) for term in config[rule_key])):
+                    return False
+            return True
+
+    def evaluate(self, rules: Dict[str, Dict], now: Optional[datetime] = None) -> Dict[str, List[int]]:
+        """Toutes les règles en un passage ; ids triés du plus récent au plus ancien"""
+        now = now or timezone.now()
+        with self.lock:
+            return {key: self.ordered(self.match(config, now)) for key, config in rules.items()}
+
+    def select(self, node) -> Set[int]:
+        """Ids satisfaisant un arbre d'album_expression, évalué sur un index figé"""
+        with self.lock:
+            return node.evaluate(self, set(self.labels))
+
+    def ordered(self, media_ids: Iterable[int]) -> List[int]:
+        """Du plus récent au plus ancien ; les ids retirés depuis leur sélection sont écartés"""
+        with self.lock:
+            return sorted((mid for mid in media_ids if mid in self.uploaded_at),
+                          key=lambda mid: (self.uploaded_at[mid], mid), reverse=True)
+
+
+class LabelIndexService:
+    """
+    Index par utilisateur, tenus à jour à l'écriture (analyse, favori, suppression)
+    et reconstruits si un autre processus a modifié les médias
+    """
+
+    def __init__(self):
+        self._indexes: Dict[int, Tuple[tuple, UserLabelIndex]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(user_id: int) -> tuple:
+        stamp = Media.objects.filter(user_id=user_id).aggregate(n=Count('id'), last=Max('updated_at'))
+        return stamp['n'], stamp['last']
+
+    def get_index(self, user: User) -> UserLabelIndex:
+        stamp = self._stamp(user.id)
+        with self._lock:
+            cached = self._indexes.get(user.id)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        index = UserLabelIndex.build(user)
+        with self._lock:
+            self._indexes[user.id] = (stamp, index)
+        logger.info(f"🏷️ Index d'étiquettes reconstruit pour {user.username} ({len(index.labels)} médias)")
+        return index
+
+    def index_media(self, media: Media) -> None:
+        """Met à jour l'entrée d'un média après analyse ou modification"""
+        with self._lock:
+            cached = self._indexes.get(media.user_id)
+        if cached is None:
+            return
+        index = cached[1]
+        analyses = list(MediaAnalysis.objects.filter(media=media).values_list(
+            'detected_objects', 'detected_locations', 'detected_emotions', 'color_palette', 'dominant_colors'
+        ))
+        with self._lock:
+            if media.media_type != 'image' or not media.is_analyzed or not analyses:
+                index.remove(media.id)
+            else:
+                labels = {field: set() for field in LABEL_FIELDS}
+                for fields in analyses:
+                    for field, tokens in labels_from_analysis(*fields).items():
+                        labels[field] |= tokens
+                index.put(media.id, labels, media.is_favorite, media.uploaded_at, media.taken_at)
+        self._refresh_stamp(media.user_id, index)
+
+    def remove_media(self, user_id: int, media_id: int) -> None:
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is None:
+                return
+            cached[1].remove(media_id)
+        self._refresh_stamp(user_id, cached[1])
+
+    def _refresh_stamp(self, user_id: int, index: UserLabelIndex) -> None:
+        stamp = self._stamp(user_id)
+        with self._lock:
+            if user_id in self._indexes and self._indexes[user_id][1] is index:
+                self._indexes[user_id] = (stamp, index)
+
+
+# Instance globale du service
+label_index_service = LabelIndexService()
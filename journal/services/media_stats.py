@@ -0,0 +1,144 @@
+"""
+Statistiques de la galerie par utilisateur (total, images, vidéos, analysés, favoris)
+Un document MediaStats par utilisateur, incrémenté atomiquement à chaque écriture :
+l'en-tête de la galerie est une seule lecture au lieu de cinq count()
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.db.models import Count, F
+from django.utils import timezone
+
+from ..models import Media, MediaStats
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('total', 'images', 'videos', 'analyzed', 'favorites')
+
+
+def media_counters(media: Media) -> Dict[str, int]:
+    """Contribution d'un média à chaque compteur (à capturer avant une modification)"""
+    return {
+        'total': 1,
+        'images': int(media.media_type == 'image'),
+        'videos': int(media.media_type == 'video'),
+        'analyzed': int(bool(media.is_analyzed)),
+        'favorites': int(bool(media.is_favorite)),
+    }
+
+
+def _empty() -> Dict[str, int]:
+    return dict.fromkeys(COUNTERS, 0)
+
+
+class MediaStatsService:
+
+    def get(self, user: User) -> Dict[str, int]:
+        """Compteurs de l'utilisateur ; calculés et enregistrés au premier accès"""
+        stats = MediaStats.objects.filter(user_id=user.id).values(*COUNTERS).first()
+        if stats is not None:
+            return stats
+        stats = self.compute([user.id]).get(user.id, _empty())
+        try:
+            MediaStats.objects.get_or_create(user_id=user.id, defaults={**stats, 'reconciled_at': timezone.now()})
+        except IntegrityError:
+            pass  # Créé en parallèle par une autre requête
+        return stats
+
+    def record(self, user_id: int, before: Optional[Dict[str, int]] = None,
+               after: Optional[Dict[str, int]] = None) -> None:
+        """
+        Applique la différence after - before en une mise à jour atomique (F())
+
+        Ajout : before=None ; suppression : after=None ; modification : les deux
+        """
+        before, after = before or _empty(), after or _empty()
+        deltas = {name: after[name] - before[name] for name in COUNTERS if after[name] != before[name]}
+        if not deltas:
+            return
+        try:
+            # Aucune ligne : rien à faire, get() recalculera depuis les médias
+            MediaStats.objects.filter(user_id=user_id).update(
+                **{name: F(name) + delta for name, delta in deltas.items()}
+            )
+        except Exception as e:
+            logger.error(f"❌ Mise à jour des statistiques impossible (utilisateur {user_id}): {e}")
+
+    def suggestions_version(self, user: User) -> int:
+        """Version des suggestions d'albums (une lecture indexée ; document créé au besoin)"""
+        version = MediaStats.objects.filter(user_id=user.id).values_list('suggestions_version', flat=True).first()
+        if version is None:
+            self.get(user)
+            return 0
+        return version
+
+    def bump_suggestions_version(self, user_id: int) -> None:
+        """Invalide les suggestions d'albums de l'utilisateur dans tous les processus"""
+        MediaStats.objects.filter(user_id=user_id).update(suggestions_version=F('suggestions_version') + 1)
+
+    @staticmethod
+    def compute(user_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, int]]:
+        """Recalcul complet en une agrégation groupée par (utilisateur, type, analysé, favori)"""
+        queryset = Media.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=list(user_ids))
+        rows = queryset.values('user_id', 'media_type', 'is_analyzed', 'is_favorite').annotate(
+            n=Count('id')
+        ).order_by()
+
+        counters: Dict[int, Dict[str, int]] = {}
+        for row in rows:
+            stats = counters.setdefault(row['user_id'], _empty())
+            n = row['n']
+            stats['total'] += n
+            if row['media_type'] == 'image':
+                stats['images'] += n
+            elif row['media_type'] == 'video':
+                stats['videos'] += n
+            if row['is_analyzed']:
+                stats['analyzed'] += n
+            if row['is_favorite']:
+                stats['favorites'] += n
+        return counters
+
+    def reconcile(self, user_ids: Optional[Iterable[int]] = None,
+                  dry_run: bool = False) -> List[Tuple[int, Dict[str, int], Dict[str, int]]]:
+        """
+        Corrige la dérive des compteurs à partir des médias
+
+        Returns:
+            Liste (user_id, compteurs enregistrés, compteurs recalculés) des utilisateurs divergents
+        """
+        user_ids = list(user_ids) if user_ids is not None else None
+        computed = self.compute(user_ids)
+
+        stored_rows = MediaStats.objects.all()
+        if user_ids is not None:
+            stored_rows = stored_rows.filter(user_id__in=user_ids)
+        stored = {row['user_id']: row for row in stored_rows.values('user_id', *COUNTERS)}
+
+        targets = set(computed) | set(stored) if user_ids is None else set(user_ids)
+        drift = []
+        now = timezone.now()
+        for user_id in sorted(targets):
+            expected = computed.get(user_id, _empty())
+            current = stored.get(user_id)
+            current = {name: current[name] for name in COUNTERS} if current else None
+            if current == expected:
+                continue
+            drift.append((user_id, current or _empty(), expected))
+            if dry_run:
+                continue
+            if current is None:
+                MediaStats.objects.get_or_create(user_id=user_id, defaults={**expected, 'reconciled_at': now})
+            else:
+                MediaStats.objects.filter(user_id=user_id).update(**expected, reconciled_at=now)
+        if not dry_run and drift:
+            logger.info(f"📊 Statistiques médias corrigées pour {len(drift)} utilisateur(s)")
+        return drift
+
+
+# Instance globale du service
+media_stats_service = MediaStatsService()
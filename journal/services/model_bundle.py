@@ -0,0 +1,174 @@
+"""
+Bundles de modèles hors-ligne : répertoires versionnés avec poids safetensors
+et un manifeste de sommes de contrôle, pour un démarrage sans accès au Hub
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL_NAME = 'openai/clip-vit-base-patch32'
+EMOTION_MODEL_NAME = 'myjournal/emotion-sgd'  # Écrit par train_emotion_model
+EMOTION_MODEL_FILE = 'model.joblib'
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+MANIFEST_FORMAT = 1
+
+
+class BundleError(Exception):
+    """Bundle absent, incomplet ou corrompu"""
+
+
+def _model_slug(model_name: str) -> str:
+    return model_name.replace('/', '--')
+
+
+def bundle_root(root: Optional[Path] = None) -> Path:
+    """Répertoire des bundles : root, sinon settings.MODEL_BUNDLE_DIR (lu à l'appel)"""
+    return Path(root if root is not None else settings.MODEL_BUNDLE_DIR)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_table(directory: Path) -> Dict[str, Dict]:
+    return {
+        str(path.relative_to(directory)): {'sha256': _sha256(path), 'size': path.stat().st_size}
+        for path in sorted(directory.rglob('*'))
+        if path.is_file() and path.name != MANIFEST_NAME
+    }
+
+
+def publish_bundle(model_name: str, write: Callable[[Path], Dict], version: Optional[str] = None,
+                   root: Optional[Path] = None, activate: bool = True,
+                   version_file: Optional[str] = None) -> Dict:
+    """
+    Écrit root/<modèle>/<version>/ : write(staging) dépose les fichiers et retourne
+    les métadonnées à ajouter au manifeste ; renommage en une fois puis CURRENT
+
+    Sans version : date + empreinte de version_file
+    """
+    model_root = bundle_root(root) / _model_slug(model_name)
+    model_root.mkdir(parents=True, exist_ok=True)
+
+    staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=model_root))
+    try:
+        metadata = write(staging) or {}
+        files = _file_table(staging)
+        if not version:
+            if version_file not in files:
+                raise BundleError(f"{version_file} absent après sérialisation")
+            version = f"{datetime.now(timezone.utc):%Y%m%d}-{files[version_file]['sha256'][:12]}"
+
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'model_name': model_name,
+            'version': version,
+            **metadata,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'files': files,
+        }
+        with open(staging / MANIFEST_NAME, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        target = model_root / version
+        if target.exists():
+            shutil.rmtree(target)
+        staging.rename(target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        (model_root / CURRENT_NAME).write_text(version + '\n')
+    logger.info(f"✅ Bundle {model_name}@{version} écrit dans {target}")
+    return dict(manifest, path=str(target))
+
+
+def create_bundle(model_name: str, version: Optional[str] = None,
+                  root: Optional[Path] = None, activate: bool = True) -> Dict:
+    """
+    Résout le modèle une fois (Hub ou cache local) et l'écrit en safetensors
+    dans root/<modèle>/<version>/ avec son manifeste
+    """
+    from transformers import CLIPModel, CLIPProcessor
+
+    def write(staging: Path) -> Dict:
+        logger.info(f"📥 Résolution de {model_name}...")
+        processor = CLIPProcessor.from_pretrained(model_name)
+        model = CLIPModel.from_pretrained(model_name)
+        processor.save_pretrained(staging)
+        model.save_pretrained(staging, safe_serialization=True)
+        if not (staging / 'model.safetensors').is_file():
+            raise BundleError("Poids safetensors absents après sérialisation")
+        return {'revision': getattr(model.config, '_commit_hash', None)}
+
+    return publish_bundle(model_name, write, version=version, root=root, activate=activate,
+                          version_file='model.safetensors')
+
+
+def verify_bundle(path: Path, checksums: bool = True) -> Dict:
+    """Vérifie tailles (et sommes SHA-256 si demandé) contre le manifeste"""
+    path = Path(path)
+    manifest_path = path / MANIFEST_NAME
+    if not manifest_path.is_file():
+        raise BundleError(f"Manifeste absent: {manifest_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    for name, meta in manifest.get('files', {}).items():
+        file_path = path / name
+        if not file_path.is_file() or file_path.stat().st_size != meta['size']:
+            raise BundleError(f"Fichier absent ou tronqué: {name}")
+        if checksums and _sha256(file_path) != meta['sha256']:
+            raise BundleError(f"Somme de contrôle invalide: {name}")
+    return dict(manifest, path=str(path))
+
+
+def refresh_manifest(path: Path) -> Dict:
+    """Recalcule la table des fichiers du manifeste après ajout d'un fichier au bundle"""
+    path = Path(path)
+    with open(path / MANIFEST_NAME) as f:
+        manifest = json.load(f)
+    manifest['files'] = _file_table(path)
+    with open(path / (MANIFEST_NAME + '.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path / (MANIFEST_NAME + '.tmp'), path / MANIFEST_NAME)
+    return dict(manifest, path=str(path))
+
+
+def active_bundle(model_name: str, root: Optional[Path] = None,
+                  version: Optional[str] = None) -> Optional[Dict]:
+    """
+    Manifeste du bundle actif (version épinglée, par défaut MODEL_BUNDLE_VERSION,
+    sinon fichier CURRENT), ou None si aucun bundle n'est installé
+    """
+    if version is None:
+        version = settings.MODEL_BUNDLE_VERSION
+    model_root = bundle_root(root) / _model_slug(model_name)
+    if not version:
+        current = model_root / CURRENT_NAME
+        if not current.is_file():
+            return None
+        version = current.read_text().strip()
+    try:
+        # Vérification rapide des tailles au démarrage ; SHA-256 via bundle_models --verify
+        return verify_bundle(model_root / version, checksums=False)
+    except BundleError as e:
+        logger.error(f"❌ Bundle {model_name}@{version} inutilisable: {e}")
+        return None
@@ -0,0 +1,217 @@
+"""
+Albums "moments" : regroupement incrémental des photos par date de prise de vue et GPS
+"""
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Media, SmartAlbum
+from .album_membership import add_members, remove_members
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance orthodromique entre deux points GPS"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class MomentService:
+    """
+    Clustering incrémental : coupure temporelle (écart max entre deux photos)
+    puis critère DBSCAN sur les coordonnées (voisin à moins de eps km).
+
+    Les moments sont des SmartAlbum de type 'moment' dont starts_at/ends_at sont
+    indexés : trouver les moments voisins d'une photo est une recherche d'intervalle
+    sur index, sans reclusteriser la bibliothèque. La boîte englobante GPS stockée
+    sur le moment remplace la lecture de ses photos : une photo est rattachable si
+    elle est à moins de eps km de la boîte (approximation du voisin le plus proche).
+    """
+
+    def __init__(self, time_gap: Optional[timedelta] = None, eps_km: Optional[float] = None):
+        self.time_gap = time_gap or timedelta(hours=getattr(settings, 'MOMENT_TIME_GAP_HOURS', 6))
+        self.eps_km = eps_km if eps_km is not None else getattr(settings, 'MOMENT_GPS_EPS_KM', 5.0)
+
+    @staticmethod
+    def media_time(media: Media) -> datetime:
+        return media.taken_at or media.uploaded_at
+
+    def assign(self, media: Media) -> Optional[SmartAlbum]:
+        """Rattache une photo à un moment existant, en fusionne plusieurs ou en ouvre un nouveau"""
+        if media.media_type != 'image':
+            return None
+        taken = self.media_time(media)
+        if taken is None:
+            return None
+
+        with transaction.atomic():
+            candidates = list(SmartAlbum.objects.filter(
+                user=media.user,
+                album_type='moment',
+                starts_at__lte=taken + self.time_gap,
+                ends_at__gte=taken - self.time_gap,
+            ).order_by('starts_at'))
+            compatible = [moment for moment in candidates if self._spatially_reachable(moment, media)]
+
+            if not compatible:
+                moment = SmartAlbum.objects.create(
+                    user=media.user,
+                    name=self._moment_name(taken, taken),
+                    album_type='moment',
+                    starts_at=taken,
+                    ends_at=taken,
+                    min_latitude=media.latitude,
+                    max_latitude=media.latitude,
+                    min_longitude=media.longitude,
+                    max_longitude=media.longitude,
+                    cover_image=media,
+                    filter_criteria={'rule_key': 'moment'},
+                )
+                add_members(moment, [media])
+                logger.info(f"📸 Nouveau moment: {moment.name}")
+                return moment
+
+            # La photo relie plusieurs moments : fusion dans le premier
+            moment = compatible[0]
+            for other in compatible[1:]:
+                self._merge(moment, other)
+
+            add_members(moment, [media])
+            moment.starts_at = min(moment.starts_at, taken)
+            moment.ends_at = max(moment.ends_at, taken)
+            self._extend_bounds(moment, media.latitude, media.longitude, media.latitude, media.longitude)
+            moment.name = self._moment_name(moment.starts_at, moment.ends_at)
+            if moment.cover_image_id is None:
+                moment.cover_image = media
+            moment.save()
+            return moment
+
+    def rebuild(self, user) -> int:
+        """Recalcule tous les moments d'un utilisateur (rattrapage, changement de paramètres)"""
+        SmartAlbum.objects.filter(user=user, album_type='moment').delete()
+        media_list = sorted(
+            Media.objects.filter(user=user, media_type='image'),
+            key=lambda m: self.media_time(m),
+        )
+        for media in media_list:
+            self.assign(media)
+        return SmartAlbum.objects.filter(user=user, album_type='moment').count()
+
+    def forget_media(self, moment: SmartAlbum) -> None:
+        """
+        Après le retrait d'une photo : regroupe à nouveau les photos restantes (la photo
+        retirée pouvait faire le lien entre deux groupes), recalcule période et boîte GPS,
+        scinde le moment si besoin et le supprime s'il est vide
+        """
+        members = list(moment.media.all())
+        if not members:
+            logger.info(f"🗑️ Moment vide supprimé: {moment.name}")
+            moment.delete()
+            return
+        (kept, _), *others = self._clusters(members)
+        with transaction.atomic():
+            if others:
+                remove_members(moment, [media.id for _, group in others for media in group])
+                for cluster, group in others:
+                    cluster.user_id = moment.user_id
+                    cluster.album_type = 'moment'
+                    cluster.name = self._moment_name(cluster.starts_at, cluster.ends_at)
+                    cluster.cover_image = group[0]
+                    cluster.filter_criteria = {'rule_key': 'moment'}
+                    cluster.save()
+                    add_members(cluster, group)
+                logger.info(f"✂️ Moment {moment.name} scindé en {len(others) + 1}")
+            moment.starts_at, moment.ends_at = kept.starts_at, kept.ends_at
+            moment.min_latitude, moment.max_latitude = kept.min_latitude, kept.max_latitude
+            moment.min_longitude, moment.max_longitude = kept.min_longitude, kept.max_longitude
+            moment.name = self._moment_name(moment.starts_at, moment.ends_at)
+            moment.save(update_fields=['starts_at', 'ends_at', 'name', 'min_latitude', 'max_latitude',
+                                       'min_longitude', 'max_longitude'])
+
+    def _clusters(self, media_list: List[Media]) -> List[Tuple[SmartAlbum, List[Media]]]:
+        """
+        Regroupement d'assign() rejoué en mémoire sur quelques photos, par ordre chronologique :
+        (moment non enregistré portant période et boîte GPS, photos du groupe)
+        """
+        clusters = []
+        for media in sorted(media_list, key=self.media_time):
+            taken = self.media_time(media)
+            compatible = [cluster for cluster in clusters
+                          if cluster[0].starts_at <= taken + self.time_gap
+                          and cluster[0].ends_at >= taken - self.time_gap
+                          and self._spatially_reachable(cluster[0], media)]
+            if not compatible:
+                clusters.append((SmartAlbum(starts_at=taken, ends_at=taken), []))
+                compatible = clusters[-1:]
+            moment, group = compatible[0]
+            for other, other_group in compatible[1:]:
+                group.extend(other_group)
+                moment.starts_at = min(moment.starts_at, other.starts_at)
+                moment.ends_at = max(moment.ends_at, other.ends_at)
+                self._extend_bounds(moment, other.min_latitude, other.min_longitude,
+                                    other.max_latitude, other.max_longitude)
+                clusters = [cluster for cluster in clusters if cluster[0] is not other]
+            group.append(media)
+            moment.starts_at = min(moment.starts_at, taken)
+            moment.ends_at = max(moment.ends_at, taken)
+            self._extend_bounds(moment, media.latitude, media.longitude, media.latitude, media.longitude)
+        return clusters
+
+    def _spatially_reachable(self, moment: SmartAlbum, media: Media) -> bool:
+        if media.latitude is None or media.longitude is None or moment.min_latitude is None:
+            return True
+        # Point de la boîte le plus proche de la photo
+        lat = min(max(media.latitude, moment.min_latitude), moment.max_latitude)
+        lon = min(max(media.longitude, moment.min_longitude), moment.max_longitude)
+        return haversine_km(media.latitude, media.longitude, lat, lon) <= self.eps_km
+
+    @staticmethod
+    def _extend_bounds(moment: SmartAlbum, min_lat: Optional[float], min_lon: Optional[float],
+                       max_lat: Optional[float], max_lon: Optional[float]) -> None:
+        """Étend la boîte GPS du moment (sans effet si la boîte ajoutée est vide)"""
+        if min_lat is None or min_lon is None:
+            return
+        if moment.min_latitude is None:
+            moment.min_latitude, moment.min_longitude = min_lat, min_lon
+            moment.max_latitude, moment.max_longitude = max_lat, max_lon
+            return
+        moment.min_latitude = min(moment.min_latitude, min_lat)
+        moment.min_longitude = min(moment.min_longitude, min_lon)
+        moment.max_latitude = max(moment.max_latitude, max_lat)
+        moment.max_longitude = max(moment.max_longitude, max_lon)
+
+    def _merge(self, target: SmartAlbum, other: SmartAlbum) -> None:
+        add_members(target, list(other.media.all()))
+        target.starts_at = min(target.starts_at, other.starts_at)
+        target.ends_at = max(target.ends_at, other.ends_at)
+        self._extend_bounds(target, other.min_latitude, other.min_longitude, other.max_latitude, other.max_longitude)
+        if target.cover_image_id is None:
+            target.cover_image_id = other.cover_image_id
+        logger.info(f"🔗 Fusion des moments {target.name} et {other.name}")
+        other.delete()
+
+    @staticmethod
+    def _moment_name(start: datetime, end: datetime) -> str:
+        if start.date() == end.date():
+            return f"✨ Moment du {start:%d/%m/%Y}"
+        if start.year == end.year:
+            return f"✨ Moment du {start:%d/%m} au {end:%d/%m/%Y}"
+        return f"✨ Moment du {start:%d/%m/%Y} au {end:%d/%m/%Y}"
+
+    def get_moments(self, user) -> List[SmartAlbum]:
+        return list(SmartAlbum.objects.filter(user=user, album_type='moment')
+                    .select_related('cover_image').order_by('-starts_at'))
+
+
+# Instance globale du service
+moment_service = MomentService()
@@ -0,0 +1,161 @@
+"""
+Enrichissement des notes après enregistrement
+create_note / edit_note enregistrent la note en état 'pending' et la placent en file ;
+un thread par processus l'enrichit par lots (émotion, puis enrichisseurs enregistrés)
+et la repasse en 'done'. Une modification pendant le calcul remet la note en 'pending' :
+le résultat périmé est écarté. Au démarrage, le thread reprend les notes laissées en
+attente par un processus arrêté (file en mémoire perdue) ; enrich_notes fait de même à la demande
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .. import utils
+from ..models import Note
+from .emotion_cache import content_digest, emotion_cache
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW = 0.05  # Secondes d'attente pour regrouper les notes enregistrées ensemble
+RECOVERY_DELAY = 5  # Secondes : une note 'pending' plus récente est encore dans la file d'un worker actif
+
+# Reçoit les notes du lot, retourne {note_id: {champ: valeur}} des champs dérivés à écrire
+Enricher = Callable[[List[Note]], Dict[int, Dict]]
+
+
+def enrich_emotion(notes: List[Note]) -> Dict[int, Dict]:
+    """Émotion du contenu, en un appel au modèle pour le lot ; contenu inchangé => pas d'inférence"""
+    if not utils.lr_model:
+        return {}
+    todo = [note for note in notes
+            if note.content and (content_digest(note.content) != note.content_hash or not note.emotion)]
+    if not todo:
+        return {}
+    fields = {}
+    for note, (emotion, confidence) in zip(todo, emotion_cache.predict_many([note.content for note in todo])):
+        if emotion:
+            fields[note.id] = {
+                'emotion': emotion,
+                'emotion_confidence': float(confidence * 100),
+                'content_hash': content_digest(note.content),
+                'emotion_model_version': utils.lr_model_version,
+            }
+    return fields
+
+
+class NoteEnrichmentService:
+
+    def __init__(self):
+        self._enrichers: List[Tuple[str, Enricher]] = [('emotion', enrich_emotion)]
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, name: str, enricher: Enricher) -> None:
+        """Ajoute un enrichisseur (recommandations, mots-clés, ...) exécuté après les précédents"""
+        self._enrichers.append((name, enricher))
+
+    def enqueue(self, note: Note) -> None:
+        """
+        À appeler après note.save() avec enrichment_status = 'pending' : enrichissement
+        en arrière-plan, ou immédiat si NOTE_ENRICHMENT_ASYNC est désactivé
+        """
+        if not settings.NOTE_ENRICHMENT_ASYNC:
+            transaction.on_commit(lambda: self.enrich([note.id]))
+            return
+        self.resume()
+        transaction.on_commit(lambda: self._queue.put(note.id))
+
+    def resume(self) -> None:
+        """Démarre le thread du processus s'il ne tourne pas (il reprend d'abord les notes abandonnées)"""
+        if not settings.NOTE_ENRICHMENT_ASYNC:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='note-enrichment', daemon=True)
+                self._thread.start()
+
+    def recover(self) -> List[int]:
+        """
+        Notes abandonnées par un processus arrêté : 'pending' depuis plus de RECOVERY_DELAY,
+        'enriching' depuis plus de NOTE_ENRICHMENT_STALE_SECONDS (repassées en 'pending').
+        updated_at date l'enregistrement : les changements d'état par update() ne le touchent pas
+        """
+        now = timezone.now()
+        Note.objects.filter(
+            enrichment_status=Note.ENRICHMENT_RUNNING,
+            updated_at__lt=now - timedelta(seconds=settings.NOTE_ENRICHMENT_STALE_SECONDS),
+        ).update(enrichment_status=Note.ENRICHMENT_PENDING)
+        return list(Note.objects.filter(
+            enrichment_status=Note.ENRICHMENT_PENDING,
+            updated_at__lt=now - timedelta(seconds=RECOVERY_DELAY),
+        ).order_by('id').values_list('id', flat=True))
+
+    def _run(self):
+        try:
+            note_ids = self.recover()
+            if note_ids:
+                logger.info(f"🔁 Reprise de {len(note_ids)} note(s) en attente")
+            for note_id in note_ids:
+                self._queue.put(note_id)
+        except Exception as e:
+            logger.error(f"❌ Reprise des notes en attente impossible: {e}")
+        finally:
+            close_old_connections()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < settings.NOTE_ENRICHMENT_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.enrich(batch)
+            except Exception as e:
+                logger.error(f"❌ Erreur enrichissement des notes {batch}: {e}")
+            finally:
+                close_old_connections()
+
+    def enrich(self, note_ids: Iterable[int]) -> int:
+        """Enrichit les notes en attente parmi note_ids ; retourne le nombre de notes terminées"""
+        note_ids = list(dict.fromkeys(note_ids))
+        Note.objects.filter(id__in=note_ids, enrichment_status=Note.ENRICHMENT_PENDING).update(
+            enrichment_status=Note.ENRICHMENT_RUNNING
+        )
+        notes = list(Note.objects.filter(id__in=note_ids, enrichment_status=Note.ENRICHMENT_RUNNING))
+        if not notes:
+            return 0
+
+        fields = {note.id: {} for note in notes}
+        status = Note.ENRICHMENT_DONE
+        for name, enricher in self._enrichers:
+            try:
+                for note_id, values in enricher(notes).items():
+                    fields[note_id].update(values)
+            except Exception as e:
+                logger.error(f"❌ Enrichisseur {name} en échec: {e}")
+                status = Note.ENRICHMENT_FAILED
+
+        written = []
+        for note in notes:
+            # Note modifiée pendant le calcul (repassée en 'pending') : résultat périmé, non écrit
+            if Note.objects.filter(id=note.id, enrichment_status=Note.ENRICHMENT_RUNNING).update(
+                enrichment_status=status, **fields[note.id]
+            ):
+                written.append(note.id)
+        return len(written)
+
+
+# Instance globale du service
+note_enrichment_service = NoteEnrichmentService()
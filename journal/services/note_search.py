@@ -0,0 +1,269 @@
+"""
+Recherche plein texte des notes : index inversé BM25 par utilisateur (même moteur que la galerie)
+Titre et contenu sans accents, sans mots vides, réduits à leur racine (racinisation
+française légère) ; termes persistés par note (NoteSearchDocument), tenus à jour à la
+création, la modification et la suppression. Filtres catégorie, émotion et période
+appliqués en base sur les notes classées (valeurs à jour), extraits avec les termes trouvés surlignés
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+
+from ..models import Note, NoteSearchDocument
+from .label_index import normalize_label
+from .search_index import BATCH_SIZE, STOPWORDS, UserSearchIndex
+
+logger = logging.getLogger(__name__)
+
+NOTE_STOPWORDS = STOPWORDS | frozenset({
+    # Français (formes sans accents)
+    'ai', 'aie', 'alors', 'as', 'aussi', 'avais', 'avait', 'avez', 'avoir', 'avons', 'bien', 'ca', 'car',
+    'cela', 'cet', 'cette', 'chez', 'comme', 'deja', 'donc', 'elle', 'elles', 'encore', 'es', 'est',
+    'etaient', 'etais', 'etait', 'ete', 'etes', 'etre', 'eu', 'fait', 'ici', 'ils', 'je', 'jai', 'leurs',
+    'lui', 'mais', 'me', 'meme', 'moi', 'ni', 'nos', 'notre', 'nous', 'on', 'ont', 'peu', 'plus', 'quand',
+    'sans', 'si', 'sommes', 'sont', 'sous', 'suis', 'te', 'toi', 'tous', 'tout', 'toute', 'toutes', 'tres',
+    'tu', 'vers', 'vous',
+    # Anglais
+    'am', 'been', 'but', 'did', 'do', 'had', 'has', 'have', 'he', 'her', 'his', 'me', 'my', 'not', 'she',
+    'so', 'that', 'they', 'very', 'was', 'we', 'were', 'you', 'your',
+})
+
+# Suffixes retirés par la racinisation légère (dans l'ordre), racine d'au moins 3 lettres
+LIGHT_SUFFIXES = (
+    ('issement', ''), ('ement', ''), ('ation', ''), ('aient', ''), ('ienne', 'ien'), ('euse', 'eu'),
+    ('elle', 'el'), ('ette', 'et'), ('ait', ''), ('ive', 'if'), ('er', ''), ('ez', ''), ('ee', ''), ('e', ''),
+)
+
+FIELD_WEIGHTS = {'title': 3, 'content': 1}
+
+SNIPPET_WIDTH = 220
+_WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Racine française légère d'un mot déjà sans accents : pluriels, féminins, suffixes courants"""
+    if len(token) <= 3:
+        return token
+    if token.endswith('aux') and len(token) > 5:
+        token = token[:-3] + 'al'
+    elif token[-1] in 'sx':
+        token = token[:-1]
+    for suffix, replacement in LIGHT_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)] + replacement
+            break
+    if len(token) > 3 and token[-1] == token[-2] and token[-1].isalpha():
+        token = token[:-1]
+    return token
+
+
+def note_tokens(text) -> List[str]:
+    """Racines indexées d'un texte (et d'une requête)"""
+    return [stem(token) for token in normalize_label(text).split()
+            if len(token) > 1 and token not in NOTE_STOPWORDS and not token.isdigit()]
+
+
+def build_terms(title, content) -> Dict[str, int]:
+    terms = Counter()
+    for field, text in (('title', title), ('content', content)):
+        for token in note_tokens(text or ''):
+            terms[token] += FIELD_WEIGHTS[field]
+    return dict(terms)
+
+
+def highlight(text, terms: Set[str], width: Optional[int] = SNIPPET_WIDTH) -> SafeString:
+    """
+    Extrait HTML échappé de text autour de la zone la plus dense en termes trouvés,
+    ceux-ci entourés de <mark> ; width=None : texte entier
+    """
+    text = str(text or '')
+    matches = [(m.start(), m.end()) for m in _WORD.finditer(text)
+               if terms and any(stem(token) in terms for token in normalize_label(m.group()).split())]
+
+    start, end = 0, len(text)
+    if width and len(text) > width:
+        if matches:
+            # Fenêtre qui commence un peu avant le match couvrant le plus de matches suivants
+            best = max(range(len(matches)), key=lambda i: (
+                sum(1 for match in matches[i:] if match[1] <= matches[i][0] + width * 3 // 4), -i
+            ))
+            start = max(0, matches[best][0] - width // 4)
+        end = min(len(text), start + width)
+        if start > 0:
+            space = text.find(' ', start, start + 20)
+            start = space + 1 if space >= 0 else start
+        if end < len(text):
+            space = text.rfind(' ', start, end)
+            end = space if space > end - 20 else end
+
+    parts = ['…' if start > 0 else '']
+    position = start
+    for match_start, match_end in matches:
+        if match_start < start or match_end > end:
+            continue
+        parts.append(escape(text[position:match_start]))
+        parts.append(f'<mark>{escape(text[match_start:match_end])}</mark>')
+        position = match_end
+    parts.append(escape(text[position:end]))
+    parts.append('…' if end < len(text) else '')
+    return mark_safe(''.join(parts))
+
+
+def note_documents(note_ids: List[int]) -> Dict[int, Tuple[int, Dict[str, int]]]:
+    """note_id -> (user_id, termes) ; une requête par lot"""
+    documents = {}
+    for start in range(0, len(note_ids), BATCH_SIZE):
+        for note_id, user_id, title, content in Note.objects.filter(
+            id__in=note_ids[start:start + BATCH_SIZE]
+        ).values_list('id', 'user_id', 'title', 'content'):
+            documents[note_id] = (user_id, build_terms(title, content))
+    return documents
+
+
+class NoteSearchIndex(UserSearchIndex):
+    """Index BM25 de la galerie, avec les mots des notes (racines françaises)"""
+
+    def matched_terms(self, query: str) -> Set[str]:
+        """Termes de l'index atteints par les mots de la requête (exacts et préfixes)"""
+        return {term for token in dict.fromkeys(note_tokens(query)) for term, _ in self.expand(token)}
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        return self.rank(list(dict.fromkeys(note_tokens(query))))
+
+
+class NoteSearchService:
+    """
+    Index de notes par utilisateur, mis à jour à l'écriture et rechargé depuis
+    NoteSearchDocument si un autre processus (worker d'enrichissement) les a modifiés
+    """
+
+    def __init__(self):
+        # user_id -> (empreinte, index, instant de la dernière vérification de l'empreinte)
+        self._indexes: Dict[int, Tuple[tuple, NoteSearchIndex, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(user_id: int) -> tuple:
+        stamp = NoteSearchDocument.objects.filter(user_id=user_id).aggregate(n=Count('id'), last=Max('updated_at'))
+        return stamp['n'], stamp['last']
+
+    @staticmethod
+    def _save(note_id: int, user_id: int, terms: Dict[str, int]) -> None:
+        length = sum(terms.values())
+        updated = NoteSearchDocument.objects.filter(note_id=note_id).update(
+            terms=terms, length=length, updated_at=timezone.now()
+        )
+        if not updated:
+            NoteSearchDocument.objects.create(note_id=note_id, user_id=user_id, terms=terms, length=length)
+
+    def backfill(self, user: Optional[User] = None, rebuild: bool = False) -> int:
+        """Crée les documents manquants (ou tous avec rebuild) ; retourne le nombre de notes indexées"""
+        notes = Note.objects.all()
+        if user is not None:
+            notes = notes.filter(user=user)
+        note_ids = list(notes.values_list('id', flat=True))
+        if not rebuild:
+            indexed = set(NoteSearchDocument.objects.filter(note_id__in=note_ids).values_list('note_id', flat=True))
+            note_ids = [note_id for note_id in note_ids if note_id not in indexed]
+        documents = note_documents(note_ids)
+        for note_id, (user_id, terms) in documents.items():
+            self._save(note_id, user_id, terms)
+        return len(documents)
+
+    def _build(self, user: User) -> NoteSearchIndex:
+        filled = self.backfill(user)
+        if filled:
+            logger.info(f"🔎 {filled} note(s) ajoutée(s) à l'index de recherche de {user.username}")
+        index = NoteSearchIndex()
+        for note_id, terms in NoteSearchDocument.objects.filter(user=user).values_list('note_id', 'terms'):
+            if isinstance(terms, str):
+                terms = json.loads(terms)
+            index.put(note_id, terms or {})
+        return index
+
+    def get_index(self, user: User) -> NoteSearchIndex:
+        """
+        Index de l'utilisateur ; l'empreinte en base (écritures des autres processus) n'est
+        revérifiée qu'après NOTE_SEARCH_MAX_STALENESS secondes, celles de ce processus sont immédiates
+        """
+        with self._lock:
+            cached = self._indexes.get(user.id)
+            if cached and time.monotonic() - cached[2] < settings.NOTE_SEARCH_MAX_STALENESS:
+                return cached[1]
+        stamp = self._stamp(user.id)
+        with self._lock:
+            cached = self._indexes.get(user.id)
+            if cached and cached[0] == stamp:
+                self._indexes[user.id] = (stamp, cached[1], time.monotonic())
+                return cached[1]
+        index = self._build(user)
+        with self._lock:
+            self._indexes[user.id] = (self._stamp(user.id), index, time.monotonic())
+        logger.info(f"🔎 Index des notes chargé pour {user.username} ({len(index.lengths)} notes)")
+        return index
+
+    def search(self, user: User, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(note_id, score) par pertinence ; les filtres sont appliqués en base par l'appelant"""
+        index = self.get_index(user)
+        with index.lock:
+            results = index.search(query)
+        return results[:limit] if limit else results
+
+    def matched_terms(self, user: User, query: str) -> Set[str]:
+        index = self.get_index(user)
+        with index.lock:
+            return index.matched_terms(query)
+
+    def index_notes(self, note_ids: Iterable[int]) -> None:
+        """Réindexe des notes après création ou modification"""
+        try:
+            documents = note_documents(list(note_ids))
+            for note_id, (user_id, terms) in documents.items():
+                self._save(note_id, user_id, terms)
+        except Exception as e:
+            logger.error(f"❌ Indexation de recherche impossible pour les notes {list(note_ids)}: {e}")
+            return
+        touched = {}
+        with self._lock:
+            for note_id, (user_id, terms) in documents.items():
+                cached = self._indexes.get(user_id)
+                if cached is None:
+                    continue
+                with cached[1].lock:
+                    cached[1].put(note_id, terms)
+                touched[user_id] = cached[1]
+        for user_id, index in touched.items():
+            self._refresh_stamp(user_id, index)
+
+    def remove_note(self, user_id: int, note_id: int) -> None:
+        """Le document est supprimé en cascade avec la note ; reste l'index en mémoire"""
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is None:
+                return
+            with cached[1].lock:
+                cached[1].remove(note_id)
+        self._refresh_stamp(user_id, cached[1])
+
+    def _refresh_stamp(self, user_id: int, index: NoteSearchIndex) -> None:
+        stamp = self._stamp(user_id)
+        with self._lock:
+            if user_id in self._indexes and self._indexes[user_id][1] is index:
+                self._indexes[user_id] = (stamp, index, time.monotonic())
+
+
+# Instance globale du service
+note_search_service = NoteSearchService()
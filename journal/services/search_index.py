@@ -0,0 +1,316 @@
+"""
+Recherche plein texte de la galerie : index inversé BM25 par utilisateur
+Texte du média (titre, description, tags) et de son analyse IA, sans accents ;
+les termes pondérés sont persistés par média (MediaSearchDocument) et l'index
+en mémoire est reconstruit à partir d'eux en une requête
+"""
+import bisect
+import json
+import logging
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from ..models import Media, MediaAnalysis, MediaSearchDocument, MediaTag
+from .label_index import normalize_label
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset({
+    # Français
+    'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'en', 'et', 'il', 'la', 'le', 'les',
+    'leur', 'ma', 'mes', 'mon', 'ne', 'ou', 'par', 'pas', 'pour', 'qu', 'que', 'qui', 'sa', 'se',
+    'ses', 'son', 'sur', 'ta', 'tes', 'ton', 'un', 'une', 'vos', 'votre',
+    # Anglais
+    'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on', 'or',
+    'the', 'this', 'to', 'with',
+})
+
+# Poids par champ (fréquence de terme pondérée)
+FIELD_WEIGHTS = {
+    'title': 3,
+    'tags': 2,
+    'ai_title': 2,
+    'suggested_tags': 2,
+    'detected_locations': 2,
+    'detected_objects': 1,
+    'description': 1,
+    'album': 1,
+    'ai_description': 1,
+    'extracted_text': 1,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_WEIGHT = 0.7   # Un terme complété par préfixe compte moins qu'un terme exact
+MAX_EXPANSIONS = 64
+PENDING_PREFIX = '🔄'  # Textes provisoires de media_analyze
+BATCH_SIZE = 500
+
+
+def search_tokens(text) -> List[str]:
+    return [token for token in normalize_label(text).split() if len(token) > 1 and token not in STOPWORDS]
+
+
+def _texts(value) -> List[str]:
+    """Champ texte ou liste JSON (éventuellement sérialisée par Djongo)"""
+    if not value:
+        return []
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def build_terms(fields: Dict[str, Iterable[str]]) -> Dict[str, int]:
+    terms = Counter()
+    for field, texts in fields.items():
+        weight = FIELD_WEIGHTS[field]
+        for text in texts:
+            if text.startswith(PENDING_PREFIX):
+                continue
+            for token in search_tokens(text):
+                terms[token] += weight
+    return dict(terms)
+
+
+def media_documents(media_ids: List[int]) -> Dict[int, Tuple[int, Dict[str, int]]]:
+    """media_id -> (user_id, termes) ; trois requêtes par lot, quel que soit le nombre de médias"""
+    documents = {}
+    for start in range(0, len(media_ids), BATCH_SIZE):
+        batch = media_ids[start:start + BATCH_SIZE]
+        fields: Dict[int, Dict[str, List[str]]] = {}
+        owners = {}
+        for media_id, user_id, title, description, album in Media.objects.filter(id__in=batch).values_list(
+            'id', 'user_id', 'title', 'description', 'album'
+        ):
+            owners[media_id] = user_id
+            fields[media_id] = {field: [] for field in FIELD_WEIGHTS}
+            fields[media_id].update(title=_texts(title), description=_texts(description), album=_texts(album))
+
+        for media_id, name in MediaTag.objects.filter(media_id__in=batch).values_list('media_id', 'name'):
+            if media_id in fields:
+                fields[media_id]['tags'].append(name)
+
+        analysis_fields = ('ai_title', 'ai_description', 'extracted_text',
+                           'detected_locations', 'detected_objects', 'suggested_tags')
+        for media_id, *values in MediaAnalysis.objects.filter(media_id__in=batch).values_list(
+            'media_id', *analysis_fields
+        ):
+            if media_id in fields:
+                # Analyses en double (données Djongo) : textes cumulés
+                for field, value in zip(analysis_fields, values):
+                    fields[media_id][field].extend(_texts(value))
+
+        for media_id, media_fields in fields.items():
+            documents[media_id] = (owners[media_id], build_terms(media_fields))
+    return documents
+
+
+class UserSearchIndex:
+    """Postings terme -> {media_id: fréquence pondérée} et longueurs des documents"""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # put/remove des threads d'analyse pendant le classement
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.documents: Dict[int, List[str]] = {}
+        self.lengths: Dict[int, float] = {}
+        self.total_length = 0.0
+        self._vocabulary: Optional[List[str]] = None
+        self._norms: Optional[Dict[int, float]] = None  # Normalisation BM25 de longueur, par document
+
+    def put(self, media_id: int, terms: Dict[str, float]) -> None:
+        self.remove(media_id)
+        for term, frequency in terms.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                self._vocabulary = None
+            self.postings[term][media_id] = frequency
+        self._norms = None
+        self.documents[media_id] = list(terms)
+        length = sum(terms.values())
+        self.lengths[media_id] = length
+        self.total_length += length
+
+    def remove(self, media_id: int) -> None:
+        length = self.lengths.pop(media_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        self._norms = None
+        for term in self.documents.pop(media_id, ()):
+            del self.postings[term][media_id]
+            if not self.postings[term]:
+                del self.postings[term]
+                self._vocabulary = None
+
+    def expand(self, token: str) -> List[Tuple[str, float]]:
+        """Termes correspondant à un mot de la requête : exact, puis complétions du préfixe"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        matches = []
+        position = bisect.bisect_left(vocabulary, token)
+        while position < len(vocabulary) and len(matches) < MAX_EXPANSIONS:
+            term = vocabulary[position]
+            if not term.startswith(token):
+                break
+            matches.append((term, 1.0 if term == token else PREFIX_WEIGHT))
+            position += 1
+        return matches
+
+    def search(self, query: str) -> List[Tuple[int, float]]:
+        """(media_id, score) des médias contenant tous les mots, du plus pertinent au moins pertinent"""
+        return self.rank(list(dict.fromkeys(search_tokens(query))))
+
+    def rank(self, tokens: List[str]) -> List[Tuple[int, float]]:
+        """Classement BM25 de mots déjà normalisés (tous requis, préfixes complétés)"""
+        if not tokens or not self.lengths:
+            return []
+        count = len(self.lengths)
+        average = self.total_length / count or 1.0
+        if self._norms is None:
+            self._norms = {media_id: BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                           for media_id, length in self.lengths.items()}
+        norms = self._norms
+
+        scores: Optional[Dict[int, float]] = None
+        # Mots les plus rares d'abord : l'intersection se réduit vite
+        expansions = sorted(((token, self.expand(token)) for token in tokens),
+                            key=lambda item: sum(len(self.postings[term]) for term, _ in item[1]))
+        for token, terms in expansions:
+            best: Dict[int, float] = {}
+            for term, weight in terms:
+                docs = self.postings[term]
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                # Après le premier mot : parcours du plus petit des deux ensembles
+                candidates = docs if scores is None or len(docs) <= len(scores) else [
+                    media_id for media_id in scores if media_id in docs
+                ]
+                for media_id in candidates:
+                    if scores is not None and media_id not in scores:
+                        continue
+                    frequency = docs[media_id]
+                    value = weight * idf * frequency * (BM25_K1 + 1) / (frequency + norms[media_id])
+                    if value > best.get(media_id, 0.0):
+                        best[media_id] = value
+            scores = best if scores is None else {media_id: scores[media_id] + value
+                                                  for media_id, value in best.items()}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+class SearchIndexService:
+    """
+    Index par utilisateur, mis à jour à l'écriture (upload, édition, tags, analyse)
+    et rechargé depuis MediaSearchDocument si un autre processus les a modifiés
+    """
+
+    def __init__(self):
+        self._indexes: Dict[int, Tuple[tuple, UserSearchIndex]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(user_id: int) -> tuple:
+        stamp = MediaSearchDocument.objects.filter(user_id=user_id).aggregate(n=Count('id'), last=Max('updated_at'))
+        return stamp['n'], stamp['last']
+
+    @staticmethod
+    def _save(media_id: int, user_id: int, terms: Dict[str, int]) -> None:
+        length = sum(terms.values())
+        updated = MediaSearchDocument.objects.filter(media_id=media_id).update(
+            terms=terms, length=length, updated_at=timezone.now()
+        )
+        if not updated:
+            MediaSearchDocument.objects.create(media_id=media_id, user_id=user_id, terms=terms, length=length)
+
+    def backfill(self, user: Optional[User] = None, rebuild: bool = False) -> int:
+        """Crée les documents manquants (ou tous avec rebuild) ; retourne le nombre de médias indexés"""
+        media = Media.objects.all()
+        if user is not None:
+            media = media.filter(user=user)
+        media_ids = list(media.values_list('id', flat=True))
+        if not rebuild:
+            indexed = set(MediaSearchDocument.objects.filter(media_id__in=media_ids).values_list('media_id', flat=True))
+            media_ids = [media_id for media_id in media_ids if media_id not in indexed]
+        documents = media_documents(media_ids)
+        for media_id, (user_id, terms) in documents.items():
+            self._save(media_id, user_id, terms)
+        return len(documents)
+
+    def _build(self, user: User) -> UserSearchIndex:
+        filled = self.backfill(user)
+        if filled:
+            logger.info(f"🔎 {filled} média(s) ajouté(s) à l'index de recherche de {user.username}")
+        index = UserSearchIndex()
+        for media_id, terms in MediaSearchDocument.objects.filter(user=user).values_list('media_id', 'terms'):
+            if isinstance(terms, str):
+                terms = json.loads(terms)
+            index.put(media_id, terms or {})
+        return index
+
+    def get_index(self, user: User) -> UserSearchIndex:
+        stamp = self._stamp(user.id)
+        with self._lock:
+            cached = self._indexes.get(user.id)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        index = self._build(user)
+        with self._lock:
+            self._indexes[user.id] = (self._stamp(user.id), index)
+        logger.info(f"🔎 Index de recherche chargé pour {user.username} ({len(index.lengths)} médias)")
+        return index
+
+    def search(self, user: User, query: str, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        index = self.get_index(user)
+        with index.lock:
+            results = index.search(query)
+        return results[:limit] if limit else results
+
+    def index_media(self, media: Media) -> None:
+        """Réindexe un média après upload, édition, modification des tags ou analyse"""
+        try:
+            document = media_documents([media.id]).get(media.id)
+            if document is None:
+                return
+            self._save(media.id, media.user_id, document[1])
+        except Exception as e:
+            logger.error(f"❌ Indexation de recherche impossible pour le média {media.id}: {e}")
+            return
+        with self._lock:
+            cached = self._indexes.get(media.user_id)
+            if cached is None:
+                return
+            with cached[1].lock:
+                cached[1].put(media.id, document[1])
+        self._refresh_stamp(media.user_id, cached[1])
+
+    def remove_media(self, user_id: int, media_id: int) -> None:
+        """Le document est supprimé en cascade avec le média ; reste l'index en mémoire"""
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached is None:
+                return
+            with cached[1].lock:
+                cached[1].remove(media_id)
+        self._refresh_stamp(user_id, cached[1])
+
+    def _refresh_stamp(self, user_id: int, index: UserSearchIndex) -> None:
+        stamp = self._stamp(user_id)
+        with self._lock:
+            if user_id in self._indexes and self._indexes[user_id][1] is index:
+                self._indexes[user_id] = (stamp, index)
+
+
+# Instance globale du service
+search_index_service = SearchIndexService()
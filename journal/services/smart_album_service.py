@@ -2,14 +2,27 @@
 Service de création automatique d'albums intelligents basés sur l'IA
 """
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
-from django.db.models import Count, Q
+import threading
+import time
+from typing import List, Dict, Optional, Set
+from django.conf import settings
 from django.contrib.auth.models import User
-from ..models import Media, MediaAnalysis, SmartAlbum
+from django.core.cache import cache
+from django.utils import timezone
+from ..models import Media, SmartAlbum
+from .album_expression import ExpressionError, compile_expression
+from .album_membership import add_members, remove_members, set_members
+from .album_rule_compiler import album_rule_evaluator
+from .label_index import label_index_service
+from .media_stats import media_stats_service
+from .moment_service import moment_service
 
 logger = logging.getLogger(__name__)
 
+# Suggestions matérialisées par utilisateur, invalidées par un numéro de version
+SUGGESTIONS_CACHE_KEY = 'smart_albums:suggestions:{user_id}'
+SUGGESTIONS_LOCK_KEY = 'smart_albums:refreshing:{user_id}'
+
 
 class SmartAlbumService:
     """Service pour créer et gérer des albums intelligents automatiquement"""
@@ -144,10 +157,13 @@ class SmartAlbumService:
             ).delete()[0]
             logger.info(f"🗑️ {deleted_count} anciens albums supprimés")
         
+        # Évaluer toutes les règles en un passage (agrégation MongoDB ou index)
+        matches = album_rule_evaluator.evaluate(user, self.album_rules)
+        
         # Créer chaque type d'album
         for album_key, album_config in self.album_rules.items():
             try:
-                result = self._create_album_by_rule(user, album_key, album_config)
+                result = self._create_album_by_rule(user, album_key, album_config, matches[album_key])
                 
                 if result['created']:
                     stats['created'] += 1
@@ -166,23 +182,28 @@ class SmartAlbumService:
         logger.info(f"✨ Terminé! Créés: {stats['created']}, Mis à jour: {stats['updated']}, Ignorés: {stats['skipped']}")
         return stats
     
-    def _create_album_by_rule(self, user: User, album_key: str, config: Dict) -> Dict:
+    def _create_album_by_rule(self, user: User, album_key: str, config: Dict,
+                              media_ids: Optional[List[int]] = None) -> Dict:
         """
         Crée un album basé sur une règle
         
+        Args:
+            media_ids: Ids déjà évalués (du plus récent au plus ancien), sinon évalués ici
+        
         Returns:
             Dict avec 'created', 'updated', 'album', 'media_count'
         """
-        # Récupérer les médias correspondants
-        media_list = self._get_media_by_criteria(user, config)
+        if media_ids is None:
+            index = label_index_service.get_index(user)
+            media_ids = index.ordered(index.match(config))
         
         # Vérifier le minimum requis
-        if len(media_list) < config.get('min_media', 1):
+        if len(media_ids) < config.get('min_media', 1):
             return {
                 'created': False,
                 'updated': False,
                 'album': None,
-                'media_count': len(media_list)
+                'media_count': len(media_ids)
             }
         
         # Créer ou mettre à jour l'album
@@ -209,187 +230,30 @@ class SmartAlbumService:
             )
             created = True
         
-        # Mettre à jour les médias - Utiliser .add() au lieu de .set() pour Djongo
-        album.media.clear()  # Vider d'abord
-        for media in media_list:
-            album.media.add(media)
-        
-        # Définir l'image de couverture (le plus récent)
-        if media_list:
-            album.cover_image = media_list[0]
-            album.save()
+        # Mettre à jour les médias par différence (couverture = le plus récent)
+        set_members(album, media_ids)
         
         return {
             'created': created,
             'updated': not created,
             'album': album,
-            'media_count': len(media_list)
+            'media_count': len(media_ids)
         }
     
     def _get_media_by_criteria(self, user: User, config: Dict) -> List[Media]:
         """
-        Récupère les médias correspondant aux critères
+        Récupère les médias correspondant aux critères (via l'index d'étiquettes)
         """
-        # Base query: médias de l'utilisateur
-        # Note: Djongo a des problèmes avec les filtres booléens, donc on filtre après
-        queryset = Media.objects.filter(
-            user=user,
-            media_type='image'  # Pour l'instant, seulement les images
-        )
-        
-        # Filtre par période
-        if 'days_ago' in config:
-            date_limit = datetime.now() - timedelta(days=config['days_ago'])
-            queryset = queryset.filter(uploaded_at__gte=date_limit)
-        
-        # Filtre par favoris
-        if config.get('is_favorite'):
-            # Djongo workaround: filtrer en Python
-            queryset = [m for m in queryset if m.is_favorite]
-            queryset = Media.objects.filter(id__in=[m.id for m in queryset]) if queryset else Media.objects.none()
-        
-        # Filtrer seulement les médias analysés (workaround Djongo)
-        analyzed_ids = []
-        for media in queryset:
-            if media.is_analyzed:
-                try:
-                    # Tenter d'accéder à l'analyse
-                    _ = media.analysis
-                    analyzed_ids.append(media.id)
-                except MediaAnalysis.DoesNotExist:
-                    # Pas d'analyse pour ce média
-                    pass
-                except MediaAnalysis.MultipleObjectsReturned:
-                    # Plusieurs analyses (erreur de données) - prendre le média quand même
-                    logger.warning(f"⚠️ Plusieurs analyses pour media {media.id}")
-                    analyzed_ids.append(media.id)
-        
-        if not analyzed_ids:
+        index = label_index_service.get_index(user)
+        return self._media_in_order(index.ordered(index.match(config)))
+    
+    @staticmethod
+    def _media_in_order(media_ids: List[int]) -> List[Media]:
+        """Charge les médias en une requête, dans l'ordre des ids"""
+        if not media_ids:
             return []
-        
-        queryset = Media.objects.filter(id__in=analyzed_ids)
-        
-        # Filtre par objets détectés
-        if 'objects' in config:
-            matching_ids = []
-            for media in queryset:
-                try:
-                    analysis = media.analysis
-                    if analysis.detected_objects:
-                        # Vérifier si au moins un objet correspond
-                        detected = analysis.detected_objects
-                        if isinstance(detected, list):
-                            for obj in config['objects']:
-                                if any(obj.lower() in str(d).lower() for d in detected):
-                                    matching_ids.append(media.id)
-                                    break
-                except (MediaAnalysis.DoesNotExist, MediaAnalysis.MultipleObjectsReturned) as e:
-                    if isinstance(e, MediaAnalysis.MultipleObjectsReturned):
-                        # Utiliser la première analyse en cas de doublons
-                        analysis = MediaAnalysis.objects.filter(media=media).first()
-                        if analysis and analysis.detected_objects:
-                            detected = analysis.detected_objects
-                            if isinstance(detected, list):
-                                for obj in config['objects']:
-                                    if any(obj.lower() in str(d).lower() for d in detected):
-                                        matching_ids.append(media.id)
-                                        break
-            
-            if not matching_ids:
-                return []
-            queryset = Media.objects.filter(id__in=matching_ids)
-        
-        # Filtre par lieux
-        if 'locations' in config:
-            matching_ids = []
-            for media in queryset:
-                try:
-                    analysis = media.analysis
-                    if analysis.detected_locations:
-                        detected = analysis.detected_locations
-                        if isinstance(detected, list):
-                            for loc in config['locations']:
-                                if any(loc.lower() in str(d).lower() for d in detected):
-                                    matching_ids.append(media.id)
-                                    break
-                except (MediaAnalysis.DoesNotExist, MediaAnalysis.MultipleObjectsReturned) as e:
-                    if isinstance(e, MediaAnalysis.MultipleObjectsReturned):
-                        # Utiliser la première analyse en cas de doublons
-                        analysis = MediaAnalysis.objects.filter(media=media).first()
-                        if analysis and analysis.detected_locations:
-                            detected = analysis.detected_locations
-                            if isinstance(detected, list):
-                                for loc in config['locations']:
-                                    if any(loc.lower() in str(d).lower() for d in detected):
-                                        matching_ids.append(media.id)
-                                        break
-            
-            if not matching_ids:
-                return []
-            queryset = Media.objects.filter(id__in=matching_ids)
-        
-        # Filtre par émotions
-        if 'emotions' in config:
-            matching_ids = []
-            for media in queryset:
-                try:
-                    analysis = media.analysis
-                    if analysis.detected_emotions:
-                        detected = analysis.detected_emotions
-                        if isinstance(detected, list):
-                            for emotion in config['emotions']:
-                                if any(emotion.lower() in str(d).lower() for d in detected):
-                                    matching_ids.append(media.id)
-                                    break
-                except (MediaAnalysis.DoesNotExist, MediaAnalysis.MultipleObjectsReturned) as e:
-                    if isinstance(e, MediaAnalysis.MultipleObjectsReturned):
-                        # Utiliser la première analyse en cas de doublons
-                        analysis = MediaAnalysis.objects.filter(media=media).first()
-                        if analysis and analysis.detected_emotions:
-                            detected = analysis.detected_emotions
-                            if isinstance(detected, list):
-                                for emotion in config['emotions']:
-                                    if any(emotion.lower() in str(d).lower() for d in detected):
-                                        matching_ids.append(media.id)
-                                        break
-            
-            if not matching_ids:
-                return []
-            queryset = Media.objects.filter(id__in=matching_ids)
-        
-        # Filtre par couleurs
-        if 'color_keywords' in config:
-            matching_ids = []
-            for media in queryset:
-                try:
-                    analysis = media.analysis
-                    if analysis.dominant_colors:
-                        colors = analysis.dominant_colors
-                        if isinstance(colors, list):
-                            colors_str = ' '.join([str(c) for c in colors]).lower()
-                            for color in config['color_keywords']:
-                                if color.lower() in colors_str:
-                                    matching_ids.append(media.id)
-                                    break
-                except (MediaAnalysis.DoesNotExist, MediaAnalysis.MultipleObjectsReturned) as e:
-                    if isinstance(e, MediaAnalysis.MultipleObjectsReturned):
-                        # Utiliser la première analyse en cas de doublons
-                        analysis = MediaAnalysis.objects.filter(media=media).first()
-                        if analysis and analysis.dominant_colors:
-                            colors = analysis.dominant_colors
-                            if isinstance(colors, list):
-                                colors_str = ' '.join([str(c) for c in colors]).lower()
-                                for color in config['color_keywords']:
-                                    if color.lower() in colors_str:
-                                        matching_ids.append(media.id)
-                                        break
-            
-            if not matching_ids:
-                return []
-            queryset = Media.objects.filter(id__in=matching_ids)
-        
-        # Distinct et ordonné par date décroissante
-        return list(queryset.distinct().order_by('-uploaded_at'))
+        by_id = {media.id: media for media in Media.objects.filter(id__in=media_ids)}
+        return [by_id[media_id] for media_id in media_ids if media_id in by_id]
     
     def get_album_suggestions(self, user: User) -> List[Dict]:
         """
@@ -399,17 +263,18 @@ class SmartAlbumService:
             Liste de suggestions avec nombre de médias potentiels
         """
         suggestions = []
+        matches = album_rule_evaluator.evaluate(user, self.album_rules)
         
         for album_key, config in self.album_rules.items():
-            media_list = self._get_media_by_criteria(user, config)
+            media_ids = matches[album_key]
             
-            if len(media_list) >= config.get('min_media', 1):
+            if len(media_ids) >= config.get('min_media', 1):
                 suggestions.append({
                     'key': album_key,
                     'name': config['name'],
                     'description': config['description'],
                     'icon': config.get('icon', '📁'),
-                    'media_count': len(media_list),
+                    'media_count': len(media_ids),
                     'can_create': True
                 })
         
@@ -417,12 +282,132 @@ class SmartAlbumService:
         suggestions.sort(key=lambda x: x['media_count'], reverse=True)
         return suggestions
     
+    def get_cached_suggestions(self, user: User) -> List[Dict]:
+        """
+        Suggestions depuis le cache ; si la version a changé (ou l'entrée a vieilli),
+        renvoie l'entrée courante et recalcule en arrière-plan
+        """
+        # Version en base (MediaStats) : un upload traité par un autre worker invalide aussi ce cache
+        version = media_stats_service.suggestions_version(user)
+        entry = cache.get(SUGGESTIONS_CACHE_KEY.format(user_id=user.id))
+        if entry is None:
+            # Premier affichage : calcul synchrone (quelques opérations sur l'index)
+            return self._store_suggestions(user, version)
+        
+        is_fresh = (entry['version'] == version
+                    and time.time() - entry['computed_at'] < settings.ALBUM_SUGGESTIONS_MAX_AGE)
+        if not is_fresh and cache.add(SUGGESTIONS_LOCK_KEY.format(user_id=user.id), True, 60):
+            thread = threading.Thread(target=self._refresh_suggestions_async, args=(user.id,))
+            thread.daemon = True
+            thread.start()
+        return entry['suggestions']
+    
+    def suggestions_changed(self, user_id: int) -> None:
+        """Invalide les suggestions d'un utilisateur (upload, analyse, suppression)"""
+        media_stats_service.bump_suggestions_version(user_id)
+    
+    def _store_suggestions(self, user: User, version: int) -> List[Dict]:
+        suggestions = self.get_album_suggestions(user)
+        cache.set(SUGGESTIONS_CACHE_KEY.format(user_id=user.id), {
+            'version': version,
+            'computed_at': time.time(),
+            'suggestions': suggestions,
+        }, None)
+        return suggestions
+    
+    def _refresh_suggestions_async(self, user_id: int) -> None:
+        try:
+            # Version lue avant le calcul : un événement pendant le calcul laisse l'entrée périmée
+            user = User.objects.get(id=user_id)
+            self._store_suggestions(user, media_stats_service.suggestions_version(user))
+        except Exception as e:
+            logger.error(f"❌ Erreur recalcul suggestions (user {user_id}): {e}")
+        finally:
+            cache.delete(SUGGESTIONS_LOCK_KEY.format(user_id=user_id))
+    
+    def evaluate_media(self, media: Media) -> Set[str]:
+        """
+        Clés des règles satisfaites par un seul média
+        
+        Returns:
+            Ensemble de clés de album_rules (O(règles), sans parcourir la bibliothèque)
+        """
+        index = label_index_service.get_index(media.user)
+        now = timezone.now()
+        return {
+            album_key for album_key, config in self.album_rules.items()
+            if index.matches_media(media.id, config, now)
+        }
+    
+    def refresh_media(self, media: Media) -> Dict:
+        """
+        Met à jour l'index et les albums automatiques existants après un changement
+        d'un média (analyse terminée, favori, édition)
+        
+        Returns:
+            Dict avec les noms des albums 'added' et 'removed'
+        """
+        label_index_service.index_media(media)
+        album_rule_evaluator.sync_tokens(media)
+        self.suggestions_changed(media.user_id)
+        rule_keys = self.evaluate_media(media)
+        index = label_index_service.get_index(media.user)
+        
+        albums = list(SmartAlbum.objects.filter(
+            user=media.user, album_type__in=['auto', 'rule']
+        ).select_related('cover_image'))
+        member_of = set(media.smart_albums.filter(
+            album_type__in=['auto', 'rule']
+        ).values_list('id', flat=True))
+        
+        changes = {'added': [], 'removed': []}
+        for album in albums:
+            criteria = album.filter_criteria or {}
+            if album.album_type == 'rule':
+                try:
+                    with index.lock:
+                        should_contain = compile_expression(criteria.get('expression', '')).test(index, media.id)
+                except ExpressionError:
+                    continue
+            else:
+                should_contain = criteria.get('rule_key') in rule_keys
+            if should_contain and album.id not in member_of:
+                # Couverture = média le plus récent
+                is_newest = album.cover_image is None or media.uploaded_at >= album.cover_image.uploaded_at
+                add_members(album, [media], cover=media if is_newest else None)
+                changes['added'].append(album.name)
+            elif not should_contain and album.id in member_of:
+                remove_members(album, [media.id])
+                changes['removed'].append(album.name)
+        
+        if changes['added'] or changes['removed']:
+            logger.info(f"🔄 Albums de {media}: +{changes['added']} -{changes['removed']}")
+        return changes
+    
+    def forget_media(self, media: Media) -> None:
+        """À appeler avant la suppression d'un média : retire ses appartenances et couvertures"""
+        label_index_service.remove_media(media.user_id, media.id)
+        self.suggestions_changed(media.user_id)
+        # Tous types d'albums, pour garder media_count exact
+        for album in SmartAlbum.objects.filter(media=media):
+            remove_members(album, [media.id])
+            if album.album_type == 'moment':
+                moment_service.forget_media(album)
+    
     def update_album(self, album_id: int) -> Optional[SmartAlbum]:
         """
         Met à jour un album intelligent existant
         """
         try:
-            album = SmartAlbum.objects.get(id=album_id, album_type='auto')
+            album = SmartAlbum.objects.get(id=album_id, album_type__in=['auto', 'rule'])
+            
+            if album.album_type == 'rule':
+                index = label_index_service.get_index(album.user)
+                node = compile_expression(album.filter_criteria.get('expression', ''))
+                media_ids = index.ordered(index.select(node))
+                set_members(album, media_ids)
+                logger.info(f"🔄 Album mis à jour: {album.name} ({len(media_ids)} médias)")
+                return album
             
             # Récupérer la règle d'origine
             rule_key = album.filter_criteria.get('rule_key')
@@ -431,20 +416,58 @@ class SmartAlbumService:
                 return None
             
             config = self.album_rules[rule_key]
-            media_list = self._get_media_by_criteria(album.user, config)
+            index = label_index_service.get_index(album.user)
+            media_ids = index.ordered(index.match(config))
             
             # Mettre à jour
-            album.media.set(media_list)
-            if media_list:
-                album.cover_image = media_list[0]
-            album.save()
+            set_members(album, media_ids)
             
-            logger.info(f"🔄 Album mis à jour: {album.name} ({len(media_list)} médias)")
+            logger.info(f"🔄 Album mis à jour: {album.name} ({len(media_ids)} médias)")
             return album
             
         except SmartAlbum.DoesNotExist:
             logger.error(f"❌ Album {album_id} non trouvé")
             return None
+        except ExpressionError as e:
+            logger.warning(f"⚠️ Expression invalide pour l'album {album_id}: {e}")
+            return None
+    
+    def preview_expression(self, user: User, expression: str) -> Dict:
+        """
+        Nombre de médias correspondant à une expression (compteur en direct)
+        
+        Raises:
+            ExpressionError: expression invalide
+        """
+        start = time.perf_counter()
+        node = compile_expression(expression)
+        index = label_index_service.get_index(user)
+        media_ids = index.select(node)
+        return {
+            'count': len(media_ids),
+            'expression': str(node),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+    
+    def create_rule_album(self, user: User, name: str, expression: str, description: str = '') -> SmartAlbum:
+        """
+        Crée un album défini par une expression (ex: objects:beach AND NOT people)
+        
+        Raises:
+            ExpressionError: expression invalide
+        """
+        node = compile_expression(expression)
+        album = SmartAlbum.objects.create(
+            user=user,
+            name=name,
+            album_type='rule',
+            description=description or str(node),
+            filter_criteria={'expression': expression.strip()},
+        )
+        index = label_index_service.get_index(user)
+        set_members(album, index.ordered(index.select(node)))
+        logger.info(f"✅ Album par règle créé: {album.name} ({album.media_count} médias)")
+        return album
     
     def delete_empty_albums(self, user: User) -> int:
         """
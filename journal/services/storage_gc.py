@@ -0,0 +1,194 @@
+"""
+Réconciliation entre MEDIA_ROOT et la base (fichiers orphelins, fichiers manquants)
+Les deux côtés sont parcourus en flux triés et fusionnés (merge-join) : mémoire
+constante quel que soit le nombre de fichiers. Un repère (high-water mark)
+permet de traiter l'arborescence par tranches d'une exécution à l'autre
+"""
+import heapq
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Media, MediaBlob
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_DIR = '.maintenance'  # Sous MEDIA_ROOT, exclu du parcours
+STATE_FILE = 'storage_gc.json'
+QUARANTINE_DIR = 'quarantine'
+IN_PROGRESS_PREFIXES = ('blobs/tmp/',)  # Écritures en cours du stockage par contenu
+
+
+def walk_sorted(root: str, start: str = '') -> Iterator[Tuple[str, float]]:
+    """
+    (chemin relatif, mtime) des fichiers sous root, dans l'ordre des chaînes, après start
+
+    Un répertoire est trié comme 'nom/' : l'ordre du parcours en profondeur est
+    alors exactement l'ordre lexicographique des chemins complets (celui de la base)
+    """
+    def visit(directory: str, prefix: str):
+        try:
+            with os.scandir(directory) as entries:
+                listing = sorted((entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name, entry.path)
+                                 for entry in entries)
+        except OSError as e:
+            logger.warning(f"⚠️ Répertoire illisible {directory}: {e}")
+            return
+        for key, path in listing:
+            relative = prefix + key
+            if key.endswith('/'):
+                if relative == MAINTENANCE_DIR + '/':
+                    continue
+                # Sous-arbre entièrement avant le repère : ignoré sans être lu
+                if relative < start and not start.startswith(relative):
+                    continue
+                yield from visit(path, relative)
+            elif relative > start:
+                try:
+                    yield relative, os.stat(path).st_mtime
+                except OSError:
+                    continue
+
+    return visit(root, '')
+
+
+def referenced_paths(start: str = '') -> Iterator[Tuple[str, Optional[int]]]:
+    """(chemin, media_id ou None pour un blob en attente de balayage) triés par chemin"""
+    originals = (Media.objects.filter(file__gt=start).order_by('file')
+                 .values_list('file', 'id').iterator())
+    thumbnails = (Media.objects.filter(thumbnail__gt=start).order_by('thumbnail')
+                  .values_list('thumbnail', 'id').iterator())
+    blobs = ((path, None) for path in MediaBlob.objects.filter(path__gt=start).order_by('path')
+             .values_list('path', flat=True).iterator())
+    return heapq.merge(originals, thumbnails, blobs, key=lambda row: row[0])
+
+
+def original_paths(start: str = '') -> Iterator[Tuple[str, Optional[int]]]:
+    """Originaux du stockage froid (MEDIA_COLD_ROOT) triés par chemin"""
+    return (Media.objects.filter(original_file__gt=start).order_by('original_file')
+            .values_list('original_file', 'id').iterator())
+
+
+def merge_join(files: Iterator[Tuple[str, float]], references: Iterator[Tuple[str, Optional[int]]],
+               limit: Optional[int] = None) -> Iterator[Tuple[str, str, object]]:
+    """
+    ('orphan', chemin, mtime), ('missing', chemin, media_id) et ('ok', chemin, None)
+
+    Avec limit, s'arrête après limit fichiers : les références au-delà du dernier
+    fichier lu ne sont pas encore jugées
+    """
+    file_row = next(files, None)
+    ref_row = next(references, None)
+    scanned = 0
+    while file_row is not None or ref_row is not None:
+        if file_row is not None and limit is not None and scanned >= limit:
+            return
+        if ref_row is None or (file_row is not None and file_row[0] < ref_row[0]):
+            yield 'orphan', file_row[0], file_row[1]
+            file_row = next(files, None)
+            scanned += 1
+        elif file_row is None or ref_row[0] < file_row[0]:
+            if ref_row[1] is not None:
+                yield 'missing', ref_row[0], ref_row[1]
+            ref_row = next(references, None)
+        else:
+            path = file_row[0]
+            yield 'ok', path, None
+            # Un même fichier peut être référencé plusieurs fois (blobs partagés, vignettes)
+            while ref_row is not None and ref_row[0] == path:
+                ref_row = next(references, None)
+            file_row = next(files, None)
+            scanned += 1
+
+
+class StorageReconciler:
+
+    def __init__(self, root: Optional[str] = None, references=referenced_paths):
+        self.root = str(root or settings.MEDIA_ROOT)
+        self.references = references
+
+    @property
+    def _maintenance_dir(self) -> str:
+        return os.path.join(self.root, MAINTENANCE_DIR)
+
+    def load_mark(self) -> str:
+        try:
+            with open(os.path.join(self._maintenance_dir, STATE_FILE)) as handle:
+                return json.load(handle).get('high_water_mark', '')
+        except (OSError, ValueError):
+            return ''
+
+    def save_mark(self, mark: str) -> None:
+        os.makedirs(self._maintenance_dir, exist_ok=True)
+        state_path = os.path.join(self._maintenance_dir, STATE_FILE)
+        with open(state_path + '.tmp', 'w') as handle:
+            json.dump({'high_water_mark': mark, 'updated_at': timezone.now().isoformat()}, handle)
+        os.replace(state_path + '.tmp', state_path)
+
+    def _dispose(self, path: str, action: str) -> None:
+        source = os.path.join(self.root, path)
+        if action == 'delete':
+            os.remove(source)
+            return
+        target = os.path.join(self._maintenance_dir, QUARANTINE_DIR, timezone.now().strftime('%Y%m%d'), path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(source, target)
+
+    def run(self, action: Optional[str] = None, limit: Optional[int] = None, min_age_hours: float = 1.0,
+            incremental: bool = True, report=None) -> Dict[str, int]:
+        """
+        Une passe (ou une tranche de limit fichiers) de réconciliation
+
+        Args:
+            action: None (rapport), 'quarantine' ou 'delete' pour les orphelins
+            min_age_hours: orphelins plus récents ignorés (upload en cours d'écriture en base)
+            report: callable(kind, path, detail) appelé pour chaque orphelin ou fichier manquant
+        """
+        start = self.load_mark() if incremental else ''
+        cutoff = time.time() - min_age_hours * 3600
+        counts = {'scanned': 0, 'orphans': 0, 'missing': 0, 'disposed': 0, 'skipped_recent': 0}
+        last_path = start
+
+        for kind, path, detail in merge_join(walk_sorted(self.root, start), self.references(start), limit):
+            if kind != 'missing':
+                counts['scanned'] += 1
+                last_path = path
+            if kind == 'ok':
+                continue
+            if kind == 'missing':
+                counts['missing'] += 1
+                if report:
+                    report(kind, path, detail)
+                continue
+            if detail > cutoff or path.startswith(IN_PROGRESS_PREFIXES):
+                counts['skipped_recent'] += 1
+                continue
+            counts['orphans'] += 1
+            if report:
+                report(kind, path, detail)
+            if action:
+                try:
+                    self._dispose(path, action)
+                    counts['disposed'] += 1
+                except OSError as e:
+                    logger.warning(f"⚠️ Impossible de traiter {path}: {e}")
+
+        finished = limit is None or counts['scanned'] < limit
+        if incremental:
+            # Fin de l'arborescence atteinte : la prochaine passe repart du début
+            self.save_mark('' if finished else last_path)
+        counts['finished'] = int(finished)
+        if counts['orphans'] or counts['missing']:
+            logger.info(f"🧹 Stockage : {counts['orphans']} orphelin(s), {counts['missing']} fichier(s) manquant(s)")
+        return counts
+
+
+# Instance globale du service
+storage_reconciler = StorageReconciler()
+cold_storage_reconciler = StorageReconciler(settings.MEDIA_COLD_ROOT, original_paths) if settings.MEDIA_COLD_ROOT else None
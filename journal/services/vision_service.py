@@ -3,13 +3,15 @@ Service d'analyse d'images avec Hugging Face CLIP
 Vision AI pour détection d'objets, couleurs, lieux, émotions
 """
 
-import torch
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw
 from sklearn.cluster import KMeans
+import importlib.util
 import json
 import logging
+import threading
+import time
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Union
 
@@ -21,31 +23,68 @@ except ImportError:
     print("Description enhancer non disponible")
     ENHANCER_AVAILABLE = False
 
-# Imports avec fallback
-try:
-    from transformers import CLIPProcessor, CLIPModel
-    CLIP_AVAILABLE = True
-except ImportError:
+from django.conf import settings
+
+from .inference_sidecar import InferenceClient, SidecarError
+from .model_bundle import CLIP_MODEL_NAME
+
+# torch/transformers ne sont importés qu'au chargement effectif du modèle
+CLIP_AVAILABLE = all(importlib.util.find_spec(m) is not None for m in ('torch', 'transformers'))
+if not CLIP_AVAILABLE:
     print("CLIP non disponible, utilisation du mode fallback")
-    CLIP_AVAILABLE = False
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Profils d'analyse en cascade : familles de prompts CLIP autorisées et budget de latence (ms)
+ANALYSIS_PROFILES = {
+    'quick': {
+        'clip_families': [],
+        'budget_ms': 500,
+        'n_colors': 3,
+    },
+    'standard': {
+        'clip_families': ['objects', 'emotions', 'description'],
+        'budget_ms': 4000,
+        'n_colors': 5,
+    },
+    'deep': {
+        'clip_families': ['objects', 'landmarks', 'emotions', 'description'],
+        'budget_ms': 20000,
+        'n_colors': 5,
+    },
+}
+DEFAULT_PROFILE = 'standard'
+
+# Seuils des pré-filtres bon marché
+FLAT_IMAGE_ENTROPY = 4.0          # Histogramme pauvre : capture d'écran, aplat
+DOCUMENT_COLORFULNESS = 12.0      # Quasi monochrome : document, texte scanné
+LANDMARK_MIN_EDGE_DENSITY = 0.04  # Structures (bâtiments, monuments) = beaucoup d'arêtes
+PRE_FILTER_SIZE = 256
+DEMOTED_CATEGORY_WEIGHT = 0.5     # Poids de tri de 'people' quand Haar ne trouve aucun visage
+
+
 class VisionAIService:
     """Service principal pour l'analyse d'images avec CLIP"""
     
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Initialisation Vision AI sur {self.device}")
-        
-        # Charger le modèle CLIP
-        self.model_name = "openai/clip-vit-base-patch32"
-        self.processor = None
-        self.model = None
-        self._load_models()
+    def __init__(self, socket_path: Optional[str] = None, in_process_fallback: Optional[bool] = None):
+        # Sans sidecar, le modèle CLIP est chargé à la première utilisation ; avec un
+        # sidecar injoignable, seulement si VISION_IN_PROCESS_FALLBACK (sinon l'analyse
+        # échoue jusqu'à la prochaine tentative, INFERENCE_RETRY_AFTER secondes plus tard)
+        socket_path = settings.INFERENCE_SOCKET if socket_path is None else socket_path
+        if in_process_fallback is None:
+            in_process_fallback = settings.VISION_IN_PROCESS_FALLBACK
+        self.model_name = CLIP_MODEL_NAME
+        self.engine = None
+        self._engine_failed = not CLIP_AVAILABLE
+        self._engine_lock = threading.Lock()
+        self.sidecar = (InferenceClient(socket_path, retry_after=settings.INFERENCE_RETRY_AFTER)
+                        if socket_path else None)
+        self.in_process_fallback = in_process_fallback or self.sidecar is None
+        self._face_cascade = None
+        logger.info(f"Initialisation Vision AI ({'sidecar ' + socket_path if socket_path else 'in-process'})")
         
         # Dictionnaires de détection prédéfinis
         self.objects_categories = {
@@ -77,52 +116,145 @@ class VisionAIService:
         }
     
     def _load_models(self):
-        """Charge les modèles CLIP"""
+        """Charge les modèles CLIP dans ce processus"""
         if not CLIP_AVAILABLE:
             logger.warning("⚠️ CLIP non disponible, utilisation du mode simulation")
-            self.processor = None
-            self.model = None
+            self.engine = None
             return
         
         try:
-            logger.info("📥 Chargement du modèle CLIP...")
-            self.processor = CLIPProcessor.from_pretrained(self.model_name)
-            self.model = CLIPModel.from_pretrained(self.model_name)
-            self.model.to(self.device)
-            self.model.eval()
-            logger.info("✅ Modèle CLIP chargé avec succès")
+            from .clip_engine import ClipEngine
+            self.engine = ClipEngine(self.model_name)
         except Exception as e:
             logger.error(f"❌ Erreur lors du chargement de CLIP: {e}")
             logger.info("🔄 Passage en mode simulation")
-            self.processor = None
-            self.model = None
+            self.engine = None
+    
+    def _get_engine(self):
+        """Chargement paresseux (une seule fois) du moteur in-process"""
+        if self.engine is None and not self._engine_failed:
+            with self._engine_lock:
+                if self.engine is None and not self._engine_failed:
+                    self._load_models()
+                    self._engine_failed = self.engine is None
+        return self.engine
+    
+    def loaded_model(self) -> Optional[Dict]:
+        """
+        Modèle CLIP réellement servi : celui du sidecar (décrit après son premier appel réussi,
+        sans nouvel aller-retour ici), ou celui chargé dans ce processus ; None si aucun n'est
+        connu (mode simulation, sidecar injoignable ou pas encore utilisé)
+        """
+        if self.sidecar is not None and not self.sidecar.is_down() and self.sidecar.model_info is not None:
+            return dict(self.sidecar.model_info, source='sidecar')
+        if self.engine is not None:
+            return dict(self.engine.describe(), source='in-process')
+        return None
+    
+    def _clip_enabled(self) -> bool:
+        """
+        CLIP utilisable via le sidecar ou en in-process ; sinon mode simulation, réservé
+        aux installations sans sidecar : avec un sidecar configuré, SidecarError (le média
+        reste non analysé plutôt que de recevoir des résultats simulés).
+        Le sidecar n'est pas pingé : seul un échec d'appel le marque indisponible
+        """
+        if self.sidecar is not None and not self.sidecar.is_down():
+            return True
+        if self.in_process_fallback and self._get_engine() is not None:
+            return True
+        if self.sidecar is not None:
+            raise SidecarError("Sidecar d'inférence injoignable et CLIP in-process indisponible")
+        return False
+    
+    def _clip_scores(self, image: Image.Image, groups: List[List[str]]) -> List[List[float]]:
+        """Probabilités softmax de chaque groupe de prompts pour une image (un seul encodage)"""
+        if self.sidecar is not None:
+            probs = self.sidecar.score(image, groups)
+            if probs is not None:
+                if self.sidecar.model_info is None:
+                    self.sidecar.describe()  # Mémorisé pour loaded_model(), redemandé après une panne
+                return probs
+        engine = self._get_engine() if self.in_process_fallback else None
+        if engine is None:
+            raise SidecarError("Aucun moteur CLIP disponible")
+        return engine.score(image, groups)
     
-    def analyze_image(self, image_path: Union[str, Path]) -> Dict:
+    def analyze_image(self, image_path: Union[str, Path], profile: str = DEFAULT_PROFILE,
+                      budget_ms: Optional[int] = None) -> Dict:
         """
-        Analyse complète d'une image
+        Analyse d'une image en cascade
+
+        Les signaux bon marché (histogramme, visages Haar, densité d'arêtes)
+        sont calculés d'abord et décident des familles CLIP à exécuter ;
+        les familles restantes sont abandonnées dès que le budget est épuisé.
         
         Args:
             image_path: Chemin vers l'image
+            profile: 'quick', 'standard' ou 'deep'
+            budget_ms: Budget de latence, par défaut celui du profil
             
         Returns:
             Dict contenant tous les résultats d'analyse
         """
-        logger.info(f"🔍 Analyse de l'image: {image_path}")
+        logger.info(f"🔍 Analyse de l'image ({profile}): {image_path}")
+        started = time.perf_counter()
+        profile_config = ANALYSIS_PROFILES.get(profile, ANALYSIS_PROFILES[DEFAULT_PROFILE])
+        if budget_ms is None:
+            budget_ms = profile_config['budget_ms']
+        deadline = started + budget_ms / 1000.0
         
         try:
             # Charger l'image
-            image = Image.open(image_path).convert('RGB')
+            image = image_path if isinstance(image_path, Image.Image) else Image.open(image_path)
+            image = image.convert('RGB')
+            
+            # Étape 1 : signaux bon marché
+            signals = self.compute_cheap_signals(image)
+            families = self._plan_clip_families(signals, profile_config['clip_families'])
             
-            # Analyser tous les aspects
             results = {
-                'detected_objects': self.detect_objects(image),
-                'detected_locations': self.detect_landmarks(image),
-                'dominant_colors': self.extract_dominant_colors(image),
-                'detected_emotions': self.detect_emotions(image),
-                'image_description': self.generate_description(image),
+                'detected_objects': [],
+                'detected_locations': [],
+                'dominant_colors': self.extract_dominant_colors(image, n_colors=profile_config['n_colors']),
+                'detected_emotions': [],
+                'detected_faces': signals['faces'],
+                'image_description': '',
                 'confidence_scores': {}
             }
             
+            # Étape 2 : familles CLIP retenues, dans la limite du budget
+            ran, skipped = [], []
+            for family in families:
+                if time.perf_counter() > deadline:
+                    skipped.append(family)
+                    continue
+                if family == 'objects':
+                    # Haar rate les visages de profil ou lointains : 'people' reste testé, classé plus bas
+                    demoted = [] if signals['faces'] else ['people']
+                    results['detected_objects'] = self.detect_objects(image, demoted_categories=demoted)
+                elif family == 'landmarks':
+                    results['detected_locations'] = self.detect_landmarks(image)
+                elif family == 'emotions':
+                    results['detected_emotions'] = self.detect_emotions(image)
+                elif family == 'description':
+                    results['image_description'] = self.generate_description(image)
+                ran.append(family)
+            
+            # Sortie anticipée : compléter avec ce que disent les pré-filtres
+            if 'objects' not in ran:
+                results['detected_objects'] = self._objects_from_signals(signals)
+            if not results['image_description']:
+                results['image_description'] = self._description_from_signals(signals, results['dominant_colors'])
+            
+            results['cascade'] = {
+                'profile': profile,
+                'budget_ms': budget_ms,
+                'signals': signals,
+                'ran': ran,
+                'skipped': skipped,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+            
             # Améliorer les titres et descriptions si le module est disponible
             if ENHANCER_AVAILABLE:
                 try:
@@ -131,7 +263,7 @@ class VisionAIService:
                 except Exception as e:
                     logger.warning(f"⚠️ Amélioration descriptions échouée: {e}")
             
-            logger.info("✅ Analyse terminée avec succès")
+            logger.info(f"✅ Analyse terminée ({results['cascade']['elapsed_ms']} ms, CLIP: {ran or 'aucun'})")
             return results
             
         except Exception as e:
@@ -142,16 +274,116 @@ class VisionAIService:
                 'detected_locations': [],
                 'dominant_colors': [],
                 'detected_emotions': [],
+                'detected_faces': 0,
                 'image_description': '',
                 'confidence_scores': {}
             }
     
-    def detect_objects(self, image: Image.Image, threshold: float = 0.3) -> List[Dict]:
-        """Détecte les objets dans l'image avec CLIP ou simulation"""
+    def compute_cheap_signals(self, image: Image.Image) -> Dict:
+        """Pré-filtres sans CLIP : histogramme de couleurs, visages Haar et densité d'arêtes"""
+        small = image.copy()
+        small.thumbnail((PRE_FILTER_SIZE, PRE_FILTER_SIZE))
+        rgb = np.asarray(small, dtype=np.float32)
+        
+        # Histogramme : entropie sur 4x4x4 cases et "colorfulness" de Hasler-Süsstrunk
+        quantized = (rgb // 64).astype(np.int32)
+        bins = quantized[..., 0] * 16 + quantized[..., 1] * 4 + quantized[..., 2]
+        hist = np.bincount(bins.ravel(), minlength=64).astype(np.float64)
+        hist = hist[hist > 0] / hist.sum()
+        entropy = float(-(hist * np.log2(hist)).sum()) if hist.size else 0.0
+        
+        rg = rgb[..., 0] - rgb[..., 1]
+        yb = 0.5 * (rgb[..., 0] + rgb[..., 1]) - rgb[..., 2]
+        colorfulness = float(np.sqrt(rg.std() ** 2 + yb.std() ** 2) + 0.3 * np.sqrt(rg.mean() ** 2 + yb.mean() ** 2))
+        
+        # Densité d'arêtes (Canny) et visages (Haar) sur l'image en niveaux de gris
+        gray = cv2.cvtColor(np.asarray(small), cv2.COLOR_RGB2GRAY)
+        edges = cv2.Canny(gray, 100, 200)
+        edge_density = float(np.count_nonzero(edges)) / edges.size
+        
+        faces = 0
+        cascade = self._get_face_cascade()
+        if cascade is not None:
+            try:
+                found = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+                faces = int(len(found))
+            except Exception as e:
+                logger.warning(f"⚠️ Détection de visages échouée: {e}")
+        
+        signals = {
+            'entropy': round(entropy, 3),
+            'colorfulness': round(colorfulness, 2),
+            'edge_density': round(edge_density, 4),
+            'faces': faces,
+        }
+        signals['is_flat'] = entropy < FLAT_IMAGE_ENTROPY
+        signals['is_document'] = colorfulness < DOCUMENT_COLORFULNESS
+        logger.info(f"🧮 Pré-filtres: {signals}")
+        return signals
+    
+    def _get_face_cascade(self):
+        """Charge le classifieur Haar une seule fois"""
+        if self._face_cascade is None:
+            try:
+                path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+                cascade = cv2.CascadeClassifier(path)
+                self._face_cascade = cascade if not cascade.empty() else False
+            except Exception as e:
+                logger.warning(f"⚠️ Classifieur Haar indisponible: {e}")
+                self._face_cascade = False
+        return self._face_cascade or None
+    
+    def _plan_clip_families(self, signals: Dict, allowed: List[str]) -> List[str]:
+        """Choisit les familles de prompts CLIP utiles d'après les pré-filtres"""
+        if not allowed:
+            return []
+        
+        # Capture d'écran, aplat ou document : rien à gagner avec CLIP
+        if signals['is_flat'] or (signals['is_document'] and not signals['faces']):
+            logger.info("⏩ Image plate/document - sortie anticipée avant CLIP")
+            return []
+        
+        families = []
+        for family in allowed:
+            if family == 'landmarks' and (signals['faces'] or signals['edge_density'] < LANDMARK_MIN_EDGE_DENSITY):
+                continue
+            families.append(family)
+        return families
+    
+    def _objects_from_signals(self, signals: Dict) -> List[Dict]:
+        """Objets déduits des seuls pré-filtres (profil rapide ou budget épuisé)"""
+        objects = []
+        if signals['faces']:
+            objects.append({
+                'object': 'personne',
+                'category': 'people',
+                'confidence': round(min(0.95, 0.7 + 0.05 * signals['faces']), 3)
+            })
+        if signals['is_document'] or signals['is_flat']:
+            objects.append({'object': 'document', 'category': 'general', 'confidence': 0.6})
+        return objects
+    
+    def _description_from_signals(self, signals: Dict, colors: List[Dict]) -> str:
+        """Description minimale quand aucune famille 'description' n'a tourné"""
+        if signals['is_flat'] or signals['is_document']:
+            return "Document ou capture d'écran"
+        if colors:
+            main_color = colors[0].get('name', 'colorée')
+            return f"Image {main_color} avec {len(colors)} couleurs dominantes"
+        return "Image analysée par Vision AI"
+    
+    def detect_objects(self, image: Image.Image, threshold: float = 0.3,
+                       categories: Optional[List[str]] = None,
+                       demoted_categories: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Détecte les objets dans l'image avec CLIP ou simulation (catégories restreignables) ;
+        les objets des catégories demoted_categories sont gardés mais triés avec une
+        confiance pondérée par DEMOTED_CATEGORY_WEIGHT
+        """
         logger.info("🔍 Détection d'objets...")
         
         # Mode simulation si CLIP n'est pas disponible
-        if self.model is None:
+        if not self._clip_enabled():
             return self._simulate_object_detection(image)
         
         detected_objects = []
@@ -164,27 +396,16 @@ class VisionAIService:
                 'food': ['food', 'cake', 'fruit'],
                 'transport': ['car', 'bike', 'plane']
             }
+            if categories is not None:
+                test_categories = {k: v for k, v in test_categories.items() if k in categories}
             
-            for category, objects in test_categories.items():
-                # Créer les prompts textuels
-                text_inputs = [f"a photo of {obj}" for obj in objects]
-                
-                # Traitement avec CLIP
-                inputs = self.processor(
-                    text=text_inputs, 
-                    images=image, 
-                    return_tensors="pt", 
-                    padding=True
-                ).to(self.device)
-                
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    logits_per_image = outputs.logits_per_image
-                    probs = logits_per_image.softmax(dim=1)
-                
+            # Un seul passage CLIP pour toutes les catégories (softmax par catégorie)
+            groups = [[f"a photo of {obj}" for obj in objects] for objects in test_categories.values()]
+            all_probs = self._clip_scores(image, groups)
+            
+            for (category, objects), probs in zip(test_categories.items(), all_probs):
                 # Extraire les objets détectés avec confiance > threshold
-                for i, (obj, prob) in enumerate(zip(objects, probs[0])):
-                    confidence = prob.item()
+                for obj, confidence in zip(objects, probs):
                     if confidence > threshold:
                         detected_objects.append({
                             'object': obj,
@@ -192,12 +413,18 @@ class VisionAIService:
                             'confidence': round(confidence, 3)
                         })
             
-            # Trier par confiance décroissante
-            detected_objects.sort(key=lambda x: x['confidence'], reverse=True)
+            # Trier par confiance décroissante (pondérée pour les catégories déclassées)
+            demoted = set(demoted_categories or [])
+            detected_objects.sort(
+                key=lambda x: x['confidence'] * (DEMOTED_CATEGORY_WEIGHT if x['category'] in demoted else 1.0),
+                reverse=True,
+            )
             
             logger.info(f"✅ {len(detected_objects)} objets détectés")
             return detected_objects[:10]  # Top 10
             
+        except SidecarError:
+            raise
         except Exception as e:
             logger.error(f"❌ Erreur détection objets: {e}")
             return self._simulate_object_detection(image)
@@ -508,7 +735,7 @@ class VisionAIService:
         logger.info("🏛️ Détection de lieux...")
         
         # Mode simulation si CLIP n'est pas disponible - analyse basée sur les couleurs
-        if self.model is None:
+        if not self._clip_enabled():
             return self._simulate_landmark_detection(image)
         
         detected_locations = []
@@ -523,25 +750,12 @@ class VisionAIService:
                 'Dubai': ['Burj Khalifa', 'Palm Jumeirah']
             }
             
-            for city, landmarks in test_landmarks.items():
-                # Créer les prompts pour les monuments
-                text_inputs = [f"a photo of {landmark}" for landmark in landmarks]
-                
-                inputs = self.processor(
-                    text=text_inputs,
-                    images=image,
-                    return_tensors="pt",
-                    padding=True
-                ).to(self.device)
-                
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    logits_per_image = outputs.logits_per_image
-                    probs = logits_per_image.softmax(dim=1)
-                
+            groups = [[f"a photo of {landmark}" for landmark in landmarks] for landmarks in test_landmarks.values()]
+            all_probs = self._clip_scores(image, groups)
+            
+            for (city, landmarks), probs in zip(test_landmarks.items(), all_probs):
                 # Vérifier les monuments détectés
-                for landmark, prob in zip(landmarks, probs[0]):
-                    confidence = prob.item()
+                for landmark, confidence in zip(landmarks, probs):
                     if confidence > threshold:
                         detected_locations.append({
                             'landmark': landmark,
@@ -553,6 +767,8 @@ class VisionAIService:
             detected_locations.sort(key=lambda x: x['confidence'], reverse=True)
             return detected_locations[:3]
             
+        except SidecarError:
+            raise
         except Exception as e:
             logger.error(f"Erreur détection lieux: {e}")
             return []
@@ -667,50 +883,6 @@ class VisionAIService:
             })
         
         return detected_locations
-        
-        try:
-            # Tester seulement quelques landmarks populaires
-            test_landmarks = {
-                'Paris': ['Eiffel Tower', 'Arc de Triomphe'],
-                'London': ['Big Ben', 'Tower Bridge'],
-                'New York': ['Statue of Liberty', 'Empire State Building']
-            }
-            
-            for city, landmarks in test_landmarks.items():
-                # Créer les prompts pour les monuments
-                text_inputs = [f"a photo of {landmark}" for landmark in landmarks]
-                
-                inputs = self.processor(
-                    text=text_inputs,
-                    images=image,
-                    return_tensors="pt",
-                    padding=True
-                ).to(self.device)
-                
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    logits_per_image = outputs.logits_per_image
-                    probs = logits_per_image.softmax(dim=1)
-                
-                # Vérifier les monuments détectés
-                for landmark, prob in zip(landmarks, probs[0]):
-                    confidence = prob.item()
-                    if confidence > threshold:
-                        detected_locations.append({
-                            'landmark': landmark,
-                            'city': city,
-                            'confidence': round(confidence, 3)
-                        })
-            
-            # Trier par confiance
-            detected_locations.sort(key=lambda x: x['confidence'], reverse=True)
-            
-            logger.info(f"✅ {len(detected_locations)} lieux détectés")
-            return detected_locations[:3]  # Top 3
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur détection lieux: {e}")
-            return []
     
     def extract_dominant_colors(self, image: Image.Image, n_colors: int = 5) -> List[Dict]:
         """Extrait les couleurs dominantes avec K-means"""
@@ -763,7 +935,7 @@ class VisionAIService:
         logger.info("😊 Détection des émotions...")
         
         # Mode simulation si CLIP n'est pas disponible
-        if self.model is None:
+        if not self._clip_enabled():
             return self._simulate_emotion_detection(image)
         
         detected_emotions = []
@@ -776,24 +948,12 @@ class VisionAIService:
                 'dramatic': ['dark', 'intense', 'moody']
             }
             
-            for emotion, keywords in test_emotions.items():
-                # Créer les prompts émotionnels
-                text_inputs = [f"a {keyword} photo" for keyword in keywords]
-                
-                inputs = self.processor(
-                    text=text_inputs,
-                    images=image,
-                    return_tensors="pt",
-                    padding=True
-                ).to(self.device)
-                
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    logits_per_image = outputs.logits_per_image
-                    probs = logits_per_image.softmax(dim=1)
-                
+            groups = [[f"a {keyword} photo" for keyword in keywords] for keywords in test_emotions.values()]
+            all_probs = self._clip_scores(image, groups)
+            
+            for (emotion, keywords), probs in zip(test_emotions.items(), all_probs):
                 # Calculer la confiance moyenne pour cette émotion
-                avg_confidence = probs[0].mean().item()
+                avg_confidence = float(np.mean(probs))
                 
                 if avg_confidence > threshold:
                     detected_emotions.append({
@@ -808,6 +968,8 @@ class VisionAIService:
             logger.info(f"✅ {len(detected_emotions)} émotions détectées")
             return detected_emotions[:3]  # Top 3
             
+        except SidecarError:
+            raise
         except Exception as e:
             logger.error(f"❌ Erreur détection émotions: {e}")
             return self._simulate_emotion_detection(image)
@@ -834,7 +996,7 @@ class VisionAIService:
         logger.info("📝 Génération de description...")
         
         # Mode simulation si CLIP n'est pas disponible
-        if self.model is None:
+        if not self._clip_enabled():
             colors = self.extract_dominant_colors(image)
             if colors:
                 main_color = colors[0].get('name', 'colorée')
@@ -849,26 +1011,18 @@ class VisionAIService:
                 "a colorful image"
             ]
             
-            inputs = self.processor(
-                text=text_inputs,
-                images=image,
-                return_tensors="pt",
-                padding=True
-            ).to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits_per_image = outputs.logits_per_image
-                probs = logits_per_image.softmax(dim=1)
+            probs = self._clip_scores(image, [text_inputs])[0]
             
             # Prendre la description avec la plus haute probabilité
-            best_idx = probs[0].argmax().item()
+            best_idx = int(np.argmax(probs))
             best_description = text_inputs[best_idx]
-            confidence = probs[0][best_idx].item()
+            confidence = probs[best_idx]
             
             logger.info(f"✅ Description générée: {best_description}")
             return f"{best_description} (confidence: {confidence:.3f})"
             
+        except SidecarError:
+            raise
         except Exception as e:
             logger.error(f"❌ Erreur génération description: {e}")
             return "Image analysis completed"
@@ -926,17 +1080,20 @@ class VisionAIService:
 vision_ai_service = VisionAIService()
 
 
-def analyze_media_vision(image_path: Union[str, Path]) -> Dict:
+def analyze_media_vision(image_path: Union[str, Path], profile: str = DEFAULT_PROFILE,
+                         budget_ms: Optional[int] = None) -> Dict:
     """
     Fonction utilitaire pour analyser une image
     
     Args:
         image_path: Chemin vers l'image
+        profile: Profil d'analyse ('quick', 'standard', 'deep')
+        budget_ms: Budget de latence de la requête ou du job
         
     Returns:
         Dict avec les résultats d'analyse
     """
-    return vision_ai_service.analyze_image(image_path)
+    return vision_ai_service.analyze_image(image_path, profile=profile, budget_ms=budget_ms)
 
 
 # Test rapide si exécuté directement
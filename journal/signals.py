@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import UserProfile
+from .models import Media, UserProfile
+from .services.blob_store import blob_store
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -10,4 +11,18 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
\ No newline at end of file
+    instance.userprofile.save()
+
+
+# Compteurs de références des fichiers partagés (stockage adressé par contenu)
+@receiver(post_init, sender=Media)
+def track_media_blob(sender, instance, **kwargs):
+    blob_store.track(instance)
+
+@receiver(post_save, sender=Media)
+def acquire_media_blob(sender, instance, created, **kwargs):
+    blob_store.media_saved(instance, created)
+
+@receiver(post_delete, sender=Media)
+def release_media_blob(sender, instance, **kwargs):
+    blob_store.media_deleted(instance)
@@ -0,0 +1,84 @@
+"""
+Stockage adressé par contenu des fichiers médias
+Le nom d'un fichier est le SHA-256 de son contenu (blobs/ab/cd/<sha256>.<ext>) :
+un même fichier importé plusieurs fois n'est écrit qu'une fois sur le disque
+"""
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+BLOB_PREFIX = 'blobs/'
+
+# Extensions équivalentes ramenées à une seule forme (même contenu -> même blob)
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+
+def is_blob(name) -> bool:
+    return bool(name) and str(name).startswith(BLOB_PREFIX)
+
+
+def blob_name(digest: str, ext: str) -> str:
+    ext = ext.lower()
+    ext = EXTENSION_ALIASES.get(ext, ext)
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{'.' + ext if ext else ''}"
+
+
+def content_digest(content) -> str:
+    sha = hashlib.sha256()
+    for chunk in content.chunks():
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage dont le nom final dépend du contenu, pas du nom proposé
+
+    track_references : fichiers comptés par MediaBlob ; un blob existant n'est réutilisé
+    qu'après l'avoir soustrait au balayage (blob_store.claim), sinon il est réécrit
+    """
+
+    def __init__(self, *args, track_references: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.track_references = track_references
+
+    def get_available_name(self, name, max_length=None):
+        # Un nom existant désigne le même contenu : pas de suffixe aléatoire
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lstrip('.')
+        target = blob_name(content_digest(content), ext)
+        if self.track_references:
+            # Import tardif : models importe ce module
+            from .services.blob_store import blob_store
+            reusable = blob_store.claim(target, content.size) and self.exists(target)
+        else:
+            reusable = self.exists(target)
+        if reusable:
+            return target
+        # Écriture sous un nom temporaire puis renommage atomique : deux imports
+        # simultanés du même contenu écrivent le même fichier sans conflit
+        temporary = super()._save(f'{BLOB_PREFIX}tmp/{uuid.uuid4().hex}', content)
+        os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+        os.replace(self.path(temporary), self.path(target))
+        return target
+
+
+blob_storage = ContentAddressedStorage(track_references=True)
+
+
+def get_blob_storage():
+    """Callable passé à FileField(storage=...) : référencé tel quel par les migrations"""
+    return blob_storage
+
+
+# Originaux remplacés par l'optimisation à l'upload : hors MEDIA_ROOT, jamais servis
+cold_storage = ContentAddressedStorage(location=settings.MEDIA_COLD_ROOT or None, base_url=None)
+
+
+def get_cold_storage():
+    return cold_storage
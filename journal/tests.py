@@ -1,3 +1,77 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+
+from journal.services import emotion_scorer
+
+
+EMOTION_WORDS = {
+    'sadness': 'triste pleurer larmes seul gris',
+    'joy': 'heureux joie super rire soleil',
+    'love': 'amour cher coeur bisou tendresse',
+    'anger': 'colere deteste furieux rage injuste',
+    'fear': 'peur angoisse effraye panique nuit',
+    'surprise': 'incroyable etonne surprise choc inattendu',
+}
+FILLER = ['aujourd', 'hui', 'je', 'me', 'sens', 'vraiment', 'la', 'journee']
+
+
+def toy_corpus(per_label=40, seed=0):
+    """Phrases courtes mêlant mots d'une émotion et mots neutres"""
+    rng = random.Random(seed)
+    texts, labels = [], []
+    for label, words in EMOTION_WORDS.items():
+        vocabulary = words.split() + FILLER
+        for _ in range(per_label):
+            texts.append(' '.join(rng.choice(vocabulary) for _ in range(rng.randint(3, 9))))
+            labels.append(label)
+    return texts, labels
+
+
+class SparseLinearScorerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.texts, self.labels = toy_corpus()
+        self.held_out, _ = toy_corpus(per_label=15, seed=1)
+
+    def assertReproduces(self, pipeline):
+        scorer = emotion_scorer.SparseLinearScorer.from_pipeline(pipeline)
+        report = emotion_scorer.compare(pipeline, scorer, self.held_out)
+        self.assertEqual(report['label_mismatches'], 0)
+        self.assertLess(report['max_probability_delta'], 1e-9)
+        return scorer
+
+    def test_hashing_sgd_pipeline(self):
+        pipeline = Pipeline([
+            ('vectorizer', HashingVectorizer(alternate_sign=True)),
+            ('classifier', SGDClassifier(loss='log_loss', random_state=0)),
+        ]).fit(self.texts, self.labels)
+        scorer = self.assertReproduces(pipeline)
+        # Espace haché de 2^18 lignes : seules celles des termes vus sont gardées
+        self.assertLess(len(scorer.rows), 200)
+        self.assertEqual(scorer.weights.shape, (len(scorer.rows), len(EMOTION_WORDS)))
+
+    def test_tfidf_logistic_regression_pipeline(self):
+        pipeline = Pipeline([
+            ('vectorizer', TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)),
+            ('classifier', LogisticRegression(max_iter=500)),
+        ]).fit(self.texts, self.labels)
+        self.assertReproduces(pipeline)
+
+    def test_save_and_load_keep_compact_weights(self):
+        pipeline = Pipeline([
+            ('vectorizer', HashingVectorizer()),
+            ('classifier', SGDClassifier(loss='log_loss', random_state=0)),
+        ]).fit(self.texts, self.labels)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, emotion_scorer.SCORER_FILE)
+            emotion_scorer.export_scorer(pipeline, path, source_version='test')
+            self.assertLess(os.path.getsize(path), 100 * 1024)
+            scorer = emotion_scorer.SparseLinearScorer.load(path)
+        self.assertEqual(scorer.meta['source_version'], 'test')
+        self.assertEqual(emotion_scorer.compare(pipeline, scorer, self.held_out)['label_mismatches'], 0)
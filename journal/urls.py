@@ -13,6 +13,8 @@ urlpatterns = [
     # Galerie Intelligente
     path('gallery/', views.gallery, name='gallery'),
     path('gallery/upload/', views.media_upload, name='media_upload'),
+    path('gallery/colors/', views.gallery_color_search, name='gallery_color_search'),
+    path('gallery/feed/', views.gallery_feed_json, name='gallery_feed'),
     path('gallery/<int:media_id>/', views.media_detail, name='media_detail'),
     path('gallery/<int:media_id>/edit/', views.media_edit, name='media_edit'),
     path('gallery/<int:media_id>/delete/', views.media_delete, name='media_delete'),
@@ -25,11 +27,13 @@ urlpatterns = [
     path('albums/<int:album_id>/', views_albums.album_detail, name='album_detail'),
     path('albums/create-auto/', views_albums.create_auto_albums, name='create_auto_albums'),
     path('albums/create-manual/', views_albums.create_manual_album, name='create_manual_album'),
+    path('albums/create-rule/', views_albums.create_rule_album, name='create_rule_album'),
     path('albums/<int:album_id>/update/', views_albums.update_album, name='update_album'),
     path('albums/<int:album_id>/delete/', views_albums.delete_album, name='delete_album'),
     path('albums/<int:album_id>/add-media/', views_albums.add_media_to_album, name='add_media_to_album'),
     path('albums/<int:album_id>/remove-media/<int:media_id>/', views_albums.remove_media_from_album, name='remove_media_from_album'),
     path('api/albums/suggestions/', views_albums.album_suggestions_json, name='album_suggestions_json'),
+    path('api/albums/expression-count/', views_albums.album_expression_count, name='album_expression_count'),
     
     path('category/edit/<int:category_id>/', views.edit_category, name='edit_category'),
     path('category/delete/<int:category_id>/', views.delete_category, name='delete_category'),
@@ -52,6 +56,7 @@ urlpatterns = [
     path('tag_create/', views.tag_create, name='tag_create'),
     path('event_create/', views.event_create, name='event_create'),
     path('predict/', views.predict_emotion_api, name='predict_emotion'),
+    path('predict/batch/', views.predict_emotions_api, name='predict_emotions'),
     # Goals CRUD - Using slug instead of pk for MongoDB compatibility
     path('goals/', views.goals_list, name='goals_list'),
     path('goals/create/', views.goal_create, name='goal_create'),
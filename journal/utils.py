@@ -1,9 +1,10 @@
 import re 
 import string
 import joblib
-import numpy as np
 import os
 
+from django.conf import settings
+
 
 def clean_text(text):
     """Clean and process text data"""
@@ -19,37 +20,72 @@ def clean_text(text):
 # Define emotion labels (adjust based on your dataset)
 emotion_labels = {0: 'sadness', 1: 'joy', 2: 'love', 3: 'anger', 4: 'fear', 5: 'surprise'}
 
+def predict_emotions(texts, model=None):
+    """Predict emotions for a batch of texts: one vectorizer pass, one predict_proba call"""
+    if model is None:
+        return [(None, 0.0) for _ in texts]
+    if not texts:
+        return []
+
+    cleaned = [clean_text(text) for text in texts]
+    probabilities = model.predict_proba(cleaned)
+
+    # Same label as model.predict(): the class with the highest probability
+    best = probabilities.argmax(axis=1)
+    return [
+        (emotion_labels.get(model.classes_[column], 'unknown'), float(probabilities[row, column]))
+        for row, column in enumerate(best)
+    ]
+
+
 def predict_emotion(text, model=None):
     """Predict emotion for custom text"""
-    # Clean the text
-    cleaned = clean_text(text)
-    if model == None:
-        return None, 0.0
-    
-    # Predict emotion using cleaned text
-    prediction = model.predict([cleaned])[0]
-    prediction_proba = model.predict_proba([cleaned])[0]
-    
-    # Get emotion label and confidence
-    emotion = emotion_labels.get(prediction, 'unknown')
-    confidence = np.max(prediction_proba)
-    
-    return emotion, confidence
+    return predict_emotions([text], model)[0]
+
+# Load the model using absolute path (directory of the journal app)
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lr_model.pkl')
+SCORER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lr_model.scorer.npz')
+
 
-# Load the model using absolute path
 def load_model():
-    """Load the emotion prediction model"""
+    """
+    Load the emotion prediction model and its version: the active bundle written by
+    train_emotion_model (EMOTION_MODEL_VERSION pins one), else the legacy lr_model.pkl.
+    The exported sparse scorer (export_emotion_scorer) is preferred over the joblib pipeline
+    """
+    from .services.emotion_scorer import SCORER_FILE, load_scorer
+    from .services.model_bundle import EMOTION_MODEL_FILE, EMOTION_MODEL_NAME, active_bundle
+
+    bundle = active_bundle(EMOTION_MODEL_NAME, version=settings.EMOTION_MODEL_VERSION)
+    if bundle:
+        scorer = load_scorer(os.path.join(bundle['path'], SCORER_FILE))
+        if scorer:
+            return scorer, bundle['version']
+        try:
+            return joblib.load(os.path.join(bundle['path'], EMOTION_MODEL_FILE)), bundle['version']
+        except Exception as e:
+            print(f"Error loading model bundle {bundle['version']}: {e}")
+    version = model_version()
+    scorer = load_scorer(SCORER_PATH, source_version=version)
+    if scorer:
+        return scorer, version
     try:
-        # Get the directory of the current file (journal app)
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(current_dir, 'lr_model.pkl')
-        return joblib.load(model_path)
+        return joblib.load(MODEL_PATH), version
     except Exception as e:
         print(f"Error loading model: {e}")
+        return None, None
+
+
+def model_version(path=MODEL_PATH):
+    """Identify the model file (size and mtime), used in prediction cache keys"""
+    try:
+        stat = os.stat(path)
+    except OSError:
         return None
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
 
 
-lr_model = load_model()
+lr_model, lr_model_version = load_model()
 
         # -----------------------
         # GOAL ML MODELS
@@ -12,7 +12,6 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, Http404
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.contrib import messages
 from django import forms
@@ -34,6 +33,7 @@ from .forms import (
     GalleryFilterForm,
     MediaTagForm,
     NoteForm,
+    NoteSearchForm,
     GoalForm,
 )
 
@@ -50,14 +50,23 @@ from .models import (
 )
 
 from .utils import (
-    lr_model,
     clean_text,
-    predict_emotion,
     predict_goal_duration,
     generate_motivation_message,
 )
 
 
+from .services.color_index import build_lab_palette, color_index_service
+from .services.exif_service import extract_exif
+from .services.image_optimizer import image_optimizer
+from .services.emotion_cache import emotion_cache
+from .services.note_enrichment import note_enrichment_service
+from .services.note_search import highlight, note_search_service
+from .services.smart_album_service import smart_album_service
+from .services.moment_service import moment_service
+from .services.media_stats import media_counters, media_stats_service
+from .services.search_index import search_index_service
+from .services import gallery_feed
 from .recommendation_engine import recommendation_engine
 from .perplexity_service import perplexity_service
 
@@ -109,15 +118,8 @@ def create_note(request):
             raw_content = form.cleaned_data.get('content', '')
             note.content = re.sub(r'</?p>', '', raw_content)
             
-            # Predict emotion for the note content
-            if lr_model and note.content:
-                try:
-                    emotion, confidence = predict_emotion(note.content, lr_model)
-                    if emotion:
-                        note.emotion = emotion
-                        note.emotion_confidence = float(confidence * 100)
-                except Exception as e:
-                    print(f"Error predicting emotion: {e}")
+            # Emotion and other derived fields are filled in after the save
+            note.enrichment_status = Note.ENRICHMENT_PENDING
             
             # If the form returned a numeric PK for category (ChoiceField fallback),
             # assign it to category_id so the FK is set correctly.
@@ -132,6 +134,8 @@ def create_note(request):
                 pass
 
             note.save()
+            note_search_service.index_notes([note.id])
+            note_enrichment_service.enqueue(note)
             return redirect('view_notes')
         else:
             print(f"Form validation errors for create_note: {form.errors}")
@@ -153,17 +157,13 @@ def edit_note(request, note_id):
             note.title = title
             note.content = content
             
-            # Predict emotion for the updated content
-            if lr_model and note.content:
-                try:
-                    emotion, confidence = predict_emotion(note.content, lr_model)
-                    if emotion:
-                        note.emotion = emotion
-                        note.emotion_confidence = float(confidence * 100)
-                except Exception as e:
-                    print(f"Error predicting emotion: {e}")
+            # Re-enriched after the save (emotion skipped when only the title changed);
+            # a result computed for the previous content is discarded
+            note.enrichment_status = Note.ENRICHMENT_PENDING
             
             note.save()
+            note_search_service.index_notes([note.id])
+            note_enrichment_service.enqueue(note)
             if category_id:
                 return redirect('notes_by_category', category_id=int(category_id))
             return redirect('view_notes')
@@ -185,7 +185,9 @@ def delete_note(request, note_id):
     note = get_object_or_404(Note, id=note_id, user=request.user)
     if request.method == 'POST':
         category_id = request.POST.get('category_id')
+        note_id = note.id
         note.delete()
+        note_search_service.remove_note(request.user.id, note_id)
         if category_id:
             return redirect('notes_by_category', category_id=int(category_id))
         return redirect('view_notes')
@@ -207,6 +209,9 @@ def dashboard(request):
     import datetime
     from datetime import timedelta
     
+    # Worker redémarré : son thread reprend les notes restées en attente
+    note_enrichment_service.resume()
+    
     try:
         # Récupérer les notes de l'utilisateur
         user_notes = list(Note.objects.filter(user=request.user))
@@ -1076,62 +1081,154 @@ def toggle_milestone(request, slug):
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
 
-@login_required
-def gallery(request):
-    """Vue principale de la galerie avec filtres et recherche"""
-    try:
-        media_list = Media.objects.filter(user=request.user)
-    except Exception as e:
-        logger.exception('Erreur récupération médias: %s', e)
-        media_list = Media.objects.none()
+def _filtered_gallery(request):
+    """
+    Médias de l'utilisateur restreints par le formulaire de filtres
 
+    Returns:
+        (formulaire, queryset filtré non trié, tri, ids classés ou None)
+        Les ids classés (pertinence de la recherche, proximité de couleur) imposent l'ordre
+    """
+    media_list = Media.objects.filter(user=request.user)
     filter_form = GalleryFilterForm(user=request.user, data=request.GET or None)
-    if filter_form.is_valid():
-        search_query = filter_form.cleaned_data.get('search')
-        if search_query:
+    if not filter_form.is_valid():
+        return filter_form, media_list, gallery_feed.DEFAULT_SORT, None
+
+    search_query = filter_form.cleaned_data.get('search')
+    ranked_ids = None
+    if search_query:
+        # Index BM25 : titre, description, tags et métadonnées IA, avec complétion des préfixes
+        try:
+            ranked_ids = [mid for mid, _ in search_index_service.search(request.user, search_query)]
+            media_list = media_list.filter(id__in=ranked_ids)
+        except Exception as e:
+            logger.exception('Erreur index de recherche: %s', e)
             media_list = media_list.filter(Q(title__icontains=search_query) | Q(description__icontains=search_query) | Q(tags__name__icontains=search_query)).distinct()
 
-        media_type = filter_form.cleaned_data.get('media_type')
-        if media_type:
-            media_list = media_list.filter(media_type=media_type)
+    media_type = filter_form.cleaned_data.get('media_type')
+    if media_type:
+        media_list = media_list.filter(media_type=media_type)
 
-        category = filter_form.cleaned_data.get('category')
-        if category:
-            media_list = media_list.filter(category=category)
+    category = filter_form.cleaned_data.get('category')
+    if category:
+        media_list = media_list.filter(category=category)
 
-        is_favorite = filter_form.cleaned_data.get('is_favorite')
-        if is_favorite:
-            media_list = media_list.filter(is_favorite=True)
+    is_favorite = filter_form.cleaned_data.get('is_favorite')
+    if is_favorite:
+        media_list = media_list.filter(is_favorite=True)
 
-        is_analyzed = filter_form.cleaned_data.get('is_analyzed')
-        if is_analyzed:
-            media_list = media_list.filter(is_analyzed=True)
+    is_analyzed = filter_form.cleaned_data.get('is_analyzed')
+    if is_analyzed:
+        media_list = media_list.filter(is_analyzed=True)
 
-        sort_by = filter_form.cleaned_data.get('sort_by') or '-uploaded_at'
-        media_list = media_list.order_by(sort_by)
-    else:
-        media_list = media_list.order_by('-uploaded_at')
+    sort_by = filter_form.cleaned_data.get('sort_by') or ('relevance' if search_query else gallery_feed.DEFAULT_SORT)
+    if sort_by != 'relevance':
+        ranked_ids = None
+    elif ranked_ids is None:
+        sort_by = gallery_feed.DEFAULT_SORT
+
+    # Recherche par couleur : classement par proximité dans l'espace Lab
+    color = filter_form.cleaned_data.get('color')
+    if color:
+        try:
+            ranked_ids = [mid for mid, _ in color_index_service.search_by_color(request.user, color, limit=200)]
+        except ValueError:
+            ranked_ids = []
+        media_list = media_list.filter(id__in=ranked_ids)
 
+    return filter_form, media_list, sort_by, ranked_ids
+
+
+@login_required
+def gallery(request):
+    """Vue principale de la galerie avec filtres et recherche (suite chargée par gallery_feed)"""
+    filter_form, media_list, sort_by, ranked_ids = _filtered_gallery(request)
     try:
-        stats = {
-            'total_media': Media.objects.filter(user=request.user).count(),
-            'total_images': Media.objects.filter(user=request.user, media_type='image').count(),
-            'total_videos': Media.objects.filter(user=request.user, media_type='video').count(),
-            'total_analyzed': Media.objects.filter(user=request.user, is_analyzed=True).count(),
-            'total_favorites': Media.objects.filter(user=request.user, is_favorite=True).count(),
-        }
+        media_page, next_cursor = gallery_feed.feed_page(media_list, sort_by, ranked_ids)
+    except Exception as e:
+        logger.exception('Erreur récupération médias: %s', e)
+        media_page, next_cursor = [], None
+
+    try:
+        stats = media_stats_service.get(request.user)
     except Exception as e:
         logger.exception('Erreur stats: %s', e)
-        stats = {'total_media': 0, 'total_images': 0, 'total_videos': 0, 'total_analyzed': 0, 'total_favorites': 0}
+        stats = {'total': 0, 'images': 0, 'videos': 0, 'analyzed': 0, 'favorites': 0}
 
-    paginator = Paginator(media_list, 12)
-    page_number = request.GET.get('page')
-    media_page = paginator.get_page(page_number)
+    feed_query = request.GET.copy()
+    for key in ('cursor', 'page'):
+        feed_query.pop(key, None)
 
-    context = {'media_list': media_page, 'filter_form': filter_form, 'stats': stats, 'view_mode': request.GET.get('view', 'grid')}
+    context = {
+        'media_list': media_page,
+        'filter_form': filter_form,
+        'stats': stats,
+        'view_mode': request.GET.get('view', 'grid'),
+        'next_cursor': next_cursor,
+        'feed_query': feed_query.urlencode(),
+    }
     return render(request, 'gallery.html', context)
 
 
+@login_required
+def gallery_feed_json(request):
+    """API JSON : page suivante de la galerie (?cursor=...), mêmes filtres et tris que la galerie"""
+    try:
+        limit = max(1, min(gallery_feed.MAX_PAGE_SIZE, int(request.GET.get('limit', gallery_feed.PAGE_SIZE))))
+    except ValueError:
+        limit = gallery_feed.PAGE_SIZE
+
+    _, media_list, sort_by, ranked_ids = _filtered_gallery(request)
+    try:
+        media_page, next_cursor = gallery_feed.feed_page(
+            media_list, sort_by, ranked_ids, cursor=request.GET.get('cursor') or None, limit=limit
+        )
+    except gallery_feed.CursorError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'items': gallery_feed.serialize_page(media_page),
+        'next_cursor': next_cursor,
+    })
+
+
+@login_required
+def gallery_color_search(request):
+    """API JSON : photos proches d'une couleur (?color=#3366cc) ou d'une palette (?like=<media_id>)"""
+    color = request.GET.get('color', '').strip()
+    like = request.GET.get('like', '').strip()
+    try:
+        limit = max(1, min(200, int(request.GET.get('limit', 50))))
+    except ValueError:
+        limit = 50
+
+    try:
+        if like:
+            ranked = color_index_service.search_like_media(request.user, int(like), limit=limit)
+        elif color:
+            ranked = color_index_service.search_by_color(request.user, color, limit=limit)
+        else:
+            return JsonResponse({'success': False, 'error': 'Paramètre color ou like requis'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    media_by_id = {m.id: m for m in Media.objects.filter(user=request.user, id__in=[mid for mid, _ in ranked])}
+    results = []
+    for media_id, score in ranked:
+        media = media_by_id.get(media_id)
+        if media is None:
+            continue
+        results.append({
+            'id': media.id,
+            'title': media.title or '',
+            'url': media.file.url if media.file else None,
+            'thumbnail': media.thumbnail.url if media.thumbnail else None,
+            'score': score,
+        })
+    return JsonResponse({'success': True, 'results': results})
+
+
 @login_required
 def hello(request):
     return render(request, 'hello.html')
@@ -1189,8 +1286,61 @@ def tags(request):
     return render(request, 'tags.html')
 
 
+SEARCH_RESULTS_LIMIT = 100
+
+
+def _search_notes(request, notes):
+    """
+    Applique la recherche et les filtres (?q=, emotion, date_from, date_to) à la liste des notes
+    Avec q : index BM25 (titre, contenu), notes classées par pertinence et extraits surlignés ;
+    les filtres restent appliqués en base, sur les valeurs à jour
+    """
+    form = NoteSearchForm(request.GET or None)
+    if not form.has_filters() or not hasattr(notes, 'filter'):
+        return form, notes
+    # Champs invalides absents de cleaned_data (ex. ?q=plage&date_to=mauvaise) : les autres s'appliquent
+    query = form.cleaned_data.get('q', '').strip()
+    emotion = form.cleaned_data.get('emotion') or None
+    date_from, date_to = form.cleaned_data.get('date_from'), form.cleaned_data.get('date_to')
+
+    if emotion:
+        notes = notes.filter(emotion=emotion)
+    # Bornes en datetime (pas de lookup __date sous Djongo)
+    if date_from:
+        notes = notes.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        notes = notes.filter(created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    if not query:
+        return form, notes
+
+    try:
+        ranked = note_search_service.search(request.user, query)
+        terms = note_search_service.matched_terms(request.user, query)
+    except Exception as e:
+        logger.exception('Erreur index de recherche des notes: %s', e)
+        notes = notes.filter(Q(title__icontains=query) | Q(content__icontains=query))
+        return form, notes
+
+    # Notes classées relues par lots à travers les filtres, jusqu'à SEARCH_RESULTS_LIMIT
+    results = []
+    for start in range(0, len(ranked), SEARCH_RESULTS_LIMIT):
+        chunk = [note_id for note_id, _ in ranked[start:start + SEARCH_RESULTS_LIMIT]]
+        by_id = {note.id: note for note in notes.filter(id__in=chunk)}
+        for note_id in chunk:
+            note = by_id.get(note_id)
+            if note is None:
+                continue
+            note.search_title = highlight(note.title, terms, width=None)
+            note.search_snippet = highlight(note.content, terms)
+            results.append(note)
+            if len(results) == SEARCH_RESULTS_LIMIT:
+                return form, results
+    return form, results
+
+
 @login_required
 def view_notes(request):
+    note_enrichment_service.resume()
     # Chargement des catégories avec fallback MongoDB
     categories = []
     try:
@@ -1231,10 +1381,12 @@ def view_notes(request):
         categories = []
     
     notes = Note.objects.filter(user=request.user).order_by('-created_at')
+    search_form, notes = _search_notes(request, notes)
     context = {
         'categories': categories,
         'notes': notes,
         'category': None,  # Pas de catégorie filtrée pour cette vue
+        'search_form': search_form,
     }
     return render(request, 'view_notes.html', context)
 
@@ -1353,10 +1505,12 @@ def notes_by_category(request, category_id):
             notes = Note.objects.filter(user=request.user).order_by('-created_at')
             categories = []
 
+    search_form, notes = _search_notes(request, notes)
     context = {
         'category': category,
         'notes': notes,
         'categories': categories,
+        'search_form': search_form,
     }
     return render(request, 'view_notes.html', context)
 
@@ -1376,7 +1530,6 @@ def predict_emotion_api(request):
     """API endpoint to predict emotion from text"""
     try:
         import json
-        from .utils import predict_emotion as predict_func, lr_model
         
         # Get text from POST request
         data = json.loads(request.body)
@@ -1385,8 +1538,8 @@ def predict_emotion_api(request):
         if not text:
             return JsonResponse({'error': 'No text provided'}, status=400)
         
-        # Predict emotion
-        emotion, confidence = predict_func(text, lr_model)
+        # Predict emotion (cached: the editor's live preview sends the same text repeatedly)
+        emotion, confidence = emotion_cache.predict(text)
         
         if emotion is None:
             return JsonResponse({'error': 'Model not available'}, status=500)
@@ -1403,6 +1556,44 @@ def predict_emotion_api(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+MAX_PREDICT_BATCH = 100
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def predict_emotions_api(request):
+    """API endpoint to predict emotions for a list of texts in one model call"""
+    import json
+    from .utils import lr_model
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    texts = data.get('texts') if isinstance(data, dict) else None
+    if not isinstance(texts, list) or not texts:
+        return JsonResponse({'error': 'No texts provided'}, status=400)
+    if len(texts) > MAX_PREDICT_BATCH:
+        return JsonResponse({'error': f'At most {MAX_PREDICT_BATCH} texts per request'}, status=400)
+    if not all(isinstance(text, str) for text in texts):
+        return JsonResponse({'error': 'Texts must be strings'}, status=400)
+    if not lr_model:
+        return JsonResponse({'error': 'Model not available'}, status=500)
+
+    try:
+        predictions = emotion_cache.predict_many(texts)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({
+        'predictions': [
+            {'emotion': emotion, 'confidence': confidence}
+            for emotion, confidence in predictions
+        ]
+    })
+
+
 @login_required
 def generate_recommendations(request, note_id):
     """Génère des recommandations d'activités pour une note spécifique"""
@@ -1606,10 +1797,27 @@ def media_upload(request):
                     try:
                         img = Image.open(validated_file)
                         media.width, media.height = img.size
+                        exif = extract_exif(img)
+                        media.taken_at, media.latitude, media.longitude = (
+                            exif['taken_at'], exif['latitude'], exif['longitude']
+                        )
                     except Exception as e:
                         print(f"Erreur extraction dimensions: {e}")
+                    # Après l'EXIF : la version optimisée n'en garde que l'orientation
+                    image_optimizer.apply(media, validated_file)
                 
                 media.save()
+                media_stats_service.record(media.user_id, after=media_counters(media))
+                search_index_service.index_media(media)
+                
+                if media.media_type == 'image':
+                    moment_service.assign(media)
+                smart_album_service.suggestions_changed(request.user.id)
+                
+                # Analyse rapide synchrone, puis analyse approfondie différée
+                if media.media_type == 'image' and analyze_media_vision:
+                    start_media_analysis(media.id)
+                
                 messages.success(request, f'✅ Média "{media.title or validated_file.name}" uploadé avec succès!')
                 
                 return redirect('gallery')
@@ -1713,18 +1921,27 @@ def media_upload(request):
                         try:
                             img = Image.open(file_data['file'])
                             media.width, media.height = img.size
+                            exif = extract_exif(img)
+                            media.taken_at, media.latitude, media.longitude = (
+                                exif['taken_at'], exif['latitude'], exif['longitude']
+                            )
                         except Exception as e:
                             print(f"Erreur extraction dimensions: {e}")
+                        image_optimizer.apply(media, file_data['file'])
                     
                     media.save()
+                    media_stats_service.record(media.user_id, after=media_counters(media))
+                    search_index_service.index_media(media)
                     uploaded_count += 1
                     
-                    # Lancer analyse IA si auto_analyze est True
-                    if file_data['auto_analyze'] and media.media_type == 'image':
-                        print(f"🤖 Lancement analyse IA pour {media.file.name}")
-                        thread = threading.Thread(target=analyze_media_async, args=(media.id,))
-                        thread.daemon = True
-                        thread.start()
+                    if media.media_type == 'image':
+                        moment_service.assign(media)
+                    smart_album_service.suggestions_changed(request.user.id)
+                    
+                    # Analyse rapide synchrone, puis analyse approfondie différée,
+                    # si l'analyse IA est cochée pour tous les fichiers et pour celui-ci
+                    if auto_analyze and file_data['auto_analyze'] and media.media_type == 'image' and analyze_media_vision:
+                        start_media_analysis(media.id)
                     
                 except Exception as e:
                     messages.error(request, f'❌ Erreur upload {file.name}: {str(e)}')
@@ -1738,9 +1955,6 @@ def media_upload(request):
         multiple_form = MultipleMediaUploadForm(user=request.user)
     
     # Récupérer les catégories de l'utilisateur connecté avec PyMongo
-    from pymongo import MongoClient
-    from django.conf import settings
-    
     mongo_uri = settings.DATABASES['default']['CLIENT']['host']
     client = MongoClient(mongo_uri)
     db = client['journalDB']
@@ -1819,14 +2033,18 @@ def media_detail(request, media_id):
                 tag.source = 'manual'
                 try:
                     tag.save()
+                    search_index_service.index_media(media)
                     messages.success(request, f'✅ Tag "{tag.name}" ajouté!')
                 except Exception as e:
                     messages.error(request, f'❌ Ce tag existe déjà.')
                 return redirect('media_detail', media_id=media.id)
         
         elif action == 'toggle_favorite':
+            before = media_counters(media)
             media.is_favorite = not media.is_favorite
             media.save()
+            media_stats_service.record(media.user_id, before, media_counters(media))
+            smart_album_service.refresh_media(media)
             return JsonResponse({'success': True, 'is_favorite': media.is_favorite})
         
         elif action == 'analyze':
@@ -1897,17 +2115,8 @@ def media_edit(request, media_id):
             try:
                 validated_file = edit_form.clean_file()
                 
-                # Supprimer l'ancien fichier
-                if media.file:
-                    try:
-                        import os
-                        old_file_path = media.file.path
-                        if os.path.exists(old_file_path):
-                            os.remove(old_file_path)
-                    except Exception as e:
-                        print(f"Erreur suppression ancien fichier: {e}")
-                
-                # Remplacer par le nouveau fichier
+                # Remplacer par le nouveau fichier (l'ancien, s'il n'est plus référencé,
+                # est libéré par le signal post_save ou récupéré par reconcile_storage)
                 media.file = validated_file
                 
                 # Extraire les nouvelles dimensions
@@ -1918,6 +2127,7 @@ def media_edit(request, media_id):
                         media.width, media.height = img.size
                     except Exception as e:
                         print(f"Erreur extraction dimensions: {e}")
+                image_optimizer.apply(media, validated_file)
                 
             except forms.ValidationError as e:
                 messages.error(request, str(e.message))
@@ -1933,6 +2143,7 @@ def media_edit(request, media_id):
             media.title = request.POST.get('title', '')
             media.description = request.POST.get('description', '')
             media.album = request.POST.get('album', '')
+            before = media_counters(media)
             media.is_favorite = 'is_favorite' in request.POST
             
             # Gérer la catégorie
@@ -1946,6 +2157,9 @@ def media_edit(request, media_id):
                 media.category = None
             
             media.save()
+            media_stats_service.record(media.user_id, before, media_counters(media))
+            smart_album_service.refresh_media(media)
+            search_index_service.index_media(media)
             
             if new_file:
                 messages.success(request, '✅ Média et image mis à jour avec succès!')
@@ -1980,17 +2194,14 @@ def media_delete(request, media_id):
     
     if request.method == 'POST':
         try:
-            # Supprimer le fichier physique
-            if media.file:
-                if os.path.isfile(media.file.path):
-                    os.remove(media.file.path)
-            
-            if media.thumbnail:
-                if os.path.isfile(media.thumbnail.path):
-                    os.remove(media.thumbnail.path)
-            
+            # Fichiers physiques hors requête : blob libéré par le signal post_delete,
+            # vignette et anciens fichiers supprimés par la commande reconcile_storage
             media_title = media.title or media.file.name
+            smart_album_service.forget_media(media)
+            before = media_counters(media)
             media.delete()
+            media_stats_service.record(request.user.id, before=before)
+            search_index_service.remove_media(request.user.id, media_id)
             
             messages.success(request, f'✅ "{media_title}" supprimé avec succès!')
             return redirect('gallery')
@@ -2014,6 +2225,7 @@ def media_delete_tag(request, media_id, tag_id):
     
     tag_name = tag.name
     tag.delete()
+    search_index_service.index_media(media)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True, 'message': f'Tag "{tag_name}" supprimé'})
@@ -2022,8 +2234,26 @@ def media_delete_tag(request, media_id, tag_id):
     return redirect('media_detail', media_id=media.id)
 
 
-def analyze_media_async(media_id):
-    """Fonction pour analyser un média en arrière-plan"""
+def start_media_analysis(media_id):
+    """
+    Analyse d'un média à l'upload : pré-filtres du profil rapide en synchrone,
+    puis profil différé dans un thread (c'est lui qui marque le média analysé)
+    """
+    if settings.VISION_UPLOAD_PROFILE != settings.VISION_DEFERRED_PROFILE:
+        analyze_media_async(media_id, profile=settings.VISION_UPLOAD_PROFILE, preliminary=True)
+    thread = threading.Thread(target=analyze_media_async, args=(media_id,))
+    thread.daemon = True
+    thread.start()
+
+
+def analyze_media_async(media_id, profile=None, preliminary=False):
+    """
+    Fonction pour analyser un média en arrière-plan (profil différé par défaut)
+
+    preliminary : signaux rapides enregistrés dans MediaAnalysis seulement ; le média
+    n'est pas marqué analysé et ne reçoit ni titre ni tags IA (l'analyse différée suit)
+    """
+    profile = profile or settings.VISION_DEFERRED_PROFILE
     try:
         # Gérer les différents types d'ID (ObjectId MongoDB ou entier Django)
         media = Media.objects.get(id=media_id)
@@ -2033,10 +2263,16 @@ def analyze_media_async(media_id):
             print(f"⚠️ Analyse IA non supportée pour {media.media_type}")
             return
         
-        print(f"🔍 Démarrage analyse IA pour {media.file.name}")
+        print(f"🔍 Démarrage analyse IA ({profile}) pour {media.file.name}")
         
         # Lancer l'analyse Vision AI
-        results = analyze_media_vision(media.file.path)
+        results = analyze_media_vision(media.file.path, profile=profile,
+                                       budget_ms=settings.VISION_LATENCY_BUDGET_MS)
+        # Analyse en échec (CLIP injoignable, image illisible) : rien n'est enregistré,
+        # le média reste non analysé et pourra être réanalysé
+        if results.get('error'):
+            print(f"⚠️ Analyse IA non enregistrée pour {media.file.name}: {results['error']}")
+            return
         
         # SOLUTION DJONGO : Supprimer toutes les anciennes analyses pour éviter les doublons
         try:
@@ -2051,12 +2287,17 @@ def analyze_media_async(media_id):
         analysis.detected_objects = [obj['object'] for obj in results.get('detected_objects', [])]
         analysis.detected_locations = [f"{loc['landmark']}, {loc['city']}" for loc in results.get('detected_locations', [])]
         analysis.dominant_colors = [color['hex'] for color in results.get('dominant_colors', [])]
+        analysis.color_palette = build_lab_palette(results.get('dominant_colors', []))
         analysis.detected_emotions = [emo['emotion'] for emo in results.get('detected_emotions', [])]
+        analysis.detected_faces = results.get('detected_faces', 0)
         analysis.ai_description = results.get('image_description', '')
+        analysis.vision_api_used = f"clip:{profile}"
         
         # Générer un titre basé sur les objets détectés
         objects = results.get('detected_objects', [])
-        if objects:
+        if preliminary:
+            analysis.ai_title = ''
+        elif objects:
             top_objects = [obj['object'] for obj in objects[:3]]
             analysis.ai_title = f"Photo avec {', '.join(top_objects)}"
         else:
@@ -2070,9 +2311,17 @@ def analyze_media_async(media_id):
         analysis.save()
         print(f"💾 Analyse sauvegardée : {analysis.ai_title}")
         
+        if preliminary:
+            search_index_service.index_media(media)
+            print(f"✅ Signaux rapides enregistrés pour {media.file.name}")
+            return
+        
         # Marquer le média comme analysé
+        before = media_counters(media)
         media.is_analyzed = True
         media.save()
+        media_stats_service.record(media.user_id, before, media_counters(media))
+        smart_album_service.refresh_media(media)
         
         # Supprimer les anciens tags IA pour éviter les doublons
         try:
@@ -2096,6 +2345,8 @@ def analyze_media_async(media_id):
             except Exception as e:
                 print(f"⚠️ Erreur création tag '{obj_data['object']}': {e}")
         
+        search_index_service.index_media(media)
+        
         print(f"✅ Analyse IA terminée pour {media.file.name}")
         
     except Exception as e:
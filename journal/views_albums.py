@@ -7,6 +7,8 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from .models import SmartAlbum, Media
+from .services.album_membership import add_members, remove_members
+from .services.album_expression import ExpressionError
 from .services.smart_album_service import smart_album_service
 import json
 
@@ -27,12 +29,19 @@ def smart_albums_list(request):
         album_type='manual'
     ).select_related('cover_image')
     
-    # Suggestions d'albums potentiels
-    suggestions = smart_album_service.get_album_suggestions(request.user)
+    # Albums définis par une expression
+    rule_albums = SmartAlbum.objects.filter(
+        user=request.user,
+        album_type='rule'
+    ).select_related('cover_image')
+    
+    # Suggestions d'albums potentiels (cache versionné)
+    suggestions = smart_album_service.get_cached_suggestions(request.user)
     
     context = {
         'auto_albums': auto_albums,
         'manual_albums': manual_albums,
+        'rule_albums': rule_albums,
         'suggestions': suggestions,
         'total_auto': auto_albums.count(),
         'total_manual': manual_albums.count(),
@@ -102,7 +111,7 @@ def update_album(request, album_id):
         if album:
             messages.success(
                 request,
-                f"✅ Album '{album.name}' mis à jour! ({album.media.count()} médias)"
+                f"✅ Album '{album.name}' mis à jour! ({album.media_count} médias)"
             )
         else:
             messages.error(request, "❌ Impossible de mettre à jour cet album")
@@ -161,6 +170,49 @@ def create_manual_album(request):
         return redirect('smart_albums_list')
 
 
+@login_required
+@require_POST
+def create_rule_album(request):
+    """Créer un album défini par une expression (ex: objects:beach AND NOT people)"""
+    
+    name = request.POST.get('name', '').strip()
+    expression = request.POST.get('expression', '').strip()
+    
+    if not name or not expression:
+        messages.error(request, "❌ Le nom et l'expression de l'album sont requis")
+        return redirect('smart_albums_list')
+    
+    try:
+        album = smart_album_service.create_rule_album(
+            user=request.user,
+            name=name,
+            expression=expression,
+            description=request.POST.get('description', '').strip()
+        )
+    except ExpressionError as e:
+        messages.error(request, f"❌ Expression invalide: {e}")
+        return redirect('smart_albums_list')
+    
+    messages.success(request, f"✅ Album '{name}' créé! ({album.media_count} médias)")
+    return redirect('album_detail', album_id=album.id)
+
+
+@login_required
+def album_expression_count(request):
+    """API JSON : nombre de médias correspondant à une expression, pendant la saisie"""
+    
+    try:
+        preview = smart_album_service.preview_expression(request.user, request.GET.get('q', ''))
+    except ExpressionError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'position': e.position
+        })
+    
+    return JsonResponse({'success': True, **preview})
+
+
 @login_required
 @require_POST
 def add_media_to_album(request, album_id):
@@ -182,7 +234,7 @@ def add_media_to_album(request, album_id):
             user=request.user
         )
         
-        album.media.add(*media_objects)
+        add_members(album, list(media_objects))
         
         messages.success(
             request,
@@ -205,7 +257,7 @@ def remove_media_from_album(request, album_id, media_id):
         album = get_object_or_404(SmartAlbum, id=album_id, user=request.user)
         media = get_object_or_404(Media, id=media_id, user=request.user)
         
-        album.media.remove(media)
+        remove_members(album, [media.id])
         
         messages.success(request, f"✅ Média retiré de l'album '{album.name}'")
         return redirect('album_detail', album_id=album_id)
@@ -220,7 +272,7 @@ def album_suggestions_json(request):
     """API JSON pour récupérer les suggestions d'albums"""
     
     try:
-        suggestions = smart_album_service.get_album_suggestions(request.user)
+        suggestions = smart_album_service.get_cached_suggestions(request.user)
         
         return JsonResponse({
             'success': True,
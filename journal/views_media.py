@@ -0,0 +1,150 @@
+"""
+Vue de diffusion des fichiers médias (authentifiée, en production comme en développement)
+Requêtes partielles (Range) pour la lecture vidéo, ETag/Last-Modified et 304,
+délégation du transfert au proxy (X-Sendfile / X-Accel-Redirect) si configuré
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_http_methods
+
+from .models import Media
+
+THUMBNAIL_PREFIX = Media._meta.get_field('thumbnail').upload_to
+THUMBNAIL_CACHE_CONTROL = 'private, max-age=31536000, immutable'  # Nom de fichier unique : jamais réécrit
+ORIGINAL_CACHE_CONTROL = 'private, no-cache'  # Revalidation par ETag (droits d'accès, suppression)
+CHUNK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _owned(request, path: str) -> bool:
+    """Une requête sur l'index (user, file) ou (user, thumbnail)"""
+    field = 'thumbnail' if path.startswith(THUMBNAIL_PREFIX) else 'file'
+    media = Media.objects.filter(**{field: path})
+    if not request.user.is_staff:
+        media = media.filter(user_id=request.user.id)
+    return media.values_list('id', flat=True).first() is not None
+
+
+def _byte_range(header: str, size: int):
+    """
+    (début, fin incluse) d'un en-tête Range à une seule plage, None pour tout le fichier
+
+    Raises:
+        ValueError: plage non satisfaisable (416)
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None  # Plages multiples ou unité inconnue : réponse complète
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffixe : les N derniers octets
+        length = int(last)
+        if length == 0:
+            raise ValueError('Plage vide')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Plage hors du fichier')
+    return start, end
+
+
+def _if_range_matches(request, etag: str, mtime: int) -> bool:
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and mtime <= since
+
+
+def _read(full_path: str, start: int, length: int):
+    with open(full_path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(path: str, full_path: str):
+    """Réponse vide portant l'en-tête de délégation ; le proxy gère aussi les plages"""
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    response = HttpResponse()
+    if backend == 'nginx':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path
+    else:
+        response['X-Sendfile'] = full_path
+    # Type fixé par le proxy d'après le fichier servi
+    del response['Content-Type']
+    return response
+
+
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """Sert un fichier de MEDIA_ROOT à son propriétaire (ou à un membre du staff)"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Fichier introuvable')
+    if not _owned(request, path):
+        raise Http404('Fichier introuvable')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Fichier introuvable')
+
+    size, mtime = stat.st_size, int(stat.st_mtime)
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    cache_control = THUMBNAIL_CACHE_CONTROL if path.startswith(THUMBNAIL_PREFIX) else ORIGINAL_CACHE_CONTROL
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if conditional is not None:
+        conditional['ETag'] = etag
+        conditional['Cache-Control'] = cache_control
+        return conditional
+
+    if settings.MEDIA_SENDFILE_BACKEND:
+        response = _offload(path, full_path)
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and _if_range_matches(request, etag, mtime):
+            try:
+                byte_range = _byte_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        if byte_range is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read(full_path, start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = cache_control
+    return response
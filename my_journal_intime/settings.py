@@ -168,9 +168,59 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Diffusion des médias : transfert délégué au proxy frontal
+# '' (Django sert le fichier), 'xsendfile' (Apache/lighttpd X-Sendfile), 'nginx' (X-Accel-Redirect)
+MEDIA_SENDFILE_BACKEND = os.getenv('MEDIA_SENDFILE_BACKEND', '')
+# Location nginx "internal" pointant sur MEDIA_ROOT
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Fichiers sans référence conservés ce délai avant suppression (python manage.py media_blobs --sweep)
+MEDIA_BLOB_GRACE_HOURS = float(os.getenv('MEDIA_BLOB_GRACE_HOURS', '24'))
+
+# Optimisation des images à l'upload : côté max (seul réencodage avec perte), sinon sans perte, métadonnées retirées
+MEDIA_OPTIMIZE_UPLOADS = os.getenv('MEDIA_OPTIMIZE_UPLOADS', 'False').lower() == 'true'
+MEDIA_MAX_DIMENSION = int(os.getenv('MEDIA_MAX_DIMENSION', '2560'))
+MEDIA_RESIZE_QUALITY = int(os.getenv('MEDIA_RESIZE_QUALITY', '88'))  # JPEG réencodé après réduction
+# Stockage froid des originaux remplacés (hors MEDIA_ROOT, jamais servi) ; vide = non conservés
+MEDIA_COLD_ROOT = os.getenv('MEDIA_COLD_ROOT', str(BASE_DIR / 'media_cold'))
+
 # Limite de taille pour les uploads (50MB)
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
+# Vision AI : profils de la cascade d'analyse ('quick', 'standard', 'deep')
+VISION_UPLOAD_PROFILE = os.getenv('VISION_UPLOAD_PROFILE', 'quick')  # Synchrone à l'upload
+VISION_DEFERRED_PROFILE = os.getenv('VISION_DEFERRED_PROFILE', 'deep')  # En arrière-plan
+VISION_LATENCY_BUDGET_MS = int(os.getenv('VISION_LATENCY_BUDGET_MS', '0')) or None  # None = budget du profil
+# Sidecar d'inférence CLIP partagé (run_inference_server) ; vide = CLIP chargé dans chaque worker
+INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '')
+INFERENCE_RETRY_AFTER = float(os.getenv('INFERENCE_RETRY_AFTER', '30'))  # Secondes avant de réessayer le sidecar
+# Sidecar configuré mais injoignable : charger CLIP dans le worker (sinon analyses reportées)
+VISION_IN_PROCESS_FALLBACK = os.getenv('VISION_IN_PROCESS_FALLBACK', 'True').lower() == 'true'
+# Bundles de modèles hors-ligne (bundle_models, train_emotion_model) et version épinglée (vide = CURRENT)
+MODEL_BUNDLE_DIR = Path(os.getenv('MODEL_BUNDLE_DIR', BASE_DIR / 'models'))
+MODEL_BUNDLE_VERSION = os.getenv('MODEL_BUNDLE_VERSION', '')
+# Modèle d'émotion : version épinglée du bundle train_emotion_model (vide = CURRENT)
+EMOTION_MODEL_VERSION = os.getenv('EMOTION_MODEL_VERSION', '')
+# 'sparse' : score exporté (scorer.npz) s'il existe ; 'sklearn' : pipeline joblib
+EMOTION_SCORER = os.getenv('EMOTION_SCORER', 'sparse')
+# Cache des prédictions d'émotion (LRU en mémoire devant le cache Django)
+EMOTION_CACHE_SIZE = int(os.getenv('EMOTION_CACHE_SIZE', '4096'))
+EMOTION_CACHE_TIMEOUT = int(os.getenv('EMOTION_CACHE_TIMEOUT', str(30 * 24 * 3600)))  # Secondes
+# Enrichissement des notes après enregistrement : thread par processus (False = synchrone, avant la redirection)
+NOTE_ENRICHMENT_ASYNC = os.getenv('NOTE_ENRICHMENT_ASYNC', 'True').lower() == 'true'
+NOTE_ENRICHMENT_BATCH = int(os.getenv('NOTE_ENRICHMENT_BATCH', '32'))  # Notes enrichies ensemble
+# Au démarrage du thread : notes 'enriching' depuis plus longtemps reprises (processus arrêté en cours de calcul)
+NOTE_ENRICHMENT_STALE_SECONDS = int(os.getenv('NOTE_ENRICHMENT_STALE_SECONDS', '300'))
+# Recherche des notes : délai (s) avant de revérifier l'index en base (écritures des autres processus)
+NOTE_SEARCH_MAX_STALENESS = float(os.getenv('NOTE_SEARCH_MAX_STALENESS', '2'))
+# Albums "moments" : écart max entre deux photos et rayon GPS d'un même moment
+MOMENT_TIME_GAP_HOURS = float(os.getenv('MOMENT_TIME_GAP_HOURS', '6'))
+MOMENT_GPS_EPS_KM = float(os.getenv('MOMENT_GPS_EPS_KM', '5'))
+# Âge max (secondes) des suggestions d'albums en cache avant recalcul en arrière-plan
+ALBUM_SUGGESTIONS_MAX_AGE = int(os.getenv('ALBUM_SUGGESTIONS_MAX_AGE', '3600'))
+# Évaluation des règles d'albums : 'mongo' (agrégation serveur), 'orm' (index en mémoire), 'auto'
+ALBUM_RULES_BACKEND = os.getenv('ALBUM_RULES_BACKEND', 'auto')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
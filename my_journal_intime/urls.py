@@ -14,12 +14,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
-from journal import views
+from journal import views, views_media
+from journal.services.vision_service import vision_ai_service
 
 def health_check(request):
     """Endpoint de santé pour Railway et autres plateformes"""
@@ -27,7 +30,9 @@ def health_check(request):
         'status': 'healthy',
         'debug': settings.DEBUG,
         'allowed_hosts': settings.ALLOWED_HOSTS,
-        'static_root': str(settings.STATIC_ROOT)
+        'static_root': str(settings.STATIC_ROOT),
+        # Modèle en mémoire (sidecar ou worker), pas le bundle CURRENT sur disque
+        'model_bundle': vision_ai_service.loaded_model(),
     })
 
 urlpatterns = [
@@ -37,9 +42,10 @@ urlpatterns = [
     path('login/', views.signin, name='signin'),
     path('signup/', views.signup, name='signup'),
     path('', include('journal.urls')),
+    # Médias : vue authentifiée (Range, ETag, X-Sendfile), y compris en production
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), views_media.serve_media, name='serve_media'),
 ]
 
-# Serve media files in development
+# Serve static files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file